@@ -0,0 +1,111 @@
+import argparse
+import glob
+import io
+import json
+import os
+import pstats
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from utils.load_config import LoadConfig
+
+
+def load_turns(profile_dir: str, session: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    :param profile_dir: `profiling_config.output_dir`
+    :param session: Only the turns of this session
+    :return: The turn.json summaries, each with the path of its profile.prof
+    """
+    turns = []
+    for path in sorted(glob.glob(os.path.join(profile_dir, session or "*", "turn_*", "turn.json"))):
+        with open(path) as f:
+            turn = json.load(f)
+        turn["profile"] = os.path.join(os.path.dirname(path), "profile.prof")
+        turns.append(turn)
+    return turns
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def merge_profiles(turns: List[Dict[str, Any]]) -> Optional[pstats.Stats]:
+    """
+    :return: The cProfile stats of all the turns added together, None without profiles
+    """
+    stats = None
+    for turn in turns:
+        if not os.path.exists(turn["profile"]):
+            continue
+        if stats is None:
+            stats = pstats.Stats(turn["profile"], stream=io.StringIO())
+        else:
+            stats.add(turn["profile"])
+    return stats
+
+
+def merge_allocations(turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    :return: Allocation sites with their total size and count over the turns, and the number of turns they
+        appear in, largest first
+    """
+    sites: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"size_kb": 0.0, "count": 0, "turns": 0})
+    for turn in turns:
+        for allocation in turn["top_allocations"]:
+            site = sites[allocation["site"]]
+            site["size_kb"] += allocation["size_kb"]
+            site["count"] += allocation["count"]
+            site["turns"] += 1
+    return sorted(({"site": name, **values} for name, values in sites.items()), key=lambda s: -s["size_kb"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate the per-turn CPU and memory profiles of the chatbots.")
+    parser.add_argument("--dir", help="Profile directory, defaults to profiling_config.output_dir")
+    parser.add_argument("--session", help="Only aggregate this session")
+    parser.add_argument("--sort", choices=["cumulative", "tottime", "ncalls"], default="cumulative")
+    parser.add_argument("--top", type=int, default=25, help="Functions and allocation sites listed")
+    parser.add_argument("--slowest", type=int, default=5, help="Slowest turns listed")
+    parser.add_argument("--output", help="Write the merged cProfile stats to this file (e.g. for snakeviz)")
+    args = parser.parse_args()
+
+    profile_dir = args.dir or str(LoadConfig().profiling_dir)
+    turns = load_turns(profile_dir, args.session)
+    if not turns:
+        parser.exit(1, f"No profiled turns in {profile_dir}. Enable profiling_config or set CHATBOT_PROFILE=1.\n")
+
+    walls = [turn["wall_s"] for turn in turns]
+    sessions = {turn["session_id"] for turn in turns}
+    # CPU and memory are process-wide: they are only recorded for the turns that ran alone
+    alone = [turn for turn in turns if turn.get("cpu_s") is not None]
+    print(f"{len(turns)} profiled turns from {len(sessions)} sessions in {profile_dir}, "
+          f"{len(alone)} of them without other turns running")
+    print(f"wall: p50 {percentile(walls, 50):.3f}s, p95 {percentile(walls, 95):.3f}s, max {max(walls):.3f}s")
+    if alone:
+        print(f"CPU: mean {sum(t['cpu_s'] for t in alone) / len(alone):.3f}s; "
+              f"traced peak: max {max(t['traced_peak_kb'] for t in alone):.0f} KB, "
+              f"retained per turn: mean {sum(t['retained_kb'] for t in alone) / len(alone):.1f} KB")
+    rss = [(turn["timestamp"], turn["max_rss_mb"]) for turn in turns if turn.get("max_rss_mb") is not None]
+    if rss:
+        rss.sort()
+        print(f"max RSS: {rss[0][1]} MB at the first profiled turn, {rss[-1][1]} MB at the last")
+
+    print("\nSlowest turns:")
+    for turn in sorted(turns, key=lambda t: -t["wall_s"])[:args.slowest]:
+        cpu = f"{turn['cpu_s']:7.3f}s CPU" if turn.get("cpu_s") is not None else f"{'concurrent':>12}"
+        print(f"  {turn['wall_s']:8.3f}s  {cpu}  {os.path.dirname(turn['profile'])}")
+
+    print("\nTop allocation sites (memory still allocated at the end of the turns that ran alone):")
+    for site in merge_allocations(turns)[:args.top]:
+        print(f"  {site['size_kb']:10.1f} KB  {site['count']:8d} blocks  {site['turns']:4d} turns  {site['site']}")
+
+    stats = merge_profiles(turns)
+    if stats is not None:
+        if args.output:
+            stats.dump_stats(args.output)
+            print(f"\nMerged profile written to {args.output}")
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
+        print(f"\nTop functions by {args.sort} over all turns:")
+        print(stream.getvalue())
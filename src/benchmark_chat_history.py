@@ -0,0 +1,127 @@
+import argparse
+import gc
+import random
+import re
+import time
+import tracemalloc
+from utils.chat_history import ChatHistory
+
+WORDS = ("memory user assistant question answer weather travel project python database summary "
+         "yesterday tomorrow meeting remember favourite music book recipe").split()
+
+
+def approximate_token_count(text: str) -> int:
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def get_token_counter():
+    """
+    :return: The tiktoken counter used by the chatbots, or a word/punctuation approximation when the encoding
+        can't be loaded (e.g. offline)
+    """
+    from utils.utilities import Utilities
+    try:
+        Utilities.count_number_of_tokens("warm up")
+        return Utilities.count_number_of_tokens
+    except Exception as e:
+        print(f"tiktoken encoding unavailable ({type(e).__name__}), using an approximate token counter.")
+        return approximate_token_count
+
+
+def make_messages(n_pairs: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [(" ".join(rng.choices(WORDS, k=rng.randint(5, 60))), " ".join(rng.choices(WORDS, k=rng.randint(20, 150))))
+            for _ in range(n_pairs)]
+
+
+class ListHistory:
+    """The former representation: a list of single-key dicts, trimmed by slicing and rendered with str()."""
+
+    def __init__(self, max_messages: int, token_counter) -> None:
+        self.max_messages = max_messages
+        self.token_counter = token_counter
+        self.chat_history = []
+
+    def add_pair(self, user_message: str, assistant_response: str) -> int:
+        self.chat_history.append({"user": user_message})
+        self.chat_history.append({"assistant": assistant_response})
+        if len(self.chat_history) > self.max_messages:
+            self.chat_history = self.chat_history[-self.max_messages:]
+        return self.token_counter(str(self.chat_history))
+
+    def render(self) -> str:
+        return str(self.chat_history)
+
+
+class RingHistory:
+    """The ChatHistory ring buffer, driven the same way ChatHistoryManager drives it."""
+
+    def __init__(self, max_messages: int, token_counter) -> None:
+        self.chat_history = ChatHistory(max_messages, token_counter)
+
+    def add_pair(self, user_message: str, assistant_response: str) -> int:
+        self.chat_history.append("user", user_message)
+        self.chat_history.append("assistant", assistant_response)
+        return self.chat_history.token_count()
+
+    def render(self) -> str:
+        return str(self.chat_history)
+
+
+def measure_memory(history_class, sessions: int, pairs: list, max_pairs: int, token_counter) -> float:
+    """
+    :return: Bytes allocated per session holding a full history window
+    """
+    gc.collect()
+    tracemalloc.start()
+    histories = []
+    for _ in range(sessions):
+        history = history_class(max_pairs * 2, token_counter)
+        for user_message, assistant_response in pairs:
+            # A turn renders the prompt first, then stores the new pair. Fresh string copies, as messages coming
+            # from the model or the UI would be
+            history.render()
+            history.add_pair("".join(user_message), "".join(assistant_response))
+        histories.append(history)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / sessions
+
+
+def measure_turns(history_class, pairs: list, max_pairs: int, renders_per_turn: int, token_counter) -> dict:
+    """
+    Per-turn cost: render the prompt section `renders_per_turn` times (the agentic bots rebuild the system prompt
+    on every function call), then append a pair, evict and count the history tokens.
+    :return: Mean and p95 turn latency in microseconds
+    """
+    history = history_class(max_pairs * 2, token_counter)
+    latencies = []
+    for user_message, assistant_response in pairs:
+        start = time.perf_counter()
+        for _ in range(renders_per_turn):
+            history.render()
+        history.add_pair(user_message, assistant_response)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "mean_us": round(sum(latencies) / len(latencies) * 1e6, 1),
+        "p95_us": round(latencies[int(len(latencies) * 0.95)] * 1e6, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the list-of-dicts chat history with the ChatHistory ring buffer.")
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions kept in memory for the memory measurement")
+    parser.add_argument("--turns", type=int, default=2000, help="Turns replayed for the latency measurement")
+    parser.add_argument("--max-history-pairs", type=int, default=2, help="History window, as in agent_config")
+    parser.add_argument("--renders-per-turn", type=int, default=3)
+    args = parser.parse_args()
+
+    counter = get_token_counter()
+    pairs = make_messages(args.turns)
+    for name, history_class in (("list of dicts", ListHistory), ("ring buffer", RingHistory)):
+        memory = measure_memory(history_class, args.sessions, pairs[:args.max_history_pairs * 4],
+                                args.max_history_pairs, counter)
+        turns = measure_turns(history_class, pairs, args.max_history_pairs, args.renders_per_turn, counter)
+        print(f"{name:>14}: {memory / 1024:.1f} KiB per session, turn mean {turns['mean_us']} us, p95 {turns['p95_us']} us")
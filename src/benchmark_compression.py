@@ -0,0 +1,171 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from utils.chat_history_manager import ChatHistoryManager
+from utils.db_schema import create_tables
+from utils.search_manager import SearchManager
+from utils.sql_manager import SQLManager
+from utils import text_codec
+from utils.text_codec import TextCodec, save_dictionary, train_dictionary
+from utils.utilities import Utilities
+
+WORDS = ("time people way day thing world life hand part child eye place work week case point government company "
+         "number group problem fact garden recipe travel budget training project meeting family health weather "
+         "book music movie language city job friend plan goal habit sleep coffee dinner weekend morning evening "
+         "python data model memory search answer question summary detail idea option step reason example").split()
+OPENERS = ["Sure! Here are a few ideas about {w}:", "Great question. When it comes to {w}, it depends on a few things.",
+           "I remember you mentioned your {w} earlier.", "That's a good point about {w}.",
+           "Here is a short plan for your {w}:"]
+SENTENCES = ["It is usually a good idea to start with your {w} and then think about the {w2}.",
+             "Many people find that a consistent {w} routine makes the {w2} much easier.",
+             "You could also try to set aside some time each {w} for the {w2}.",
+             "Keep in mind that the {w} can change depending on your {w2}.",
+             "If you want, I can help you break the {w} down into smaller steps.",
+             "- **{W}**: focus on the {w2} first, then review the results."]
+CLOSERS = ["I hope this helps! Let me know if you have any other questions.",
+           "Would you like me to go into more detail about any of these?", "Good luck with your {w}!"]
+
+
+def synthetic_pair(rng: random.Random) -> Tuple[str, str]:
+    """
+    :return: A (question, answer) pair shaped like the chat history: short questions, answers of a few hundred to
+        a few thousand characters with the assistant's recurring phrasing
+    """
+    def fill(template: str) -> str:
+        w, w2 = rng.choice(WORDS), rng.choice(WORDS)
+        return template.format(w=w, w2=w2, W=w.capitalize())
+    question = fill(rng.choice(["What do you think about my {w}?", "Can you help me plan the {w} for my {w2}?",
+                                "Do you remember what I said about {w}?", "Give me some tips for {w}."]))
+    sentences = [fill(rng.choice(OPENERS))] + [fill(rng.choice(SENTENCES)) for _ in range(int(rng.lognormvariate(2.3, 0.6)))]
+    return question, " ".join(sentences + [fill(rng.choice(CLOSERS))])
+
+
+def build_database(path: str, codec: TextCodec, rows: int, pairs_per_session: int, seed: int,
+                   batch_size: int = 5000) -> float:
+    """
+    Write `rows` synthetic pairs the way ChatHistoryManager.save_to_db does (encoded texts, search index when
+    compressed).
+    :return: Seconds spent writing
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    started = time.perf_counter()
+    for start in range(0, rows, batch_size):
+        batch = []
+        for i in range(start, min(rows, start + batch_size)):
+            question, answer = synthetic_pair(rng)
+            batch.append((i + 1, codec.encode(question), codec.encode(answer), f"session-{i // pairs_per_session}",
+                          question, answer))
+        conn.executemany("INSERT INTO chat_history (id, user_id, question, answer, session_id) VALUES (?, 1, ?, ?, ?);",
+                         [row[:4] for row in batch])
+        if codec.enabled:
+            conn.executemany("INSERT INTO chat_history_fts (rowid, question, answer) VALUES (?, ?, ?);",
+                             [(row[0], row[4], row[5]) for row in batch])
+        conn.commit()
+    # Without it every read scans the whole table, which would hide the decoding cost being measured
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_benchmark_session ON chat_history (session_id);")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    conn.close()
+    return time.perf_counter() - started
+
+
+def table_sizes(path: str) -> Tuple[int, int]:
+    """
+    :return: Bytes used by the chat_history table and by the chat_history_fts search index
+    """
+    conn = sqlite3.connect(path)
+    try:
+        sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name;").fetchall())
+    except sqlite3.OperationalError:  # SQLite built without dbstat
+        sizes = {}
+    conn.close()
+    index = sum(size for name, size in sizes.items() if name.startswith("chat_history_fts"))
+    return sizes.get("chat_history", 0), index
+
+
+def measure_reads(path: str, codec: TextCodec, sessions: int, reads: int, pairs: int, seed: int) -> Dict[str, float]:
+    """
+    Fetch the latest pairs of random sessions through ChatHistoryManager (cache cold: one manager per read).
+    :return: Latency percentiles in microseconds
+    """
+    rng = random.Random(seed)
+    sql_manager = SQLManager(path, pool_size=1)
+    latencies = []
+    for _ in range(reads):
+        manager = ChatHistoryManager(sql_manager, "1", f"session-{rng.randrange(sessions)}", None, "", 0, codec=codec)
+        start = time.perf_counter()
+        manager.get_latest_chat_pairs(pairs)
+        latencies.append(time.perf_counter() - start)
+    sql_manager.pool.close()
+    latencies.sort()
+    return {"read_p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+            "read_p95_us": round(latencies[int(len(latencies) * 0.95)] * 1e6, 1)}
+
+
+def measure_search(path: str, codec: TextCodec, terms: List[str]) -> float:
+    """
+    :return: Mean milliseconds of a search_chat_history lookup (LIKE on the plain rows, trigram index for the
+        compressed ones)
+    """
+    sql_manager = SQLManager(path, pool_size=1)
+    search = SearchManager(sql_manager, Utilities(), None, "", max_characters=10 ** 9, codec=codec)
+    started = time.perf_counter()
+    for term in terms:
+        search.search_chat_history(term)
+    sql_manager.pool.close()
+    return round((time.perf_counter() - started) / len(terms) * 1000, 2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the size and read latency of plain and compressed chat texts.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic chat_history rows")
+    parser.add_argument("--pairs-per-session", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=2000, help="Random session reads per variant")
+    parser.add_argument("--min-bytes", type=int, default=256)
+    parser.add_argument("--level", type=int, default=6)
+    parser.add_argument("--dir", help="Where the databases are written (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the databases")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="compression_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    rng = random.Random(args.seed + 1)
+    samples = [text for _ in range(2000) for text in synthetic_pair(rng)]
+    variants: List[Tuple[str, TextCodec]] = [("plain", TextCodec(enabled=False))]
+    algorithms = ["zlib"] + (["zstd"] if text_codec.zstandard is not None else [])
+    for algorithm in algorithms:
+        dictionary_dir = os.path.join(work_dir, f"{algorithm}_dictionaries")
+        variants.append((algorithm, TextCodec(True, algorithm, args.level, args.min_bytes)))
+        save_dictionary(train_dictionary(samples, algorithm), dictionary_dir)
+        variants.append((f"{algorithm}+dict", TextCodec(True, algorithm, args.level, args.min_bytes, dictionary_dir)))
+    if text_codec.zstandard is None:
+        print("zstandard is not installed: only zlib is compared.")
+
+    sessions = (args.rows + args.pairs_per_session - 1) // args.pairs_per_session
+    terms = [rng.choice(WORDS) for _ in range(20)]
+    baseline: Optional[int] = None
+    print(f"{args.rows} rows, {sessions} sessions, databases in {work_dir}")
+    for name, codec in variants:
+        path = os.path.join(work_dir, f"{name.replace('+', '_')}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        write_seconds = build_database(path, codec, args.rows, args.pairs_per_session, args.seed)
+        size = os.path.getsize(path)
+        table_size, index_size = table_sizes(path)
+        baseline = baseline or size
+        reads = measure_reads(path, codec, sessions, args.reads, 2, args.seed)
+        search_ms = measure_search(path, codec, terms)
+        print(f"{name:>10}: {size / 2 ** 20:8.1f} MiB ({size / baseline:6.1%} of plain; chat_history "
+              f"{table_size / 2 ** 20:.1f} MiB, search index {index_size / 2 ** 20:.1f} MiB), "
+              f"write {args.rows / write_seconds:8.0f} rows/s, read p50 {reads['read_p50_us']} us / "
+              f"p95 {reads['read_p95_us']} us, search {search_ms} ms")
+        if not args.keep:
+            os.remove(path)
@@ -0,0 +1,90 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from utils.sharded_sql_manager import ShardedSQLManager
+
+INSERT_QUERY = """
+    INSERT INTO chat_history (user_id, question, answer, session_id)
+    VALUES (?, ?, ?, ?);
+"""
+
+
+def write_turns(shard_dir: str, num_shards: int, synchronous: str, user_ids: list, turns: int, payload: int,
+                start_at: float) -> tuple:
+    """
+    Save `turns` chat pairs for each user, one committed INSERT per pair like ChatHistoryManager.save_to_db.
+    :param start_at: Wall-clock time at which all writers start, so process start-up isn't measured
+    :return: Number of rows written and the wall-clock start and end of the writes
+    """
+    manager = ShardedSQLManager(shard_dir, num_shards, synchronous=synchronous)
+    question = "q" * payload
+    answer = "a" * payload
+    time.sleep(max(0.0, start_at - time.time()))
+    started = time.time()
+    written = 0
+    for turn in range(turns):
+        for user_id in user_ids:
+            manager.for_user(user_id).execute_query(INSERT_QUERY, (user_id, question, answer, f"session-{user_id}"))
+            written += 1
+    return written, started, time.time()
+
+
+def run(num_shards: int, writers: int, users: int, turns: int, payload: int, mode: str, synchronous: str) -> dict:
+    """
+    Measure chat_history write throughput with `writers` concurrent writers over `num_shards` shards.
+    :return: Rows written, elapsed seconds and rows per second
+    """
+    shard_dir = tempfile.mkdtemp(prefix="shard_bench_")
+    try:
+        manager = ShardedSQLManager(shard_dir, num_shards)
+        user_ids = [manager.create_user(name=f"user{i}", last_name="bench", occupation="tester", location="here")
+                    for i in range(users)]
+        # Each writer serves its own users, as a session is served by one worker
+        groups = [user_ids[i::writers] for i in range(writers)]
+        start_at = time.time() + (3.0 if mode == "processes" else 0.2)
+        args = [(shard_dir, num_shards, synchronous, group, turns, payload, start_at) for group in groups]
+
+        if mode == "processes":
+            with multiprocessing.get_context("spawn").Pool(writers) as pool:
+                results = pool.starmap(write_turns, args)
+        else:
+            results = [None] * writers
+            threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, write_turns(*args[i])))
+                       for i in range(writers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        written = sum(r[0] for r in results)
+        elapsed = max(r[2] for r in results) - min(r[1] for r in results)
+        return {"shards": num_shards, "writers": writers, "rows": written,
+                "seconds": round(elapsed, 3), "rows_per_second": round(written / elapsed, 1)}
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat history write throughput as a function of the shard count.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writers (one per worker/session group)")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=50, help="Chat pairs written per user")
+    parser.add_argument("--payload", type=int, default=1000, help="Characters of each question and answer")
+    parser.add_argument("--mode", choices=["processes", "threads"], default="processes")
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="FULL",
+                        help="FULL flushes every commit to disk, where the single-writer lock hurts most")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.writers} {args.mode}, {args.users} users x {args.turns} turns, "
+          f"synchronous={args.synchronous}")
+    report = []
+    for num_shards in args.shards:
+        result = run(num_shards, args.writers, args.users, args.turns, args.payload, args.mode, args.synchronous)
+        report.append(result)
+        print(f"{num_shards:>3} shard(s): {result['rows_per_second']:>9} rows/s ({result['rows']} rows in {result['seconds']}s)")
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each probe runs in a fresh interpreter so module caches from one measurement don't leak into the next.
+PROBES = {
+    "chat_in_terminal": """
+import time, json
+t0 = time.perf_counter()
+import chat_in_terminal
+t1 = time.perf_counter()
+bot = chat_in_terminal.create_chatbot({version!r})
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_ready_s": t2 - t1}}))
+""",
+    "chat_in_ui": """
+import time, json
+t0 = time.perf_counter()
+import chat_in_ui
+t1 = time.perf_counter()
+chat_in_ui.build_demo()
+chat_in_ui.get_chatbot({ui_bot!r})
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_ready_s": t2 - t1}}))
+""",
+}
+
+
+def run_probe(name: str, version: str, ui_bot: str) -> dict:
+    """
+    Measure import time and time-to-first-ready bot for one entry point in a subprocess.
+    :param name: The entry point name (key of PROBES)
+    :param version: Chatbot version for the terminal entry point
+    :param ui_bot: Chatbot name for the UI entry point
+    :return: The timings, or the error output if the probe failed
+    """
+    code = PROBES[name].format(version=version, ui_bot=ui_bot)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(repeat: int, version: str, ui_bot: str) -> dict:
+    """
+    Run every probe `repeat` times and report the best and mean timings.
+    :param repeat: Number of runs per entry point
+    :param version: Chatbot version for the terminal entry point
+    :param ui_bot: Chatbot name for the UI entry point
+    :return: Results keyed by entry point
+    """
+    results = {}
+    for name in PROBES:
+        runs = [run_probe(name, version, ui_bot) for _ in range(repeat)]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            results[name] = {"error": runs[0]["error"]}
+            continue
+        results[name] = {
+            key: {"best": min(r[key] for r in ok), "mean": sum(r[key] for r in ok) / len(ok)}
+            for key in ("import_s", "first_ready_s")
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import and first-ready time of the chat entry points.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--version", default="v3", help="Chatbot version created by chat_in_terminal")
+    parser.add_argument("--ui-bot", default="Chatbot-Agentic-v3", help="Chatbot created by chat_in_ui")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    results = benchmark_startup(args.repeat, args.version, args.ui_bot)
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name}: failed ({result['error']})")
+            continue
+        print(f"{name}: import {result['import_s']['best'] * 1000:.1f} ms, "
+              f"first ready {result['first_ready_s']['best'] * 1000:.1f} ms (best of {args.repeat})")
+    print(json.dumps(results, indent=2))
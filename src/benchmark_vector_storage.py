@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from utils.quantized_vector_store import QuantizedVectorStore
+
+
+def current_rss_mb() -> float:
+    """
+    :return: Resident set size of this process in MB
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_dataset(n_vectors: int, dim: int, n_queries: int, seed: int = 0) -> tuple:
+    """
+    Clustered synthetic embeddings (conversation memories tend to cluster by topic) and noisy copies as queries.
+    :return: The float32 vectors and queries
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n_vectors // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n_vectors)] + 0.6 * rng.normal(size=(n_vectors, dim)).astype(np.float32)
+    queries = vectors[rng.integers(0, n_vectors, n_queries)] + 0.3 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_worker(mode: str, workdir: str, k: int, rerank_factor: int) -> dict:
+    """
+    Load one storage mode in a fresh process, run all queries and report RSS, latency and the returned ids.
+    """
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    rss_before = current_rss_mb()
+    latencies = []
+    results = []
+    if mode == "float32":
+        # Full-precision path: every vector resident in memory, exact brute-force search
+        vectors = np.load(os.path.join(workdir, "vectors.npy"))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for query in normalize(queries):
+            start = time.perf_counter()
+            scores = vectors @ query
+            top = np.argpartition(-scores, k)[:k]
+            top = top[np.argsort(-scores[top])]
+            latencies.append(time.perf_counter() - start)
+            results.append([int(i) for i in top])
+    else:
+        store = QuantizedVectorStore(os.path.join(workdir, mode), quantization=mode, rerank_factor=rerank_factor)
+        for query in queries:
+            start = time.perf_counter()
+            hits = store.query(query_embeddings=[query], n_results=k, include=[])
+            latencies.append(time.perf_counter() - start)
+            results.append([int(i) for i in hits["ids"][0]])
+    latencies.sort()
+    return {
+        "rss_mb": round(current_rss_mb() - rss_before, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+        "results": results,
+    }
+
+
+def recall_at_k(results: list, truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(r[:k]) & set(t[:k].tolist())) for r, t in zip(results, truth))
+    return hits / (k * len(truth))
+
+
+def benchmark(n_vectors: int, dim: int, n_queries: int, k: int, rerank_factor: int) -> dict:
+    """
+    Compare the full-precision in-memory path with the int8 and float16 memory-mapped stores.
+    :return: RSS growth, query latency percentiles and recall@k per storage mode
+    """
+    workdir = tempfile.mkdtemp(prefix="vector_bench_")
+    vectors, queries = make_dataset(n_vectors, dim, n_queries)
+    np.save(os.path.join(workdir, "vectors.npy"), vectors)
+    np.save(os.path.join(workdir, "queries.npy"), queries)
+    truth = np.argsort(-(normalize(queries) @ normalize(vectors).T), axis=1)[:, :k]
+
+    for mode in ("int8", "float16"):
+        store = QuantizedVectorStore(os.path.join(workdir, mode), quantization=mode,
+                                     rerank_factor=rerank_factor, initial_capacity=n_vectors)
+        for start in range(0, n_vectors, 10000):
+            end = min(start + 10000, n_vectors)
+            store.add(ids=[str(i) for i in range(start, end)], embeddings=vectors[start:end])
+        store.flush()
+
+    report = {"vectors": n_vectors, "dim": dim, "queries": n_queries, "k": k}
+    for mode in ("float32", "int8", "float16"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", mode, "--workdir", workdir, "--k", str(k),
+             "--rerank-factor", str(rerank_factor)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        report[mode] = {
+            "rss_mb": result["rss_mb"],
+            "p50_ms": result["p50_ms"],
+            "p95_ms": result["p95_ms"],
+            f"recall@{k}": round(recall_at_k(result["results"], truth, k), 4),
+        }
+    report["workdir"] = workdir
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure RSS, query latency and recall@k of quantized vector storage.")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1024, help="mistral-embed produces 1024-dim embeddings")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.workdir, args.k, args.rerank_factor)))
+    else:
+        report = benchmark(args.vectors, args.dim, args.queries, args.k, args.rerank_factor)
+        for mode in ("float32", "int8", "float16"):
+            print(f"{mode:>8}: RSS +{report[mode]['rss_mb']} MB, p50 {report[mode]['p50_ms']} ms, "
+                  f"p95 {report[mode]['p95_ms']} ms, recall@{args.k} {report[mode][f'recall@{args.k}']}")
+        print(json.dumps(report, indent=2))
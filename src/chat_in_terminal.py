@@ -1,36 +1,55 @@
+import argparse
+import json
 import time
-from utils.basic_chatbot_v1 import ChatBot
-from utils.chatbot_agentic_v2 import ChatBot as ChatBot_v2
-from utils.chatbot_agentic_v3 import ChatBot as Chatbot_v3
+from importlib import import_module
 
-# If you'd like to chat with a different chatbot, modify the code manually.
+# If you'd like to chat with a different chatbot, modify the code manually or pass --version.
 # chatbot_version = "basic"
 # chatbot_version = "v2"
 chatbot_version = "v3"
 
-if __name__ == "__main__":
-    chatbot = None  # Initialize chatbot variable
-    if chatbot_version == "basic":
-        print("Basic chatbot is initialized. Type 'exit' to end the conversation.")
-        chatbot = ChatBot()
-    elif chatbot_version == "v2":
-        print("Chatbot-agentic-v2 is initialized.  Type 'exit' to end the conversation.")
-        chatbot = ChatBot_v2()
-    elif chatbot_version == "v3":
-        print("Chatbot-agentic-v3 is initialized.  Type 'exit' to end the conversation.")
-        chatbot = Chatbot_v3()
-    else:
-        print("Invalid chatbot version. Please set chatbot_version to 'basic', 'v2', or 'v3'.")
-        exit(1)
-    
-    if chatbot is None:
-        print("Failed to initialize chatbot.")
-        exit(1)
+# Only the selected version is imported, so its heavy dependencies are loaded on demand.
+CHATBOT_CLASSES = {
+    "basic": ("utils.basic_chatbot_v1", "Basic chatbot"),
+    "v2": ("utils.chatbot_agentic_v2", "Chatbot-agentic-v2"),
+    "v3": ("utils.chatbot_agentic_v3", "Chatbot-agentic-v3"),
+}
+
+
+def create_chatbot(version, session_id=None):
+    """
+    Import and instantiate the requested chatbot version.
+    :param version: One of 'basic', 'v2' or 'v3'
+    :param session_id: Resume this session instead of starting a new one
+    :return: The chatbot instance, or None for an unknown version
+    """
+    if version not in CHATBOT_CLASSES:
+        return None
+    module_name, _ = CHATBOT_CLASSES[version]
+    return import_module(module_name).ChatBot(session_id=session_id)
+
+
+def use_fake_model(latency, latency_jitter, error_rate, tool_call_rate):
+    """
+    Route every model call of this process to an offline fake client.
+    Must be called before the first chatbot is created.
+    """
+    from utils.fake_client import FakeMistralClient
+    from utils.resource_registry import ResourceRegistry, set_registry
+    set_registry(ResourceRegistry(model_client=FakeMistralClient(
+        latency=latency, latency_jitter=latency_jitter, error_rate=error_rate, tool_call_rate=tool_call_rate
+    )))
+
 
+def chat_interactively(chatbot):
     while True:
         user_input = input("\nYou: ")
 
         if user_input.lower() == 'exit':
+            from utils.resource_registry import get_registry
+            registry = get_registry()
+            if registry.is_loaded("fact_memory"):
+                registry.fact_memory.shutdown()
             print("Goodbye!")
             break
 
@@ -41,3 +60,47 @@ if __name__ == "__main__":
         end_time = time.time()
 
         print(f"\nAssistant ({round(end_time - start_time, 2)}s): {response}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Chat with the chatbot in the terminal or replay conversations in batch.")
+    parser.add_argument("--version", choices=list(CHATBOT_CLASSES), default=chatbot_version)
+    parser.add_argument("--batch", metavar="INPUT_JSONL",
+                        help="Replay conversations from a JSONL file instead of chatting interactively")
+    parser.add_argument("--output", default="batch_output.jsonl", help="JSONL file receiving responses and timings")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations replayed concurrently")
+    parser.add_argument("--fake-model", action="store_true", help="Use an offline fake model client")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Fake model base latency in seconds")
+    parser.add_argument("--fake-latency-jitter", type=float, default=0.0)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-tool-call-rate", type=float, default=0.0)
+    parser.add_argument("--local-embeddings", action="store_true",
+                        help="Use the local embedding backend (with --fake-model, runs without network)")
+    parser.add_argument("--resume", metavar="SESSION_ID", help="Continue a previous session (its id is printed at start)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.fake_model:
+        use_fake_model(args.fake_latency, args.fake_latency_jitter, args.fake_error_rate, args.fake_tool_call_rate)
+    if args.local_embeddings:
+        from utils.resource_registry import get_registry
+        get_registry().config.embedding_backend = "local"
+
+    if args.batch:
+        from utils.batch_replay import replay_conversations
+        summary = replay_conversations(
+            lambda: create_chatbot(args.version), args.batch, args.output, concurrency=args.concurrency
+        )
+        print(json.dumps(summary, indent=2))
+        exit(0)
+
+    chatbot = create_chatbot(args.version, args.resume)
+    if chatbot is None:
+        print("Failed to initialize chatbot.")
+        exit(1)
+    if args.resume and not chatbot.resumed:
+        print(f"No saved state for session {args.resume}, starting it with an empty history.")
+    print(f"{CHATBOT_CLASSES[args.version][1]} is initialized (session {chatbot.session_id}). Type 'exit' to end the conversation.")
+    chat_interactively(chatbot)
@@ -1,22 +1,45 @@
+import argparse
 import time
-import gradio as gr
-from utils.basic_chatbot_v1 import ChatBot
-from utils.chatbot_agentic_v2 import ChatBot as Chatbot_v2
-from utils.chatbot_agentic_v3 import ChatBot as Chatbot_v3
-
-# Initialize chatbot instances
-chatbots = {
-    "Basic-Chatbot": ChatBot(),
-    "Chatbot-Agentic-v2": Chatbot_v2(),
-    "Chatbot-Agentic-v3": Chatbot_v3(),
+import threading
+from importlib import import_module
+
+# Chatbot versions are imported and instantiated lazily, the first time they are selected.
+# All versions share one ResourceRegistry (config, model client, SQL manager, vector store).
+CHATBOT_CLASSES = {
+    "Basic-Chatbot": ("utils.basic_chatbot_v1", "ChatBot"),
+    "Chatbot-Agentic-v2": ("utils.chatbot_agentic_v2", "ChatBot"),
+    "Chatbot-Agentic-v3": ("utils.chatbot_agentic_v3", "ChatBot"),
 }
+DEFAULT_CHATBOT = "Chatbot-Agentic-v3"
+
+chatbots = {}
+chatbots_lock = threading.Lock()
+
+# Set in worker mode (serving_config.workers > 0): turns are forwarded to worker processes, one chatbot per session
+worker_pool = None
+
+
+def get_chatbot(selected_bot):
+    """
+    Return the chatbot instance for the selected version, creating it on first use.
+    :param selected_bot: The chatbot version name shown in the dropdown
+    :return: The chatbot instance
+    """
+    chatbot = chatbots.get(selected_bot)
+    if chatbot is None:
+        with chatbots_lock:
+            if selected_bot not in chatbots:
+                module_name, class_name = CHATBOT_CLASSES[selected_bot]
+                chatbots[selected_bot] = getattr(import_module(module_name), class_name)()
+            chatbot = chatbots[selected_bot]
+    return chatbot
 
 
 def respond(selected_bot, history, user_input):
     if not user_input.strip():
         return history, ""
 
-    chatbot = chatbots[selected_bot]
+    chatbot = get_chatbot(selected_bot)
     start_time = time.time()
     response = chatbot.chat(user_input)
     end_time = time.time()
@@ -27,47 +50,112 @@ def respond(selected_bot, history, user_input):
     return history, ""
 
 
-with gr.Blocks() as demo:
-    with gr.Tabs():
-        with gr.TabItem("Chatbot with Agentic Memory"):
-            with gr.Row():
-                chatbot = gr.Chatbot(
-                    [],
-                    elem_id="chatbot",
-                    height=500,
-                    avatar_images=("images/AI_RT.png", "images/openai.png"),
-                )
+def respond_in_worker(selected_bot, history, user_input, session_id):
+    """
+    Worker mode: forward the turn to the worker serving this browser session and wait for its answer.
+    """
+    if not user_input.strip():
+        return history, ""
+
+    from utils.worker_pool import WorkerError
+    start_time = time.time()
+    try:
+        response = worker_pool.chat(session_id, CHATBOT_CLASSES[selected_bot], user_input)
+    except WorkerError as e:
+        response = f"I apologize, but an error occurred while processing your request. Please try again. ({e})"
+    end_time = time.time()
+
+    history.append(
+        (user_input, f"{response} ({round(end_time - start_time, 2)}s)"))
+    return history, ""
+
+
+def close_worker_sessions(session_id):
+    """
+    Worker mode: drop the chatbots of a closed browser session from its worker (their state stays saved).
+    """
+    for bot in CHATBOT_CLASSES.values():
+        worker_pool.close_session(session_id, bot)
+
+
+def build_demo():
+    """
+    Build the Gradio UI. Gradio is imported here so importing this module stays cheap.
+    :return: The Gradio Blocks app
+    """
+    import gradio as gr
+
+    def respond_with_session(selected_bot, history, user_input, request: gr.Request):
+        return respond_in_worker(selected_bot, history, user_input, request.session_hash)
 
-            with gr.Row():
-                input_txt = gr.Textbox(
-                    lines=3,
-                    scale=8,
-                    placeholder="Enter text and press enter...",
-                    container=False,
+    handler = respond_with_session if worker_pool is not None else respond
+
+    with gr.Blocks() as demo:
+        with gr.Tabs():
+            with gr.TabItem("Chatbot with Agentic Memory"):
+                with gr.Row():
+                    chatbot = gr.Chatbot(
+                        [],
+                        elem_id="chatbot",
+                        height=500,
+                        avatar_images=("images/AI_RT.png", "images/openai.png"),
+                    )
+
+                with gr.Row():
+                    input_txt = gr.Textbox(
+                        lines=3,
+                        scale=8,
+                        placeholder="Enter text and press enter...",
+                        container=False,
+                    )
+
+                with gr.Row():
+                    text_submit_btn = gr.Button(value="Submit")
+                    clear_button = gr.ClearButton([input_txt, chatbot])
+                    selected_bot = gr.Dropdown(
+                        choices=list(CHATBOT_CLASSES),
+                        value=DEFAULT_CHATBOT,
+                        label="Select Chatbot Version"
+                    )
+
+                # Handle submission
+                input_txt.submit(
+                    fn=handler,
+                    inputs=[selected_bot, chatbot, input_txt],
+                    outputs=[chatbot, input_txt]
                 )
 
-            with gr.Row():
-                text_submit_btn = gr.Button(value="Submit")
-                clear_button = gr.ClearButton([input_txt, chatbot])
-                selected_bot = gr.Dropdown(
-                    choices=["Basic-Chatbot", "Chatbot-Agentic-v2",
-                             "Chatbot-Agentic-v3"],
-                    value="Chatbot-Agentic-v3",
-                    label="Select Chatbot Version"
+                text_submit_btn.click(
+                    fn=handler,
+                    inputs=[selected_bot, chatbot, input_txt],
+                    outputs=[chatbot, input_txt]
                 )
 
-            # Handle submission
-            input_txt.submit(
-                fn=respond,
-                inputs=[selected_bot, chatbot, input_txt],
-                outputs=[chatbot, input_txt]
-            )
+        if worker_pool is not None:
+            def close_session(request: gr.Request):
+                close_worker_sessions(request.session_hash)
+
+            demo.unload(close_session)
+    return demo
 
-            text_submit_btn.click(
-                fn=respond,
-                inputs=[selected_bot, chatbot, input_txt],
-                outputs=[chatbot, input_txt]
-            )
 
 if __name__ == "__main__":
-    demo.launch()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chat with the chatbots in a Gradio UI.")
+    parser.add_argument("--workers", type=int, help="Worker processes serving the turns (overrides serving_config.workers, 0 = in-process)")
+    args = parser.parse_args()
+
+    from utils.load_config import LoadConfig
+    cfg = LoadConfig()
+    num_workers = cfg.serving_workers if args.workers is None else args.workers
+    if num_workers > 0:
+        from utils.worker_pool import WorkerPool
+        worker_pool = WorkerPool.from_config(cfg, num_workers)
+        print(f"Serving turns with {num_workers} worker processes.")
+    try:
+        build_demo().launch()
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
+        from utils.resource_registry import get_registry
+        if get_registry().is_loaded("fact_memory"):
+            get_registry().fact_memory.shutdown()
@@ -0,0 +1,333 @@
+import argparse
+import csv
+import functools
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from utils.batch_replay import ERROR_PREFIXES, load_conversations
+
+# Chatbot versions: module of the ChatBot class and label of the Gradio dropdown
+VERSIONS = {
+    "basic": ("utils.basic_chatbot_v1", "Basic-Chatbot"),
+    "v2": ("utils.chatbot_agentic_v2", "Chatbot-Agentic-v2"),
+    "v3": ("utils.chatbot_agentic_v3", "Chatbot-Agentic-v3"),
+}
+
+# Synthetic conversations mix small talk, facts worth remembering and questions about earlier turns
+OPENERS = ["Hi there!", "Hello, how are you today?", "Good morning.", "Hey, I need some help."]
+FACTS = ["I live in {city} now.", "I work as a {job}.", "My favorite food is {food}.", "I started learning {hobby}.",
+         "My sister {name} is visiting next week.", "I moved to {city} last year for work."]
+QUESTIONS = ["Can you suggest a weekend plan?", "What should I cook tonight?", "Do you remember where I live?",
+             "What did I tell you about my job?", "Give me three tips to stay focused.",
+             "Summarize what you know about me.", "What was the name of my sister?"]
+WORDS = {"city": ["Kathmandu", "Lisbon", "Osaka", "Toronto", "Nairobi"],
+         "job": ["nurse", "data engineer", "teacher", "carpenter", "lawyer"],
+         "food": ["momo", "ramen", "paella", "tacos", "injera"],
+         "hobby": ["the guitar", "chess", "pottery", "rock climbing", "Spanish"],
+         "name": ["Anna", "Priya", "Sofia", "Mei", "Amara"]}
+
+
+def synthetic_conversations(users: int, turns: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    :return: One conversation of `turns` user messages per virtual user
+    """
+    rng = random.Random(seed)
+    conversations = []
+    for user in range(users):
+        messages = [rng.choice(OPENERS)]
+        while len(messages) < turns:
+            template = rng.choice(FACTS if rng.random() < 0.5 else QUESTIONS)
+            messages.append(template.format(**{k: rng.choice(v) for k, v in WORDS.items()}))
+        conversations.append({"conversation_id": f"vu-{user}", "turns": messages[:turns]})
+    return conversations
+
+
+def latency_function(distribution: str, mean: float, spread: float, seed: int) -> Callable[[], float]:
+    """
+    :param distribution: constant, uniform (mean +- spread), lognormal (median mean, sigma spread) or exponential
+    :return: A function sampling the latency of one fake model call
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    samplers = {
+        "constant": lambda: mean,
+        "uniform": lambda: rng.uniform(max(0.0, mean - spread), mean + spread),
+        "lognormal": lambda: rng.lognormvariate(np.log(mean), spread) if mean > 0 else 0.0,
+        "exponential": lambda: rng.expovariate(1.0 / mean) if mean > 0 else 0.0,
+    }
+    sampler = samplers[distribution]
+
+    def sample() -> float:
+        with lock:
+            return sampler()
+    return sample
+
+
+def install_fake_model(distribution: str, mean: float, spread: float, seed: int, tool_call_rate: float,
+                       error_rate: float, embedding_backend: str) -> None:
+    """
+    Route every model call of this process to the fake client. Also the worker initializer in `workers` mode.
+    """
+    from utils.fake_client import FakeMistralClient
+    from utils.resource_registry import ResourceRegistry, set_registry
+    registry = ResourceRegistry(model_client=FakeMistralClient(
+        latency_fn=latency_function(distribution, mean, spread, seed + os.getpid()),
+        tool_call_rate=tool_call_rate, error_rate=error_rate, seed=seed))
+    registry.config.embedding_backend = embedding_backend
+    set_registry(registry)
+
+
+class Recorder:
+    """Thread-safe record of every turn, plus time-stepped snapshots of the contention counters."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.turns: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self.vector_stats = {"vector_ingest": [0, 0.0], "vector_search": [0, 0.0]}
+        self.pool = None
+
+    def add(self, user: str, turn: int, start: float, latency: float, error: Optional[str]) -> None:
+        with self.lock:
+            self.turns.append({"user": user, "turn": turn, "start_s": round(start - self.started, 4),
+                               "end_s": round(start + latency - self.started, 4), "latency_s": round(latency, 4),
+                               "error": error})
+
+    def timed(self, name: str, method: Callable) -> Callable:
+        """Wrap a method to accumulate its calls and seconds (keeps tool registrations via functools.wraps)."""
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.vector_stats[name][0] += 1
+                    self.vector_stats[name][1] += time.perf_counter() - started
+        return wrapper
+
+
+def contention_snapshot(recorder: Recorder) -> Dict[str, float]:
+    """
+    Cumulative counters of the in-process resources: SQLite pool waits (all shards), vector store time, pairs
+    added to and merged into the vector store, and model client calls.
+    """
+    from utils.resource_registry import get_registry
+    registry = get_registry()
+    snapshot: Dict[str, float] = {}
+    if registry.is_loaded("sql_manager"):
+        pools = [shard.pool.get_stats() for shard in registry.sql_manager.shards()]
+        snapshot["db_acquisitions"] = sum(p["acquisitions"] for p in pools)
+        snapshot["db_waits"] = sum(p["waits"] for p in pools)
+        snapshot["db_wait_s"] = sum(p["wait_seconds"] for p in pools)
+    with recorder.lock:
+        for name, (calls, seconds) in recorder.vector_stats.items():
+            snapshot[f"{name}_calls"] = calls
+            snapshot[f"{name}_s"] = seconds
+    if registry.is_loaded("vector_db_manager"):
+        snapshot["vector_pairs_added"] = registry.vector_db_manager.ingest_stats["added"]
+        snapshot["vector_pairs_merged"] = registry.vector_db_manager.ingest_stats["merged"]
+    if registry.is_loaded("fact_memory"):
+        snapshot["fact_backlog"] = registry.fact_memory.backlog()
+    if registry.is_loaded("model_client"):
+        for key, value in registry.model_client.get_stats().items():
+            if isinstance(value, (int, float)):
+                snapshot[f"model_{key}"] = value
+    return snapshot
+
+
+def session_factory(args: argparse.Namespace, recorder: Recorder) -> Callable[[int], Callable[[str], str]]:
+    """
+    :return: A function opening the session of a virtual user, itself returning a send(message) -> response
+    """
+    module_name, label = VERSIONS[args.version]
+    if args.target == "http":
+        from gradio_client import Client
+
+        def open_http(user: int) -> Callable[[str], str]:
+            client = Client(args.url, verbose=False)
+
+            def send(message: str) -> str:
+                history, _ = client.predict(label, [], message, api_name=args.api_name)
+                last = history[-1]
+                return str(last.get("content") if isinstance(last, dict) else last[1])
+            return send
+        return open_http
+
+    fake_args = (args.latency_distribution, args.latency, args.latency_spread, args.seed, args.tool_call_rate,
+                 args.error_rate, args.embedding_backend)
+    if args.target == "workers":
+        from utils.worker_pool import WorkerPool
+        pool = WorkerPool(args.workers, threads_per_worker=max(1, args.users // args.workers + 1),
+                          initializer=install_fake_model, initargs=fake_args)
+        recorder.pool = pool
+        return lambda user: functools.partial(pool.chat, f"vu-{user}", (module_name, "ChatBot"))
+
+    install_fake_model(*fake_args)
+    from importlib import import_module
+    from utils.resource_registry import get_registry
+    manager = get_registry().vector_db_manager
+    manager.update_vector_db = recorder.timed("vector_ingest", manager.update_vector_db)
+    manager.search_vector_db = recorder.timed("vector_search", manager.search_vector_db)
+    chatbot_class = import_module(module_name).ChatBot
+    return lambda user: chatbot_class().chat
+
+
+def virtual_user(user: int, conversation: Dict[str, Any], open_session: Callable, recorder: Recorder,
+                 think_time: float, stop_at: float, seed: int) -> None:
+    rng = random.Random(seed + user)
+    try:
+        send = open_session(user)
+    except Exception as e:
+        recorder.add(conversation["conversation_id"], -1, time.perf_counter(), 0.0, f"session: {type(e).__name__}: {e}")
+        return
+    for turn, message in enumerate(conversation["turns"]):
+        if time.perf_counter() > stop_at:
+            return
+        started = time.perf_counter()
+        error = None
+        try:
+            response = send(message)
+            if not response or str(response).startswith(ERROR_PREFIXES):
+                error = "error response"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        recorder.add(conversation["conversation_id"], turn, started, time.perf_counter() - started, error)
+        if think_time:
+            time.sleep(rng.expovariate(1.0 / think_time))
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies:
+        return {"p50_s": None, "p95_s": None, "p99_s": None, "mean_s": None, "max_s": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50_s": round(float(p50), 4), "p95_s": round(float(p95), 4), "p99_s": round(float(p99), 4),
+            "mean_s": round(float(np.mean(latencies)), 4), "max_s": round(float(np.max(latencies)), 4)}
+
+
+def time_series(turns: List[Dict[str, Any]], snapshots: List[tuple], interval: float) -> List[Dict[str, Any]]:
+    """
+    :return: One row per interval: completed turns, errors, throughput, latency percentiles and the increase of
+        each contention counter during the interval
+    """
+    rows = []
+    previous: Dict[str, float] = {}
+    for elapsed, snapshot in snapshots:
+        window = [t for t in turns if elapsed - interval < t["end_s"] <= elapsed]
+        row = {"t_s": round(elapsed, 2), "turns": len(window), "errors": sum(1 for t in window if t["error"]),
+               "turns_per_s": round(len(window) / interval, 3)}
+        row.update(latency_summary([t["latency_s"] for t in window if not t["error"]]))
+        for key, value in snapshot.items():
+            row[key] = round(value - previous.get(key, 0), 4)
+        previous = snapshot
+        rows.append(row)
+    return rows
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.conversations:
+        conversations = list(load_conversations(args.conversations))
+        conversations = [conversations[i % len(conversations)] for i in range(args.users)]
+    else:
+        conversations = synthetic_conversations(args.users, args.turns, args.seed)
+
+    recorder = Recorder()
+    open_session = session_factory(args, recorder)
+    recorder.started = time.perf_counter()
+    stop_at = recorder.started + args.duration if args.duration else float("inf")
+    threads = []
+    for user, conversation in enumerate(conversations):
+        thread = threading.Thread(target=virtual_user, daemon=True, args=(
+            user, conversation, open_session, recorder, args.think_time, stop_at, args.seed))
+        threads.append(thread)
+        thread.start()
+        if args.ramp_up:
+            time.sleep(args.ramp_up / len(conversations))
+
+    snapshots = []
+    next_snapshot = recorder.started + args.interval
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(max(0.0, next_snapshot - time.perf_counter()))
+        next_snapshot += args.interval
+        snapshots.append((time.perf_counter() - recorder.started,
+                          contention_snapshot(recorder) if args.target == "in-process" else {}))
+    elapsed = time.perf_counter() - recorder.started
+    if recorder.pool is not None:
+        recorder.pool.close()
+    else:
+        from utils.resource_registry import get_registry
+        if args.target == "in-process" and get_registry().is_loaded("fact_memory"):
+            # Background fact extraction isn't part of the turn latencies, but let it finish before exiting
+            get_registry().fact_memory.wait()
+
+    turns = [t for t in recorder.turns if t["turn"] >= 0]
+    errors = [t for t in recorder.turns if t["error"]]
+    summary = {
+        "version": args.version, "target": args.target, "commit": git_commit(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output",)},
+        "users": len(conversations), "turns": len(turns), "errors": len(errors),
+        "error_rate": round(len(errors) / max(1, len(recorder.turns)), 4),
+        "duration_s": round(elapsed, 3), "throughput_turns_per_s": round(len(turns) / elapsed, 3),
+        "latency": latency_summary([t["latency_s"] for t in turns if not t["error"]]),
+        "error_samples": sorted({t["error"] for t in errors})[:10],
+    }
+    if snapshots and snapshots[-1][1]:
+        summary["contention"] = {k: round(v, 4) for k, v in snapshots[-1][1].items()}
+        ingested = summary["contention"].get("vector_pairs_added", 0) + summary["contention"].get("vector_pairs_merged", 0)
+        if ingested:
+            summary["vector_dedup_ratio"] = round(summary["contention"]["vector_pairs_merged"] / ingested, 4)
+    summary["series"] = time_series(turns, snapshots, args.interval)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent users chatting with a chatbot version and "
+                                                 "report throughput, latency percentiles, errors and contention.")
+    parser.add_argument("--version", choices=list(VERSIONS), default="v3")
+    parser.add_argument("--target", choices=["in-process", "workers", "http"], default="in-process",
+                        help="ChatBot.chat in this process, a WorkerPool, or a running chat_in_ui.py over HTTP")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per synthetic conversation")
+    parser.add_argument("--conversations", help="JSONL conversations (see chat_in_terminal.py --batch) instead of synthetic ones")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a user waits between turns")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which the users are started")
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop starting turns after this many seconds (0 = run all turns)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds per time-series row")
+    parser.add_argument("--latency-distribution", choices=["constant", "uniform", "lognormal", "exponential"],
+                        default="lognormal")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake model latency: mean (median for lognormal)")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Uniform half-width or lognormal sigma")
+    parser.add_argument("--tool-call-rate", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected model error rate")
+    parser.add_argument("--embedding-backend", choices=["local", "mistral"], default="local")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes of the workers target")
+    parser.add_argument("--url", default="http://127.0.0.1:7860/", help="Gradio app of the http target")
+    parser.add_argument("--api-name", default="/respond", help="Gradio endpoint of the http target")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test", help="Writes <output>.json (summary) and <output>.csv (time series)")
+    args = parser.parse_args()
+
+    summary = run(args)
+    with open(f"{args.output}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    if summary["series"]:
+        columns = list(dict.fromkeys(key for row in summary["series"] for key in row))
+        with open(f"{args.output}.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(summary["series"])
+    print(json.dumps({k: v for k, v in summary.items() if k not in ("series", "settings")}, indent=2))
+    print(f"Results written to {args.output}.json and {args.output}.csv")
@@ -1,8 +1,14 @@
+import argparse
 import os
 import sqlite3
 from pyprojroot import here
+from utils.db_schema import create_tables
+from utils.load_config import LoadConfig
+from utils.sharded_sql_manager import ShardedSQLManager
+from utils.text_codec import TextCodec
+from utils.utilities import Utilities
 
-def create_user_info():
+def create_user_info(codec: TextCodec, compress: bool = False):
     """
     Create a Sqlite database and initialize tables for user information, chat history, and summaries.
 
@@ -33,6 +39,7 @@ def create_user_info():
             - question (TEXT, NOT NULL)
             - answer (TEXT, NOT NULL)
             - session_id (TEXT, NOT NULL)
+            - question_tokens, answer_tokens (INTEGER, NULLABLE)
 
         summary:
             - id (INTEGER, PRIMARY KEY)
@@ -40,6 +47,10 @@ def create_user_info():
             - session_id (TEXT, NOT NULL)
             - summary_text (TEXT, NOT NULL)
             - timestamp (DATETIME, DEFAULT CURRENT_TIMESTAMP)
+            - token_count (INTEGER, NULLABLE)
+
+    Databases created by older versions get the missing columns, and their token counts are backfilled.
+    With `compress`, the stored texts are re-encoded with the current compression settings (see `recompress_texts`).
     """
     # Create data directory if it doesn't exist
     data_dir = here("data")
@@ -52,37 +63,7 @@ def create_user_info():
     cursor = conn.cursor()
 
     # Create Tables
-    cursor.executescript("""
-        CREATE TABLE IF NOT EXISTS user_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            occupation TEXT NOT NULL,
-            location TEXT NOT NULL,
-            age INTEGER,
-            gender TEXT,
-            interests TEXT
-        );
-
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL,
-            session_id TEXT NOT NULL,
-            FOREIGN KEY(user_id) REFERENCES user_info(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS summary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            session_id TEXT NOT NULL,
-            summary_text TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES user_info(id)
-        );
-    """)
+    create_tables(conn)
 
     # Insert Sample User if Not Exists (leaving age, gender, interests empty)
     cursor.execute("""
@@ -93,7 +74,104 @@ def create_user_info():
 
     # Commit changes and close the connection
     conn.commit()
+    backfill_token_counts(conn, codec)
+    if compress:
+        recompress_texts(conn, codec)
     conn.close()
 
+def backfill_token_counts(conn: sqlite3.Connection, codec: TextCodec, batch_size: int = 1000) -> dict:
+    """
+    Compute the token counts of the chat_history and summary rows written before they were stored.
+    Rows are updated in batches, each in its own transaction, so an interrupted backfill can simply be re-run.
+    :param conn: An open SQLite connection
+    :param codec: Decodes the compressed texts
+    :param batch_size: Rows tokenized per transaction
+    :return: Number of backfilled rows per table
+    """
+    counts = {}
+    for table, select, update in (
+        ("chat_history",
+         "SELECT id, question, answer FROM chat_history WHERE question_tokens IS NULL OR answer_tokens IS NULL LIMIT ?;",
+         "UPDATE chat_history SET question_tokens = ?, answer_tokens = ? WHERE id = ?;"),
+        ("summary",
+         "SELECT id, summary_text FROM summary WHERE token_count IS NULL LIMIT ?;",
+         "UPDATE summary SET token_count = ? WHERE id = ?;"),
+    ):
+        counts[table] = 0
+        while True:
+            rows = conn.execute(select, (batch_size,)).fetchall()
+            if not rows:
+                break
+            conn.executemany(update, [
+                tuple(Utilities.count_number_of_tokens(codec.decode(text) or "") for text in row[1:]) + (row[0],)
+                for row in rows])
+            conn.commit()
+            counts[table] += len(rows)
+    if any(counts.values()):
+        print(f"Token counts backfilled: {counts}")
+    return counts
+
+def recompress_texts(conn: sqlite3.Connection, codec: TextCodec, batch_size: int = 1000) -> dict:
+    """
+    Re-encode the questions, answers and summaries with the current `compression_config` (compressing them, or
+    decompressing them if compression is disabled), and rebuild the chat_history_fts search index from scratch.
+    Needed after enabling compression or training a new dictionary, and after moving users between shards or
+    restoring a snapshot while compression is enabled.
+    :param conn: An open SQLite connection
+    :param codec: The current TextCodec
+    :param batch_size: Rows re-encoded per transaction
+    :return: Number of rewritten rows per table
+    """
+    counts = {"chat_history": 0, "summary": 0}
+    conn.execute("INSERT INTO chat_history_fts (chat_history_fts) VALUES ('delete-all');")
+    for table, columns in (("chat_history", ("question", "answer")), ("summary", ("summary_text",))):
+        last_id = 0
+        while True:
+            rows = conn.execute(f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?;",
+                                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            texts = [(row[0], [codec.decode(value) for value in row[1:]]) for row in rows]
+            updates = []
+            for (row_id, decoded), row in zip(texts, rows):
+                encoded = [codec.encode(text) for text in decoded]
+                if encoded != list(row[1:]):
+                    updates.append((*encoded, row_id))
+            conn.executemany(f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?;", updates)
+            if table == "chat_history" and codec.enabled:
+                conn.executemany("INSERT INTO chat_history_fts (rowid, question, answer) VALUES (?, ?, ?);",
+                                 [(row_id, *decoded) for row_id, decoded in texts])
+            conn.commit()
+            counts[table] += len(updates)
+    conn.commit()
+    conn.execute("VACUUM;")
+    print(f"Texts re-encoded ({'compressed' if codec.enabled else 'plain'}): {counts}")
+    return counts
+
+def create_sharded_user_info(cfg: LoadConfig, codec: TextCodec, compress: bool = False):
+    """
+    Create the shard catalog and the shard databases (`sharding_config`), with the same tables as above,
+    and register the sample user if no user exists yet.
+    """
+    manager = ShardedSQLManager.from_config(cfg)
+    if manager.default_user_id() is None:
+        manager.create_user(name="Lochan", last_name="Paudel", occupation="ML Engineer", location="Nepal")
+    for shard in manager.shards():
+        with shard.pool.connection() as conn:
+            backfill_token_counts(conn, codec)
+            if compress:
+                recompress_texts(conn, codec)
+    print(f"Shards ready in {cfg.shard_dir}: {manager.status()}")
+
 if __name__ == "__main__":
-    create_user_info()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create (or upgrade) the chatbot SQLite database.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Re-encode the stored texts with compression_config and rebuild the search index")
+    args = parser.parse_args()
+    cfg = LoadConfig()
+    codec = TextCodec.from_config(cfg)
+    if cfg.sharding_enabled:
+        create_sharded_user_info(cfg, codec, args.compress)
+    else:
+        create_user_info(codec, args.compress)
\ No newline at end of file
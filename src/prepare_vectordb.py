@@ -1,22 +1,27 @@
+import argparse
 import os
+import sqlite3
 import chromadb
-from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
 from pyprojroot import here
 from utils.load_config import LoadConfig
+from utils.local_embedding import LocalEmbeddingFunction, get_embedding_function
+from utils.text_codec import TextCodec
+from utils.vector_index import active_collection_name, collection_metadata, sync_search_ef
 
 load_dotenv()
 
 def prepare_vectordb():
     """
-    Prepare a vector db using Chromadb and MistralAI embeddings.
+    Prepare a vector db using Chromadb and the configured embeddings (MistralAI, or the local backend).
 
     This function setups the vector database by:
         - Loading configuration from `LoadConfig` class.
-        - Creating the Mistral Embedding function using provided API key and model
+        - Creating the embedding function selected by `vectordb_config.embedding_backend`
         - Creating the vector database directory if it doesn't exists
         - Initializing the Persistent ChromaDB client at the specified directory
-        - Creating or retrieving a collection in the vector database with cosine similarity
+        - Creating or retrieving a collection in the vector database with cosine similarity and the HNSW
+          parameters of `vectordb_config.hnsw` (or the collection swapped in by the last rebuild)
 
     Steps:
         1. Load MistralAI API keys and model name from environment and configuration
@@ -27,9 +32,7 @@ def prepare_vectordb():
     :return: None
     """
     cfg = LoadConfig()
-    mistral_embedding_function = embedding_functions.MistralEmbeddingFunction(
-        model=cfg.embedding_model
-    )
+    embedding_function = get_embedding_function(cfg)
 
     if not os.path.exists(here(cfg.vectordb_dir)):
         os.makedirs(here(cfg.vectordb_dir))
@@ -37,12 +40,48 @@ def prepare_vectordb():
 
     db_client = chromadb.PersistentClient(path=cfg.vectordb_dir)
     db_collection = db_client.get_or_create_collection(
-        name=cfg.collection_name,
-        embedding_function=mistral_embedding_function,
-        metadata={"hnsw:space": "cosine"}
+        name=active_collection_name(cfg),
+        embedding_function=embedding_function,
+        metadata=collection_metadata(cfg)
     )
+    sync_search_ef(db_collection, cfg)
     print("DB Collection get created: ",db_collection)
     print("DB Collection count: ",db_collection.count())
 
+def fit_local_idf():
+    """
+    Fit the IDF table of the local embedding backend on the stored chat history (one document per pair, as they
+    are stored in the vector db), of every shard when sharding is enabled. Vectors embedded before the fit must be
+    re-embedded to stay comparable.
+    :return: None
+    """
+    cfg = LoadConfig()
+    codec = TextCodec.from_config(cfg)
+    if cfg.sharding_enabled:
+        from utils.sharded_sql_manager import ShardedSQLManager
+        db_paths = [shard.db_path for shard in ShardedSQLManager.from_config(cfg).shards()]
+    else:
+        db_paths = [str(cfg.db_path)]
+    texts = []
+    for path in db_paths:
+        conn = sqlite3.connect(path)
+        try:
+            texts += [str({"user": codec.decode(q), "assistant": codec.decode(a)})
+                      for q, a in conn.execute("SELECT question, answer FROM chat_history;")]
+        finally:
+            conn.close()
+    if not texts:
+        print("No chat history to fit the IDF table on.")
+        return
+    LocalEmbeddingFunction.from_config(cfg).fit(texts)
+    print(f"IDF table fitted on {len(texts)} pairs of {len(db_paths)} database(s) and saved to "
+          f"{cfg.local_embedding_idf_path}.")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the vector db collection.")
+    parser.add_argument("--fit-idf", action="store_true",
+                        help="Local embedding backend: fit the IDF table on the chat history first")
+    args = parser.parse_args()
+    if args.fit_idf:
+        fit_local_idf()
     prepare_vectordb()
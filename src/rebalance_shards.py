@@ -0,0 +1,38 @@
+import argparse
+import json
+import time
+from utils.load_config import LoadConfig
+from utils.sharded_sql_manager import ShardedSQLManager
+
+# Run while the chatbots are stopped: rows written to a user's old shard during a move would be lost.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect, split or rebalance the SQLite shards of the chatbot memory.")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    subparsers.add_parser("status", help="Users and rows per shard")
+    split = subparsers.add_parser("split", help="Change the number of shards and move users accordingly")
+    split.add_argument("--shards", type=int, required=True)
+    subparsers.add_parser("rebalance", help="Move users back to their even placement (user_id %% shards)")
+    move = subparsers.add_parser("move", help="Move one user to another shard")
+    move.add_argument("--user", type=int, required=True)
+    move.add_argument("--shard", type=int, required=True)
+    import_db = subparsers.add_parser("import", help="Split an unsharded chatbot database into the shards")
+    import_db.add_argument("--from", dest="source", help="Source database, defaults to directories.db_path")
+    args = parser.parse_args()
+
+    cfg = LoadConfig()
+    manager = ShardedSQLManager.from_config(cfg)
+
+    start_time = time.time()
+    if args.action == "split":
+        result = {"moved_users": manager.rebalance(args.shards)}
+    elif args.action == "rebalance":
+        result = {"moved_users": manager.rebalance()}
+    elif args.action == "move":
+        result = manager.move_user(args.user, args.shard)
+    elif args.action == "import":
+        result = manager.import_database(args.source or str(cfg.db_path))
+    else:
+        result = {}
+    if args.action != "status":
+        print(f"{args.action.capitalize()} finished in {round(time.time() - start_time, 2)}s: {result}")
+    print(json.dumps(manager.status(), indent=2))
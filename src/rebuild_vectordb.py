@@ -0,0 +1,152 @@
+import argparse
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from utils.load_config import LoadConfig
+from utils.local_embedding import get_embedding_function
+from utils.vector_index import active_collection_name, collection_metadata, set_active_collection
+
+# After the swap, chatbots still writing to the old collection are caught up with until a pass finds no change
+CATCH_UP_PASSES = 10
+CATCH_UP_GRACE_SECONDS = 0.5
+
+
+def open_collection(cfg: LoadConfig, name: str, create: bool = False) -> Tuple[Any, Any]:
+    """
+    :param cfg: LoadConfig instance
+    :param name: Collection name (Chroma) or store directory prefix (quantized storage)
+    :param create: Create the collection, with the configured HNSW parameters
+    :return: The Chroma client (None for quantized storage) and the collection
+    """
+    embedding_function = get_embedding_function(cfg)
+    if cfg.vector_storage == "quantized":
+        from utils.quantized_vector_store import QuantizedVectorStore
+        path = os.path.join(str(cfg.vectordb_dir), f"{name}_{cfg.quantization}")
+        if not create and not os.path.isdir(path):
+            raise ValueError(f"No quantized store at {path}")
+        return None, QuantizedVectorStore(path, embedding_function, cfg.quantization, cfg.rerank_factor)
+    import chromadb
+    client = chromadb.PersistentClient(path=str(cfg.vectordb_dir))
+    if create:
+        return client, client.create_collection(name=name, embedding_function=embedding_function,
+                                                metadata=collection_metadata(cfg))
+    return client, client.get_collection(name=name, embedding_function=embedding_function)
+
+
+def _all_ids(collection: Any) -> set:
+    return set(collection.get(include=[])["ids"])
+
+
+def copy_records(source: Any, target: Any, batch_size: int, skip: Optional[set] = None) -> int:
+    """
+    Copy the live records of `source` (ids, embeddings, documents and metadata, nothing re-embedded) to `target`.
+    :param skip: Ids already copied
+    :return: Number of records copied
+    """
+    copied, offset = 0, 0
+    while True:
+        batch = source.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            return copied
+        offset += len(batch["ids"])
+        keep = [i for i, record_id in enumerate(batch["ids"]) if not skip or record_id not in skip]
+        if keep:
+            _add(target, batch, keep)
+            copied += len(keep)
+
+
+def _add(target: Any, batch: Dict[str, Any], keep: List[int]) -> None:
+    target.add(ids=[batch["ids"][i] for i in keep],
+               embeddings=[batch["embeddings"][i] for i in keep],
+               documents=[batch["documents"][i] for i in keep],
+               metadatas=[batch["metadatas"][i] for i in keep])
+
+
+def catch_up(source: Any, target: Any, batch_size: int) -> Dict[str, int]:
+    """
+    Make `target` hold the same records as `source`: copy the records it is missing, delete the ones `source`
+    no longer has, and apply metadata changes (e.g. the count and last_seen of merged duplicates).
+    :return: Number of records added, deleted and updated
+    """
+    source_ids, target_ids = _all_ids(source), _all_ids(target)
+    missing, removed = sorted(source_ids - target_ids), sorted(target_ids - source_ids)
+    added = 0
+    for start in range(0, len(missing), batch_size):
+        batch = source.get(ids=missing[start:start + batch_size], include=["embeddings", "documents", "metadatas"])
+        _add(target, batch, list(range(len(batch["ids"]))))
+        added += len(batch["ids"])
+    if removed:
+        target.delete(ids=removed)
+    updated, shared = 0, sorted(source_ids & target_ids)
+    for start in range(0, len(shared), batch_size):
+        ids = shared[start:start + batch_size]
+        source_batch, target_batch = source.get(ids=ids, include=["metadatas"]), target.get(ids=ids, include=["metadatas"])
+        current = dict(zip(target_batch["ids"], target_batch["metadatas"]))
+        changed = [(record_id, metadata) for record_id, metadata in zip(source_batch["ids"], source_batch["metadatas"])
+                   if metadata and current.get(record_id) != metadata]
+        if changed:
+            target.update(ids=[record_id for record_id, _ in changed], metadatas=[metadata for _, metadata in changed])
+            updated += len(changed)
+    return {"added": added, "deleted": len(removed), "updated": updated}
+
+
+def rebuild(cfg: LoadConfig, new_name: Optional[str] = None, batch_size: int = 1000,
+            keep_old: bool = False) -> Dict[str, Any]:
+    """
+    Rebuild the conversation collection with the current `vectordb_config.hnsw` parameters, leaving out deleted
+    records, and swap it in: the collection is copied to a new one, brought up to date with the changes made
+    during the copy, and the pointer file is replaced atomically. Running chatbots switch to the new collection at
+    their next search or ingestion; what they wrote to the old one just before switching (new pairs, merged
+    duplicates, deletions) is caught up after the swap, then the old collection is dropped.
+    :param cfg: LoadConfig instance
+    :param new_name: Name of the new collection, by default `<collection_name>-<timestamp>`
+    :param batch_size: Records copied per request
+    :param keep_old: Keep the old collection
+    :return: Names, record counts and duration of the rebuild
+    """
+    started = time.perf_counter()
+    old_name = active_collection_name(cfg)
+    new_name = new_name or f"{cfg.collection_name}-{time.strftime('%Y%m%d-%H%M%S')}"
+    if new_name == old_name:
+        raise ValueError(f"{new_name} is already the active collection")
+    old_client, old = open_collection(cfg, old_name)
+    new_client, new = open_collection(cfg, new_name, create=True)
+    copied = copy_records(old, new, batch_size)
+    # Changes made while copying (records added, deleted or merged into)
+    caught_up = catch_up(old, new, batch_size)
+    set_active_collection(cfg, new_name)
+    # Changes made by chatbots that hadn't switched yet: the old collection is only dropped once a pass, after
+    # a grace period for the ingestions in flight, finds nothing left to apply
+    for _ in range(CATCH_UP_PASSES):
+        time.sleep(CATCH_UP_GRACE_SECONDS)
+        changes = catch_up(old, new, batch_size)
+        caught_up = {key: caught_up[key] + changes[key] for key in caught_up}
+        if not any(changes.values()):
+            break
+    else:
+        raise RuntimeError(f"{old_name} was still being written after {CATCH_UP_PASSES} catch-up passes; "
+                           f"{new_name} is active and {old_name} was kept")
+    if not keep_old:
+        if cfg.vector_storage == "quantized":
+            old.meta.close()
+            shutil.rmtree(old.path)
+        else:
+            old_client.delete_collection(old_name)
+    return {"old": old_name, "new": new_name, "records": new.count(), "copied": copied, "caught_up": caught_up,
+            "old_dropped": not keep_old, "seconds": round(time.perf_counter() - started, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the vector collection with the configured index "
+                                                 "parameters (compacting deleted records) and swap it in.")
+    parser.add_argument("--name", help="Name of the new collection")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--keep-old", action="store_true", help="Keep the old collection after the swap")
+    args = parser.parse_args()
+
+    cfg = LoadConfig()
+    result = rebuild(cfg, args.name, args.batch_size, args.keep_old)
+    kept = "" if result["old_dropped"] else f" ({result['old']} kept)"
+    print(f"Collection {result['new']} ({result['records']} records, construction_ef={cfg.hnsw_construction_ef}, "
+          f"M={cfg.hnsw_m}) replaced {result['old']}{kept} in {result['seconds']}s.")
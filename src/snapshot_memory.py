@@ -0,0 +1,41 @@
+import argparse
+import time
+from utils.load_config import LoadConfig
+from utils.memory_snapshot import MemorySnapshot
+
+
+def get_collection():
+    """
+    Open the conversation vector collection configured in `vectordb_config`.
+    :return: The Chroma collection
+    """
+    from utils.resource_registry import get_registry
+    return get_registry().vector_db_manager.db_collection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a snapshot of the whole memory store.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file")
+    parser.add_argument("--no-vectors", action="store_true", help="Only snapshot the SQLite tables")
+    parser.add_argument("--replace", action="store_true", help="Import: delete the existing memory first")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows or vectors per block")
+    parser.add_argument("--shard", type=int, help="With sharding enabled: the SQLite shard to snapshot")
+    args = parser.parse_args()
+
+    cfg = LoadConfig()
+    db_path = str(cfg.db_path)
+    if cfg.sharding_enabled:
+        if args.shard is None:
+            parser.error("sharding is enabled, pass --shard (one snapshot per shard)")
+        from utils.sharded_sql_manager import ShardedSQLManager
+        db_path = ShardedSQLManager.from_config(cfg).shards()[args.shard].db_path
+    collection = None if args.no_vectors else get_collection()
+    snapshot = MemorySnapshot(db_path, collection, chunk_size=args.chunk_size)
+
+    start_time = time.time()
+    if args.action == "export":
+        counts = snapshot.export(args.path)
+    else:
+        counts = snapshot.restore(args.path, replace=args.replace)
+    print(f"{args.action.capitalize()} finished in {round(time.time() - start_time, 2)}s: {counts}")
@@ -0,0 +1,148 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+import numpy as np
+from utils.load_config import LoadConfig
+from utils.vector_index import active_collection_name
+
+
+def load_vectors(cfg: LoadConfig) -> np.ndarray:
+    """
+    :return: The embeddings stored in the active conversation collection
+    """
+    from rebuild_vectordb import open_collection
+    _, collection = open_collection(cfg, active_collection_name(cfg))
+    vectors = collection.get(include=["embeddings"])["embeddings"]
+    return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+
+
+def split_queries(vectors: np.ndarray, n_queries: int, seed: int) -> tuple:
+    """
+    Hold out `n_queries` stored vectors as queries, so a query never finds itself.
+    :return: The indexed vectors (normalized) and the queries
+    """
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    rng = np.random.default_rng(seed)
+    held_out = rng.choice(len(vectors), size=min(n_queries, len(vectors) // 10 or 1), replace=False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    return vectors[mask], vectors[held_out]
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """
+    :return: The ids (row numbers) of the k nearest vectors of each query by cosine similarity
+    """
+    neighbors = []
+    for query in queries:
+        scores = vectors @ query
+        neighbors.append(set(np.argpartition(-scores, k)[:k].tolist()) if len(scores) > k else set(range(len(scores))))
+    return neighbors
+
+
+def run_worker(workdir: str, name: str, search_ef: int, k: int) -> Dict[str, Any]:
+    """
+    Query one collection with one search_ef in a fresh process: Chroma keeps a loaded index in memory, and a
+    search_ef change only applies to indexes loaded after it.
+    :return: Latency percentiles and the ids found for each query
+    """
+    import chromadb
+    queries = np.load(os.path.join(workdir, "queries.npy"))
+    collection = chromadb.PersistentClient(path=workdir).get_collection(name)
+    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    collection.query(query_embeddings=queries[:1], n_results=k, include=[])  # loads the index
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids = collection.query(query_embeddings=query[None, :], n_results=k, include=[])["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        found.append([int(i) for i in ids])
+    latencies.sort()
+    return {"p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3), "found": found}
+
+
+def sweep(vectors: np.ndarray, queries: np.ndarray, k: int, ms: List[int], construction_efs: List[int],
+          search_efs: List[int], batch_size: int = 5000) -> List[Dict[str, Any]]:
+    """
+    Build a Chroma HNSW index of `vectors` for every (M, construction_ef) pair, then query it with every
+    search_ef (each in its own process, see `run_worker`).
+    :return: One result per setting: build time, recall@k against exact search, query latency percentiles
+    """
+    import chromadb
+    truth = exact_neighbors(vectors, queries, k)
+    workdir = tempfile.mkdtemp(prefix="vector_index_sweep_")
+    np.save(os.path.join(workdir, "queries.npy"), queries)
+    client = chromadb.PersistentClient(path=workdir)
+    results = []
+    for m, construction_ef in itertools.product(ms, construction_efs):
+        name = f"sweep-m{m}-ef{construction_ef}"
+        collection = client.create_collection(name=name, embedding_function=None, metadata={
+            "hnsw:space": "cosine", "hnsw:M": m, "hnsw:construction_ef": construction_ef})
+        started = time.perf_counter()
+        for start in range(0, len(vectors), batch_size):
+            collection.add(ids=[str(i) for i in range(start, min(start + batch_size, len(vectors)))],
+                           embeddings=vectors[start:start + batch_size])
+        build_seconds = time.perf_counter() - started
+        for search_ef in search_efs:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", name, "--workdir", workdir,
+                 "--search-ef", str(search_ef), "--k", str(k)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            worker = json.loads(output.strip().splitlines()[-1])
+            hits = sum(len(expected.intersection(found)) for expected, found in zip(truth, worker["found"]))
+            results.append({"M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                            "build_s": round(build_seconds, 2),
+                            f"recall@{k}": round(hits / sum(len(e) for e in truth), 4),
+                            "p50_ms": worker["p50_ms"], "p95_ms": worker["p95_ms"]})
+            print(" ".join(f"{key}={value}" for key, value in results[-1].items()))
+        client.delete_collection(name)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recall@k against exact search and query latency of the "
+                                                 "HNSW index for several parameter settings.")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Use this many clustered synthetic vectors instead of the stored embeddings")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors held out as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[64, 100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 20, 50, 100, 200])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.workdir, args.worker, args.search_ef[0], args.k)))
+        sys.exit(0)
+
+    cfg = LoadConfig()
+    if args.synthetic:
+        from benchmark_vector_storage import make_dataset
+        vectors, _ = make_dataset(args.synthetic, args.dim, 0, args.seed)
+    else:
+        vectors = load_vectors(cfg)
+    if len(vectors) <= args.k:
+        parser.exit(1, f"Only {len(vectors)} vectors: not enough to sweep, try --synthetic 50000.\n")
+    indexed, queries = split_queries(vectors, args.queries, args.seed)
+    print(f"{len(indexed)} vectors of dimension {indexed.shape[1]}, {len(queries)} queries, k={args.k}; "
+          f"configured: M={cfg.hnsw_m}, construction_ef={cfg.hnsw_construction_ef}, search_ef={cfg.hnsw_search_ef}")
+    results = sweep(indexed, queries, args.k, args.m, args.construction_ef, sorted(args.search_ef))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"vectors": len(indexed), "queries": len(queries), "k": args.k, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,51 @@
+import argparse
+import random
+import sqlite3
+from utils.load_config import LoadConfig
+from utils.text_codec import TextCodec, save_dictionary, train_dictionary
+
+
+def load_samples(db_paths: list, codec: TextCodec, max_samples: int, seed: int = 0) -> list:
+    """
+    :param db_paths: The chatbot database, or every shard
+    :param codec: Decodes texts that are already compressed
+    :param max_samples: Number of texts sampled (the most recent rows)
+    :return: Recent questions, answers and summaries
+    """
+    samples = []
+    for path in db_paths:
+        conn = sqlite3.connect(path)
+        try:
+            for question, answer in conn.execute("SELECT question, answer FROM chat_history ORDER BY id DESC LIMIT ?;",
+                                                 (max_samples,)):
+                samples += [codec.decode(question), codec.decode(answer)]
+            samples += [codec.decode(text) for (text,) in
+                        conn.execute("SELECT summary_text FROM summary ORDER BY id DESC LIMIT ?;", (max_samples,))]
+        finally:
+            conn.close()
+    random.Random(seed).shuffle(samples)
+    return samples[:max_samples]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the compression dictionary of the stored chat texts.")
+    parser.add_argument("--samples", type=int, default=5000, help="Texts the dictionary is trained on")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="Dictionary bytes (zlib uses at most 32 KB)")
+    parser.add_argument("--no-current", action="store_true", help="Save the dictionary without using it for new texts")
+    args = parser.parse_args()
+
+    cfg = LoadConfig()
+    codec = TextCodec.from_config(cfg)
+    if cfg.sharding_enabled:
+        from utils.sharded_sql_manager import ShardedSQLManager
+        db_paths = [shard.db_path for shard in ShardedSQLManager.from_config(cfg).shards()]
+    else:
+        db_paths = [str(cfg.db_path)]
+    samples = [s for s in load_samples(db_paths, codec, args.samples) if s]
+    if not samples:
+        parser.exit(1, "No chat history to train the dictionary on.\n")
+    dictionary = train_dictionary(samples, cfg.compression_algorithm, args.size)
+    dictionary_id = save_dictionary(dictionary, str(cfg.compression_dictionary_dir), not args.no_current)
+    print(f"Dictionary {dictionary_id:08x} ({len(dictionary)} bytes, {len(samples)} samples) saved to "
+          f"{cfg.compression_dictionary_dir}.")
+    print("Run `python src/prepare_sqldb.py --compress` to re-encode the stored texts with it.")
@@ -1,10 +1,9 @@
-import os
+import time
 import uuid
+from typing import Optional
 from dotenv import load_dotenv
-from .load_config import LoadConfig
-from mistralai import Mistral
-from .sql_manager import SQLManager
-from .user_manager import UserManager
+from .resource_registry import ResourceRegistry, get_registry
+from .turn_deadline import TurnDeadline, turn_deadline
 from .chat_history_manager import ChatHistoryManager
 from .prepare_system_prompt import prepare_system_prompt
 
@@ -14,29 +13,64 @@ class ChatBot:
     """
     Chatbot class that handle conversational flow
     """
-    def __init__(self):
+    def __init__(self, registry: Optional[ResourceRegistry] = None, session_id: Optional[str] = None):
         """
         Initialize the chatbot instance
 
         Setup Mistralai Client, Configuration Setting, Session ID, and database manager
+        :param registry: Shared process-wide resources. Defaults to the global registry.
+        :param session_id: Resume this session from its saved state (a new session is started if it has none).
+            Defaults to a new random session.
         """
-        self.cfg = LoadConfig()
-        self.client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+        self.registry = registry or get_registry()
+        self.cfg = self.registry.config
+        self.client = self.registry.model_client
+        self.llm_cache = self.registry.llm_cache
         self.chat_model = self.cfg.chat_model
         self.summary_model = self.cfg.summary_model
         self.max_history_pairs = self.cfg.max_history_pairs
 
-        self.sql_manager = SQLManager(self.cfg.db_path)
-        self.user_manager = UserManager(self.sql_manager)
-        self.session_id = str(uuid.uuid4())
-        self.chat_history_manager = ChatHistoryManager(self.sql_manager,self.user_manager.user_id,self.session_id,self.client,self.summary_model,self.cfg.max_tokens)
+        self.user_manager = self.registry.user_manager
+        # The shard holding this user's history (the single database when sharding is off)
+        self.sql_manager = self.registry.sql_manager.for_user(self.user_manager.user_id)
+        self.session_id = session_id or str(uuid.uuid4())
+        self.chat_history_manager = ChatHistoryManager(self.sql_manager,self.user_manager.user_id,self.session_id,self.client,self.summary_model,self.cfg.max_tokens,llm_cache=self.llm_cache,new_session=session_id is None,codec=self.registry.text_codec)
+        self.resumed = session_id is not None and self.chat_history_manager.load_state()
+        # Shared by the bots of the process, so the latency averages and savings cover all sessions
+        self.router = self.registry.model_router
+        self.last_turn_shed = []
+        self.last_turn_reads = {}
+        # Sampled turns are profiled when profiling_config (or CHATBOT_PROFILE) enables it, otherwise chat isn't wrapped
+        if self.registry.turn_profiler.enabled:
+            self.chat = self.registry.turn_profiler.wrap(self.chat, self.session_id,
+                                                         first_turn=self.chat_history_manager.turns + 1)
 
-    def chat(self, user_message: str) -> str:
+    def chat(self, user_message: str, latency_budget: Optional[float] = None) -> str:
         """
-        Handles the conversation with user and manages chat history
+        Handles the conversation with user and manages chat history.
+        The turn runs under a deadline: model calls are capped by the time left, and the escalation retry and
+        history summarization are shed when the budget is running out (recorded in `last_turn_shed`).
         :param user_message: The message from user
+        :param latency_budget: Seconds the turn may take. Defaults to `agent_config.turn_latency_budget`.
         :return: The Chatbot response or an error
         """
+        budget = self.cfg.turn_latency_budget if latency_budget is None else latency_budget
+        with turn_deadline(budget, self.cfg.final_answer_reserve, self.cfg.optional_stage_min_seconds) as deadline:
+            response = self._chat(user_message, deadline)
+        self.last_turn_shed = deadline.shed
+        # Summary and recent pairs come from the history manager's cache, only misses read SQLite
+        self.last_turn_reads = self.chat_history_manager.pop_turn_reads()
+        if self.cfg.persist_session_state:
+            # One upsert per turn, so a restarted process resumes the session where it was
+            self.chat_history_manager.save_state()
+        if deadline.shed:
+            print(f"[deadline] turn took {deadline.elapsed():.2f}s of {budget}s, shed: {', '.join(deadline.shed)}")
+        return response
+
+    def _chat(self, user_message: str, deadline: TurnDeadline) -> str:
+        """
+        Runs one turn under `deadline` (see `chat`).
+        """
         self.previous_summary = self.chat_history_manager.get_latest_summary()
         system_prompt = prepare_system_prompt(
             self.user_manager.user_info,
@@ -45,14 +79,20 @@ class ChatBot:
         )
         print("System Prompt: ",system_prompt)
 
+        decision = self.router.route(user_message, self.chat_history_manager.chat_history, self.previous_summary)
+        messages = [
+            {"role":"system","content":system_prompt},
+            {"role":"user","content":user_message}
+        ]
+
         try:
-            response = self.client.chat.complete(
-                model = self.chat_model,
-                messages=[
-                    {"role":"system","content":system_prompt},
-                    {"role":"user","content":user_message}
-                ]
-            )
+            start_time = time.perf_counter()
+            response = self.client.chat.complete(model = decision.model, messages=messages)
+            if self.router.should_escalate(decision, response) and not deadline.should_shed("escalation", 0.0):
+                decision = self.router.escalate(decision, time.perf_counter() - start_time, "low-confidence answer")
+                start_time = time.perf_counter()
+                response = self.client.chat.complete(model = decision.model, messages=messages)
+            self.router.record(decision, time.perf_counter() - start_time)
             assistance_response = response.choices[0].message.content
             self.chat_history_manager.add_to_history(
                 user_message,assistance_response,self.max_history_pairs
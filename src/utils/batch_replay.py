@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List
+
+# The chatbots catch model and tool failures and answer with an apology or an error message instead of raising
+ERROR_PREFIXES = ("I apologize", "Error:")
+
+
+def load_conversations(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read conversations from a JSONL file.
+
+    Each line is either `{"conversation_id": "...", "turns": ["hi", "..."]}` or
+    `{"conversation_id": "...", "messages": [{"role": "user", "content": "hi"}, ...]}`;
+    only user messages are replayed. Lines without a conversation_id are numbered.
+
+    :param path: Path to the JSONL file
+    :return: Iterator of {"conversation_id": str, "turns": list[str]}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "turns" in record:
+                turns = [str(t) for t in record["turns"]]
+            else:
+                turns = [m["content"] for m in record.get("messages", []) if m.get("role") == "user"]
+            yield {"conversation_id": str(record.get("conversation_id", line_number)), "turns": turns}
+
+
+def replay_conversation(create_chatbot: Callable[[], Any], conversation: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Replay one conversation turn by turn through a fresh chatbot session.
+    :param create_chatbot: Factory returning a new chatbot instance
+    :param conversation: {"conversation_id": str, "turns": list[str]}
+    :return: One result record per turn; `error` is set for exceptions and for error responses (ERROR_PREFIXES)
+    """
+    chatbot = create_chatbot()
+    results = []
+    for turn_index, user_message in enumerate(conversation["turns"]):
+        start_time = time.perf_counter()
+        error = None
+        try:
+            response = chatbot.chat(user_message)
+            if not response or str(response).startswith(ERROR_PREFIXES):
+                error = "error response"
+        except Exception as e:
+            response = None
+            error = f"{type(e).__name__}: {e}"
+        results.append({
+            "conversation_id": conversation["conversation_id"],
+            "session_id": getattr(chatbot, "session_id", None),
+            "turn": turn_index,
+            "user": user_message,
+            "assistant": response,
+            "latency_s": round(time.perf_counter() - start_time, 4),
+            "error": error,
+        })
+    return results
+
+
+def replay_conversations(create_chatbot: Callable[[], Any], input_path: str, output_path: str,
+                         concurrency: int = 4) -> Dict[str, Any]:
+    """
+    Replay every conversation of a JSONL file, `concurrency` conversations at a time, writing one JSON line
+    per turn to `output_path` as soon as its conversation finishes.
+
+    :param create_chatbot: Factory returning a new chatbot instance (one per conversation)
+    :param input_path: JSONL file of conversations
+    :param output_path: JSONL file receiving the responses and per-turn timings
+    :param concurrency: Number of conversations processed concurrently
+    :return: Summary with counts, wall time and latency percentiles
+    """
+    write_lock = threading.Lock()
+    latencies = []
+    errors = 0
+    conversations = 0
+    start_time = time.perf_counter()
+
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(replay_conversation, create_chatbot, conversation)
+                   for conversation in load_conversations(input_path)]
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                # The chatbot could not even be created for this conversation
+                print(f"Conversation failed: {e}")
+                errors += 1
+                continue
+            conversations += 1
+            with write_lock:
+                for record in results:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            latencies.extend(r["latency_s"] for r in results)
+            errors += sum(1 for r in results if r["error"])
+            print(f"Conversation {results[0]['conversation_id'] if results else '?'} replayed "
+                  f"({len(results)} turns).")
+
+    wall_time = time.perf_counter() - start_time
+    latencies.sort()
+    # Facts of the last turns are still being extracted in the background
+    from .resource_registry import get_registry
+    registry = get_registry()
+    if registry.is_loaded("fact_memory"):
+        registry.fact_memory.wait()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else 0.0
+
+    return {
+        "conversations": conversations,
+        "turns": len(latencies),
+        "errors": errors,
+        "wall_time_s": round(wall_time, 3),
+        "turns_per_second": round(len(latencies) / wall_time, 3) if wall_time else 0.0,
+        "p50_s": percentile(50),
+        "p95_s": percentile(95),
+        "p99_s": percentile(99),
+    }
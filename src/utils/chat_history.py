@@ -0,0 +1,211 @@
+import ast
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class ChatMessage:
+    """
+    One message of the in-memory chat history: its content and the rendered prompt fragment, with the fragment's
+    token count cached once computed.
+    """
+
+    __slots__ = ("role", "rendered", "token_count", "_content")
+
+    def __init__(self, role: str, content: str) -> None:
+        self.role = role
+        self._content: Optional[str] = content
+        # Same text as str({role: content}), so prompts look exactly like they did with the list of dicts
+        self.rendered = repr({role: content})
+        self.token_count: Optional[int] = None
+
+    @classmethod
+    def from_rendered(cls, role: str, rendered: str, token_count: Optional[int] = None) -> "ChatMessage":
+        """
+        Rebuild a message from its stored fragment and token count (e.g. a persisted session), without rendering
+        or tokenizing it again. The content is parsed back from the fragment on first use.
+        """
+        message = cls.__new__(cls)
+        message.role, message.rendered, message.token_count, message._content = role, rendered, token_count, None
+        return message
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = ast.literal_eval(self.rendered)[self.role]
+        return self._content
+
+    def as_dict(self) -> Dict[str, str]:
+        return {self.role: self.content}
+
+
+class ChatHistory:
+    """
+    Bounded chat history: a fixed-capacity ring buffer of ChatMessage records with O(1) append and eviction of the
+    oldest messages.
+
+    The prompt section is built by joining the cached fragments of the messages (and reused until the history
+    changes), and the token count is kept as a running total, so only new messages are ever tokenized.
+    `str(history)` renders the same text as the former list of `{"user": ...}` / `{"assistant": ...}` dicts.
+    """
+
+    __slots__ = ("_slots", "_start", "_size", "_max_messages", "token_counter", "_token_total", "_rendered",
+                 "_envelope_tokens")
+
+    def __init__(self, max_messages: Optional[int] = None, token_counter: Optional[Callable[[str], int]] = None) -> None:
+        """
+        Initializes the ChatHistory
+
+        :param max_messages: Maximum number of messages kept, the oldest are evicted first (None for unbounded)
+        :param token_counter: Function counting the tokens of a text (defaults to the GPT-4o-mini encoding)
+        """
+        self._slots: List[Optional[ChatMessage]] = []
+        self._start = 0
+        self._size = 0
+        self._max_messages = None
+        self.token_counter = token_counter
+        self._token_total = 0
+        self._rendered: Optional[str] = None
+        # role -> tokens of the fragment around the content, "{'user': ''}"
+        self._envelope_tokens: Dict[str, int] = {}
+        self.max_messages = max_messages
+
+    @property
+    def max_messages(self) -> Optional[int]:
+        return self._max_messages
+
+    @max_messages.setter
+    def max_messages(self, value: Optional[int]) -> None:
+        if value == self._max_messages and (value is None or len(self._slots) == value):
+            return
+        messages = list(self)
+        self._max_messages = value
+        if value is not None:
+            # Shrinking keeps the newest messages
+            for message in messages[:max(0, len(messages) - value)]:
+                self._forget(message)
+            messages = messages[len(messages) - min(len(messages), value):]
+            self._slots = messages + [None] * (value - len(messages))
+        else:
+            self._slots = messages
+        self._start = 0
+        self._size = len(messages)
+        self._rendered = None
+
+    def append(self, role: str, content: str, content_tokens: Optional[int] = None) -> None:
+        """
+        Add a message, evicting the oldest one when the history is full.
+        :param role: "user" or "assistant"
+        :param content: The message text
+        :param content_tokens: Tokens of `content` if they were already counted (e.g. to be stored with the
+            message); the message's count is then derived from it instead of tokenizing the fragment again
+        :return: None
+        """
+        message = ChatMessage(role, content)
+        if content_tokens is not None:
+            message.token_count = content_tokens + self._envelope(role)
+        self.append_message(message)
+
+    def _envelope(self, role: str) -> int:
+        if role not in self._envelope_tokens:
+            self._envelope_tokens[role] = self._counter()(repr({role: ""}))
+        return self._envelope_tokens[role]
+
+    def _counter(self) -> Callable[[str], int]:
+        if self.token_counter is None:
+            from .utilities import Utilities
+            self.token_counter = Utilities.count_number_of_tokens
+        return self.token_counter
+
+    def append_message(self, message: ChatMessage) -> None:
+        self._rendered = None
+        if self._max_messages == 0:
+            return
+        if message.token_count is not None:
+            # Already counted (re-appended or restored), add it to the running total
+            self._token_total += message.token_count
+        if self._max_messages is None:
+            self._slots.append(message)
+            self._size += 1
+            return
+        if self._size == self._max_messages:
+            self.popleft()
+        self._slots[(self._start + self._size) % self._max_messages] = message
+        self._size += 1
+
+    def extend(self, messages: Iterable[ChatMessage]) -> None:
+        for message in messages:
+            self.append_message(message)
+
+    def popleft(self) -> ChatMessage:
+        """
+        Evict the oldest message.
+        :return: The evicted message
+        """
+        if self._size == 0:
+            raise IndexError("pop from an empty chat history")
+        message = self._slots[self._start]
+        if self._max_messages is None:
+            del self._slots[0]
+        else:
+            self._slots[self._start] = None
+            self._start = (self._start + 1) % self._max_messages
+        self._size -= 1
+        self._forget(message)
+        return message
+
+    def _forget(self, message: ChatMessage) -> None:
+        if message.token_count is not None:
+            self._token_total -= message.token_count
+        self._rendered = None
+
+    def clear(self) -> None:
+        self._slots = [None] * self._max_messages if self._max_messages is not None else []
+        self._start = 0
+        self._size = 0
+        self._token_total = 0
+        self._rendered = None
+
+    def render(self, messages: Optional[Iterable[ChatMessage]] = None) -> str:
+        """
+        Render messages as the prompt section.
+        :param messages: A subset of the messages, the whole history by default
+        :return: The rendered text
+        """
+        if messages is not None:
+            return "[" + ", ".join(m.rendered for m in messages) + "]"
+        if self._rendered is None:
+            self._rendered = "[" + ", ".join(m.rendered for m in self) + "]"
+        return self._rendered
+
+    def token_count(self) -> int:
+        """
+        Number of tokens of the rendered history, summed from the cached per-message counts. The separators between
+        fragments are counted as one token each, which keeps the total within a few tokens of encoding the whole text
+        (as do messages appended with the token count of their content).
+        :return: The token count
+        """
+        token_counter = self._counter()
+        for message in self:
+            if message.token_count is None:
+                message.token_count = token_counter(message.rendered)
+                self._token_total += message.token_count
+        return self._token_total + self._size + 1
+
+    def as_dicts(self) -> List[Dict[str, str]]:
+        """
+        :return: The history as a list of `{role: content}` dicts
+        """
+        return [m.as_dict() for m in self]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        if self._max_messages is None:
+            return iter(self._slots)
+        return (self._slots[(self._start + i) % self._max_messages] for i in range(self._size))
+
+    def __str__(self) -> str:
+        return self.render()
+
+    def __repr__(self) -> str:
+        return self.render()
@@ -1,67 +1,251 @@
+import sqlite3
+import zlib
+from collections import deque
 from importlib.resources import contents
-from typing import Optional, List
-from mistralai import Mistral
+from typing import Dict, Optional, List, TYPE_CHECKING
 from .sql_manager import SQLManager
 from .utilities import Utilities
+from .llm_cache import LLMCache
+from .chat_history import ChatHistory, ChatMessage
+from .db_schema import create_tables
+from .text_codec import TextCodec
+from .turn_deadline import current_deadline
 import json
 
+if TYPE_CHECKING:
+    from mistralai import Mistral
+
+#bumped when the layout of the session_state blob changes; older blobs are ignored
+SESSION_STATE_FORMAT = 1
+
+UPSERT_SESSION_STATE_QUERY = """
+    INSERT INTO session_state (session_id, user_id, state) VALUES (?, ?, ?)
+    ON CONFLICT (session_id) DO UPDATE SET user_id = excluded.user_id, state = excluded.state,
+    updated_at = CURRENT_TIMESTAMP;
+"""
+
 class ChatHistoryManager:
     """
     Manages chat history and summarization for a user session
+
+    The latest summary and the recent pairs of the session are cached: they are read from SQLite once, then kept
+    up to date write-through by `save_to_db` and `save_summary_to_db`, so a steady-state turn performs no SQL
+    reads (with `new_session`, not even the first turn). Every write bumps `version`; a cached value is only served
+    if it was filled or updated at the current version, so a value a write couldn't be applied to (or
+    `invalidate()`) makes the next read go to SQLite.
+    Cache hits and SQL reads are counted in `read_stats` and per turn (`pop_turn_reads`).
+
+    Questions, answers and summaries go through `codec` (see TextCodec): long texts are stored compressed when
+    compression is enabled, and every read decodes them. Compressed pairs are also added to the chat_history_fts
+    search index, since LIKE can't see through compression.
     """
 
-    def __init__(self,sql_manager: SQLManager,user_id: str,session_id: str, client: Mistral, summary_model: str,max_tokens: int) -> None:
+    def __init__(self,sql_manager: SQLManager,user_id: str,session_id: str, client: "Mistral", summary_model: str,max_tokens: int, llm_cache: Optional[LLMCache] = None, cache_pairs: int = 16, new_session: bool = False, codec: Optional[TextCodec] = None) -> None:
         self.utils = Utilities()
+        self.codec = codec or TextCodec()
+        self.llm_cache = llm_cache
         self.client = client
         self.summary_model = summary_model
         self.max_tokens = max_tokens
         self.sql_manager = sql_manager
         self.user_id = user_id
         self.session_id = session_id
-        self.chat_history = []
+        self.chat_history = ChatHistory()
         self.pairs_since_last_summary = 0 #track pair added since last summary
+        self.turns = 0 #pairs added in this session, restored with the session state
+        #read cache: (version, value) entries, the pairs entry also records whether it holds the whole session
+        self.cache_pairs = cache_pairs
+        self.version = 0
+        self._summary_cache: Optional[tuple] = None
+        self._pairs_cache: Optional[tuple] = None
+        if new_session:
+            #a session id that was just generated has no rows yet: nothing to read
+            self._summary_cache = (self.version, None)
+            self._pairs_cache = (self.version, deque(maxlen=cache_pairs), True)
+        self.read_stats = {"cache_hits": 0, "sql_reads": 0}
+        self._turn_reads = {"cache_hits": 0, "sql_reads": 0}
+
+    def _count(self, hit: bool) -> None:
+        key = "cache_hits" if hit else "sql_reads"
+        self.read_stats[key] += 1
+        self._turn_reads[key] += 1
+
+    def pop_turn_reads(self) -> Dict[str, int]:
+        """
+        :return: Cache hits and SQL reads since the previous call (i.e. during the last turn)
+        """
+        reads, self._turn_reads = self._turn_reads, {"cache_hits": 0, "sql_reads": 0}
+        return reads
+
+    def _write_through(self, pair: Optional[tuple] = None, summary: Optional[str] = None) -> None:
+        """
+        Bump the version after a write of this session, applying the write to the cached values that were
+        current so they stay valid.
+        :param pair: The (question, answer) pair just saved
+        :param summary: The summary just saved
+        """
+        previous, self.version = self.version, self.version + 1
+        if summary is not None:
+            self._summary_cache = (self.version, summary)
+        elif self._summary_cache is not None and self._summary_cache[0] == previous:
+            self._summary_cache = (self.version, self._summary_cache[1])
+        if self._pairs_cache is not None and self._pairs_cache[0] == previous:
+            _, pairs, complete = self._pairs_cache
+            if pair is not None:
+                #once full, the oldest pair is dropped and the cache no longer holds the whole session
+                complete = complete and len(pairs) < pairs.maxlen
+                pairs.append(pair)
+            self._pairs_cache = (self.version, pairs, complete)
+
+    def invalidate(self) -> None:
+        """Drop the cached summary and pairs, e.g. after the session's rows were changed by another process."""
+        self.version += 1
+
+    def export_state(self) -> bytes:
+        """
+        Serialize the working memory of the session: the history window with its cached token counts, the
+        summary counter, and the cached summary and recent pairs.
+        :return: zlib-compressed JSON
+        """
+        state = {
+            "format": SESSION_STATE_FORMAT,
+            "max_messages": self.chat_history.max_messages,
+            "history": [[m.role, m.rendered, m.token_count] for m in self.chat_history],
+            "pairs_since_last_summary": self.pairs_since_last_summary,
+            "turns": self.turns,
+        }
+        if self._summary_cache is not None and self._summary_cache[0] == self.version:
+            state["summary"] = self._summary_cache[1]
+        if self._pairs_cache is not None and self._pairs_cache[0] == self.version:
+            state["pairs"] = [list(pair) for pair in self._pairs_cache[1]]
+            state["pairs_maxlen"] = self._pairs_cache[1].maxlen
+            state["pairs_complete"] = self._pairs_cache[2]
+        return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+    def restore_state(self, blob: bytes) -> bool:
+        """
+        Restore the working memory saved by `export_state`. Messages keep their token counts, so nothing is
+        re-tokenized, and the restored summary and pairs are served from the cache.
+        :param blob: The serialized state
+        :return: False if the blob has an unknown format
+        """
+        state = json.loads(zlib.decompress(blob))
+        if state.get("format") != SESSION_STATE_FORMAT:
+            return False
+        self.chat_history.clear()
+        self.chat_history.max_messages = state["max_messages"]
+        self.chat_history.extend(ChatMessage.from_rendered(role, rendered, tokens)
+                                 for role, rendered, tokens in state["history"])
+        self.pairs_since_last_summary = state["pairs_since_last_summary"]
+        #0 for states saved before the turn count existed
+        self.turns = state.get("turns", 0)
+        self.version += 1
+        self._summary_cache = (self.version, state["summary"]) if "summary" in state else None
+        self._pairs_cache = None
+        if "pairs" in state:
+            pairs = deque((tuple(pair) for pair in state["pairs"]), maxlen=state["pairs_maxlen"])
+            self._pairs_cache = (self.version, pairs, state["pairs_complete"])
+        return True
+
+    def save_state(self) -> None:
+        """
+        Persist the session state (see `export_state`) in the session_state table, one row per session.
+        """
+        params = (self.session_id, self.user_id or None, self.export_state())
+        for attempt in range(2):
+            try:
+                self.sql_manager.execute_query(UPSERT_SESSION_STATE_QUERY, params)
+                return
+            except sqlite3.Error as e:
+                if attempt == 0 and "no such table" in str(e):
+                    #database prepared before session states existed
+                    with self.sql_manager.pool.connection() as conn:
+                        create_tables(conn)
+                    continue
+                #the turn is already answered, the session just won't resume from this point
+                print(f"Failed to save the session state: {e}")
+                return
+
+    def load_state(self) -> bool:
+        """
+        Resume the session from its persisted state, in a single read.
+        :return: True if a state was found and restored
+        """
+        self._count(hit=False)
+        try:
+            row = self.sql_manager.execute_query("SELECT state FROM session_state WHERE session_id = ?;",
+                                                 (self.session_id,), fetch_one=True)
+        except sqlite3.OperationalError:
+            return False
+        return bool(row) and self.restore_state(row[0])
 
-    def add_to_history(self,user_message: str,assistant_response: str, max_history_pairs: int) -> None:
+    def add_to_history(self,user_message: str,assistant_response: str, max_history_pairs: int) -> Optional[int]:
         """
         Add the user message and assistant response to the chat history and save to the database.
         :param user_message: The user's message
         :param assistant_response: The assistant's response
         :param max_history_pairs: The maximum number of message pairs to keep in history.
-        :return: None
+        :return: The chat_history row id of the pair, None if it wasn't saved
         """
-        self.chat_history.append({"user": user_message})
-        self.chat_history.append({"assistant": assistant_response})
-
-        if len(self.chat_history) > max_history_pairs * 2:
-            self.chat_history = self.chat_history[-max_history_pairs*2:]
-        self.save_to_db(user_message,assistant_response)
+        self.chat_history.max_messages = max_history_pairs * 2
+        #each message is tokenized once, for the stored counts and the history's running total
+        question_tokens = self.utils.count_number_of_tokens(user_message)
+        answer_tokens = self.utils.count_number_of_tokens(assistant_response)
+        self.chat_history.append("user", user_message, question_tokens)
+        self.chat_history.append("assistant", assistant_response, answer_tokens)
+        row_id = self.save_to_db(user_message,assistant_response,question_tokens,answer_tokens)
         self.pairs_since_last_summary += 1
+        self.turns += 1
         print("Chat history saved to database. ")
-        chat_history_token_count = self.utils.count_number_of_tokens(str(self.chat_history))
+        chat_history_token_count = self.chat_history.token_count()
         if chat_history_token_count > self.max_tokens:
+            turn = current_deadline()
+            if turn is not None and turn.should_shed("history_summary"):
+                # The history stays over the limit, so the next turn with time to spare summarizes it
+                print("Out of time in this turn, chat history summarization postponed.")
+                return row_id
             print("Summarizing the Chat History... ")
             print("\n Old number of tokens : ",chat_history_token_count)
 
             self.summarize_chat_history()
-            chat_history_token_count = self.utils.count_number_of_tokens(str(self.chat_history))
+            chat_history_token_count = self.chat_history.token_count()
             print("\n New number of tokens : ",chat_history_token_count)
+        return row_id
 
-    def save_to_db(self,user_message:str, assistant_response:str) -> None:
+    def save_to_db(self,user_message:str, assistant_response:str, question_tokens: Optional[int] = None, answer_tokens: Optional[int] = None) -> Optional[int]:
         """
         Saves the user_message and assistant_response to databases.
         :param user_message: The user's message
         :param assistant_response: The assistant's response
-        :return: None
+        :param question_tokens: Tokens of user_message, counted here if not given
+        :param answer_tokens: Tokens of assistant_response, counted here if not given
+        :return: The id of the new chat_history row, None without a user
         """
         if not self.user_id:
             print("No user found in database.")
-            return
+            return None
 
         query = """
-            INSERT INTO chat_history (user_id, question, answer, session_id)
-            VALUES (?, ?, ?, ?);
+            INSERT INTO chat_history (user_id, question, answer, session_id, question_tokens, answer_tokens)
+            VALUES (?, ?, ?, ?, ?, ?);
         """
-        self.sql_manager.execute_query(query,(self.user_id,user_message,assistant_response,self.session_id))
+        #token counts are stored once here, so token-budgeted windows are selected in SQL
+        if question_tokens is None:
+            question_tokens = self.utils.count_number_of_tokens(user_message)
+        if answer_tokens is None:
+            answer_tokens = self.utils.count_number_of_tokens(assistant_response)
+        params = (self.user_id,self.codec.encode(user_message),self.codec.encode(assistant_response),self.session_id,
+                  question_tokens,answer_tokens)
+        if self.codec.enabled:
+            with self.sql_manager.transaction() as cursor:
+                cursor.execute(query,params)
+                row_id = cursor.lastrowid
+                cursor.execute("INSERT INTO chat_history_fts (rowid, question, answer) VALUES (?, ?, ?);",
+                               (row_id,user_message,assistant_response))
+        else:
+            row_id = self.sql_manager.execute_insert(query,params)
+        self._write_through(pair=(user_message, assistant_response))
+        return row_id
 
     def get_latest_chat_pairs(self,num_pairs) -> List[tuple]:
         """
@@ -71,15 +255,54 @@ class ChatHistoryManager:
         :return:
             List[tuple]: List of tuple containing user question and assistant answer
         """
+        rows = num_pairs * 2
+        cached = self._pairs_cache
+        if cached is not None and cached[0] == self.version and (cached[2] or rows <= len(cached[1])):
+            self._count(hit=True)
+            return list(cached[1])[-rows:] if rows else []
         query = """
             SELECT question,answer from chat_history
             where session_id = ?
-            ORDER BY timestamp DESC
+            ORDER BY timestamp DESC, id DESC
             LIMIT ?;
         """
-        chat_data = self.sql_manager.execute_query(query,(self.session_id,num_pairs * 2),fetch_all=True)
+        self._count(hit=False)
+        limit = max(rows, self.cache_pairs)
+        chat_data = self.sql_manager.execute_query(query,(self.session_id,limit),fetch_all=True)
         #reverse to maintain the chronological order
-        return list(reversed(chat_data))
+        chat_data = self.codec.decode_rows(list(reversed(chat_data)), (0, 1))
+        #fewer rows than asked for means the cache holds the whole session
+        self._pairs_cache = (self.version, deque(chat_data, maxlen=limit), len(chat_data) < limit)
+        return chat_data[-rows:] if rows else []
+
+    def get_latest_chat_pairs_within_tokens(self, max_tokens: int, max_pairs: Optional[int] = None) -> List[tuple]:
+        """
+        Fetches the most recent pairs of the session whose questions and answers fit in `max_tokens` tokens,
+        selected in SQL with a running SUM over the stored token counts (nothing is tokenized here).
+        Rows written before the counts existed and not backfilled are estimated at 4 characters per token.
+
+        :param max_tokens: The token budget of the window
+        :param max_pairs: Optional maximum number of pairs
+        :return:
+            List[tuple]: (question, answer) tuples in chronological order; the newest pair alone may not fit,
+            in which case the list is empty
+        """
+        query = """
+            SELECT question, answer FROM (
+                SELECT id, timestamp, question, answer,
+                    SUM(COALESCE(question_tokens, LENGTH(question) / 4) + COALESCE(answer_tokens, LENGTH(answer) / 4))
+                        OVER (ORDER BY timestamp DESC, id DESC ROWS UNBOUNDED PRECEDING) AS running_tokens
+                FROM chat_history
+                WHERE session_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            )
+            WHERE running_tokens <= ?
+            ORDER BY timestamp, id;
+        """
+        self._count(hit=False)
+        limit = max_pairs if max_pairs is not None else -1
+        return self.codec.decode_rows(self.sql_manager.execute_query(query,(self.session_id,limit,max_tokens),fetch_all=True), (0, 1))
 
     def get_latest_summary(self) -> Optional[str]:
         """
@@ -87,12 +310,18 @@ class ChatHistoryManager:
         :return:
             Optional[str]: The latest summary or None if no summary exists
         """
+        cached = self._summary_cache
+        if cached is not None and cached[0] == self.version:
+            self._count(hit=True)
+            return cached[1]
         query = """
             SELECT summary_text FROM summary
-            WHERE session_id = ? ORDER BY timestamp DESC LIMIT 1;
+            WHERE session_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1;
         """
+        self._count(hit=False)
         summary = self.sql_manager.execute_query(query,(self.session_id,),fetch_one=True)
-        return summary[0] if summary else None
+        self._summary_cache = (self.version, self.codec.decode(summary[0]) if summary else None)
+        return self._summary_cache[1]
 
     def save_summary_to_db(self,summary_text:str) -> None:
         """
@@ -104,9 +333,10 @@ class ChatHistoryManager:
         if not self.user_id and summary_text:
             return
         query = """
-            INSERT INTO summary (user_id, session_id, summary_text) VALUES (?,?,?);
+            INSERT INTO summary (user_id, session_id, summary_text, token_count) VALUES (?,?,?,?);
         """
-        self.sql_manager.execute_query(query,(self.user_id,self.session_id,summary_text))
+        self.sql_manager.execute_query(query,(self.user_id,self.session_id,self.codec.encode(summary_text),self.utils.count_number_of_tokens(summary_text)))
+        self._write_through(summary=summary_text)
         print("Summary saved to database!!")
 
     def update_chat_summary(self, max_history_pairs :int) -> None:
@@ -119,6 +349,10 @@ class ChatHistoryManager:
         print("Pair since last summary: ",self.pairs_since_last_summary)
         if self.pairs_since_last_summary < max_history_pairs:
             return None
+        turn = current_deadline()
+        if turn is not None and turn.should_shed("session_summary"):
+            print("Out of time in this turn, summary update postponed.")
+            return None
         #Fetch the latest two pairs (if available)
         chat_data = self.get_latest_chat_pairs(max_history_pairs)
 
@@ -139,7 +373,7 @@ class ChatHistoryManager:
             self.pairs_since_last_summary = 0
             print("Chat history summary generated and saved to database.")
 
-    def generate_the_new_summary(self,client: Mistral, summary_model: str, chat_data: List[tuple], previous_summary: Optional[str]) -> Optional[str]:
+    def generate_the_new_summary(self,client: "Mistral", summary_model: str, chat_data: List[tuple], previous_summary: Optional[str]) -> Optional[str]:
         """
         Generate the summary from the latest two pairs and previous summary
         :param client: The Client Object used for calling AI model
@@ -163,13 +397,18 @@ class ChatHistoryManager:
 
         summary_prompt += "Provide concise summary while preserving the important details."
 
+        messages = [
+            {"role": "system","content": summary_prompt}
+        ]
         try:
-            response = client.chat.complete(
-                model=summary_model,
-                messages=[
-                    {"role": "system","content": summary_prompt}
-                ]
-            )
+            if self.llm_cache is not None:
+                # temperature 0 makes the summary deterministic, so identical inputs can be served from the cache
+                response = self.llm_cache.complete(client, summary_model, messages, temperature=0.0)
+            else:
+                response = client.chat.complete(
+                    model=summary_model,
+                    messages=messages
+                )
             content = response.choices[0].message.content
             return str(content) if content else None
         except Exception as e:
@@ -183,7 +422,8 @@ class ChatHistoryManager:
         """
         #select older pair to summarize (keep latest pair untouched)
         pairs_to_keep = 1
-        pairs_to_summarize = self.chat_history[:-pairs_to_keep * 2]
+        messages = list(self.chat_history)
+        pairs_to_summarize = messages[:-pairs_to_keep * 2]
 
         if len(pairs_to_summarize) == 0:
             return
@@ -191,7 +431,7 @@ class ChatHistoryManager:
         #Create prompt for summarization
         prompt = f"""
         Summarize the following conversation  while preserving the key details and the conversational's tone:
-        {pairs_to_summarize}
+        {self.chat_history.render(pairs_to_summarize)}
         Return the summarized conversation (in JSON format with 'user' and 'assistant' pairs)
         """
         try:
@@ -220,8 +460,11 @@ class ChatHistoryManager:
                     for pair in summarized_pairs
             ):
                 # Keep latest pairs + summarized history
-                self.chat_history = summarized_pairs + \
-                                    self.chat_history[-pairs_to_keep * 2:]
+                self.chat_history.clear()
+                for pair in summarized_pairs:
+                    self.chat_history.append("user", str(pair["user"]))
+                    self.chat_history.append("assistant", str(pair["assistant"]))
+                self.chat_history.extend(messages[-pairs_to_keep * 2:])
                 print("Chat history summarized.")
             else:
                 raise ValueError("Invalid format received from LLM.")
@@ -1,17 +1,15 @@
-import os
+import time
 import uuid
+from typing import Optional
 import json
 from dotenv import load_dotenv
-from mistralai import Mistral
 from traceback import format_exc
-from .sql_manager import SQLManager
-from .user_manager import UserManager
 from .chat_history_manager import ChatHistoryManager
 from .search_manager import SearchManager
 from .prepare_system_prompt import prepare_system_prompt_for_agentic_chatbot_v3
 from .utilities import Utilities
-from .load_config import LoadConfig
-from .vectordb_manager import VectorDBManager
+from .resource_registry import ResourceRegistry, get_registry
+from .turn_deadline import TurnDeadline, turn_deadline
 
 load_dotenv()
 
@@ -21,36 +19,63 @@ class ChatBot:
     Chatbot class that handles conversational flow, manages user data, and executes function calls using Mistral's API.
     """
 
-    def __init__(self):
+    def __init__(self, registry: Optional[ResourceRegistry] = None, session_id: Optional[str] = None):
         """
         Initializes the Chatbot instance.
 
         Sets up Mistral client, configuration settings, session ID, and database managers.
+
+        Args:
+            registry (ResourceRegistry, optional): Shared process-wide resources. Defaults to the global registry.
+            session_id (str, optional): Resume this session from its saved state (a new session is started if it
+                has none). Defaults to a new random session.
         """
-        self.client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
-        self.cfg = LoadConfig()
+        self.registry = registry or get_registry()
+        self.cfg = self.registry.config
+        self.client = self.registry.model_client
+        self.llm_cache = self.registry.llm_cache
         self.chat_model = self.cfg.chat_model
         self.summary_model = self.cfg.summary_model
         self.temperature = self.cfg.temperature
         self.max_history_pairs = self.cfg.max_history_pairs
 
-        self.session_id = str(uuid.uuid4())
+        self.session_id = session_id or str(uuid.uuid4())
         self.utils = Utilities()
-        self.sql_manager = SQLManager(str(self.cfg.db_path))
-        self.user_manager = UserManager(self.sql_manager)
+        self.user_manager = self.registry.user_manager
+        # The shard holding this user's history (the single database when sharding is off)
+        self.sql_manager = self.registry.sql_manager.for_user(self.user_manager.user_id)
         self.chat_history_manager = ChatHistoryManager(
-            self.sql_manager, str(self.user_manager.user_id) if self.user_manager.user_id else "", self.session_id, self.client, self.summary_model, self.cfg.max_tokens)
+            self.sql_manager, str(self.user_manager.user_id) if self.user_manager.user_id else "", self.session_id, self.client, self.summary_model, self.cfg.max_tokens,
+            llm_cache=self.llm_cache, new_session=session_id is None, codec=self.registry.text_codec)
+        self.resumed = session_id is not None and self.chat_history_manager.load_state()
+
+        self.vector_db_manager = self.registry.vector_db_manager
 
-        self.vector_db_manager = VectorDBManager(self.cfg)
+        # Shared by the bots of the process, so the latency averages and savings cover all sessions
+        self.router = self.registry.model_router
+        self.last_turn_shed = []
+        self.last_turn_reads = {}
 
         self.search_manager = SearchManager(
-            self.sql_manager, self.utils, self.client, self.summary_model, self.cfg.max_characters)
-        self.agent_functions = [self.utils.jsonschema(self.user_manager.add_user_info_to_database),
-                                self.utils.jsonschema(self.vector_db_manager.search_vector_db)]
+            self.sql_manager, self.utils, self.client, self.summary_model, self.cfg.max_characters,
+            llm_cache=self.llm_cache, snippet_window=self.cfg.search_snippet_window,
+            llm_summary_fallback=self.cfg.search_llm_summary_fallback, codec=self.registry.text_codec)
+        tools = [self.user_manager.add_user_info_to_database, self.vector_db_manager.search_vector_db]
+        # Facts are extracted from every saved pair in the background and searched without a RAG call
+        self.fact_memory = self.registry.fact_memory if self.cfg.fact_memory_enabled else None
+        if self.fact_memory is not None:
+            tools.insert(0, self.fact_memory.for_user(self.user_manager.user_id).search_facts)
+        self.tools = self.registry.tool_runtime.bind(*tools)
+        self.agent_functions = self.tools.schemas
+        # Sampled turns are profiled when profiling_config (or CHATBOT_PROFILE) enables it, otherwise chat isn't wrapped
+        if self.registry.turn_profiler.enabled:
+            self.chat = self.registry.turn_profiler.wrap(self.chat, self.session_id,
+                                                         first_turn=self.chat_history_manager.turns + 1)
 
     def execute_function_call(self, function_name: str, function_args: dict) -> tuple[str, str]:
         """
         Executes the requested function based on the function name and arguments.
+        Dispatch goes through the tool runtime, which enforces each tool's timeout and concurrency limit.
 
         Args:
             function_name (str): The name of the function to execute.
@@ -59,26 +84,40 @@ class ChatBot:
         Returns:
             tuple[str, str]: A tuple containing the function state and result.
         """
-        try:
-            if function_name == "search_vector_db":
-                return self.vector_db_manager.search_vector_db(**function_args)
-            elif function_name == "add_user_info_to_database":
-                return self.user_manager.add_user_info_to_database(**function_args)
-            else:
-                return "Function call failed.", f"Unknown function: {function_name}"
-        except Exception as e:
-            return "Function call failed.", f"Error executing {function_name}: {str(e)}"
+        return self.tools.execute(function_name, function_args)
 
-    def chat(self, user_message: str) -> str:
+    def chat(self, user_message: str, latency_budget: Optional[float] = None) -> str:
         """
         Handles a conversation with the user, manages chat history, and executes function calls if needed.
 
+        The turn runs under a deadline: model and tool calls are capped by the time left, and when the budget is
+        running out optional stages (tool calls, RAG and history summarization) are shed and a final answer is
+        forced. The shed stages are kept in `last_turn_shed`.
+
         Args:
             user_message (str): The message from the user.
+            latency_budget (float, optional): Seconds the turn may take. Defaults to `agent_config.turn_latency_budget`.
 
         Returns:
             str: The chatbot's response or an error message.
         """
+        budget = self.cfg.turn_latency_budget if latency_budget is None else latency_budget
+        with turn_deadline(budget, self.cfg.final_answer_reserve, self.cfg.optional_stage_min_seconds) as deadline:
+            response = self._chat(user_message, deadline)
+        self.last_turn_shed = deadline.shed
+        # Summary and recent pairs come from the history manager's cache, only misses read SQLite
+        self.last_turn_reads = self.chat_history_manager.pop_turn_reads()
+        if self.cfg.persist_session_state:
+            # One upsert per turn, so a restarted process resumes the session where it was
+            self.chat_history_manager.save_state()
+        if deadline.shed:
+            print(f"[deadline] turn took {deadline.elapsed():.2f}s of {budget}s, shed: {', '.join(deadline.shed)}")
+        return response
+
+    def _chat(self, user_message: str, deadline: TurnDeadline) -> str:
+        """
+        Runs one turn under `deadline` (see `chat`).
+        """
         try:
             # Initialize variables
             function_call_result_section = ""
@@ -91,6 +130,7 @@ class ChatBot:
             # Get chat history and previous summary
             self.chat_history = self.chat_history_manager.chat_history
             self.previous_summary = self.chat_history_manager.get_latest_summary()
+            decision = self.router.route(user_message, self.chat_history, self.previous_summary)
             
             # Main conversation loop
             while function_call_count < self.cfg.max_function_calls:
@@ -104,6 +144,10 @@ class ChatBot:
                     if function_call_state == "Function call successful." and function_name == "add_user_info_to_database":
                         self.user_manager.refresh_user_info()
 
+                # Not enough time left for another round trip with tools: force the final answer
+                if deadline.should_shed("tool_calls"):
+                    break
+
                 # Check if we've reached the function call limit
                 if function_call_count >= self.cfg.max_function_calls:
                     function_call_result_section += (
@@ -116,7 +160,8 @@ class ChatBot:
                     str(self.user_manager.user_info) if self.user_manager.user_info else "",
                     self.previous_summary or "",
                     str(self.chat_history),
-                    function_call_result_section
+                    function_call_result_section,
+                    fact_search=self.fact_memory is not None
                 )
 
                 # Debug output (consider removing in production)
@@ -125,8 +170,9 @@ class ChatBot:
                 print(f"Function call count: {function_call_count}")
 
                 # Make API call to Mistral
+                start_time = time.perf_counter()
                 response = self.client.chat.complete(
-                    model=self.chat_model,
+                    model=decision.model,
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": user_message}
@@ -136,16 +182,24 @@ class ChatBot:
                     temperature=self.temperature
                 )
 
+                # Redo the turn on the large model if the small model wants tools or is unsure
+                if self.router.should_escalate(decision, response):
+                    reason = "tool call requested" if response.choices[0].message.tool_calls else "low-confidence answer"
+                    decision = self.router.escalate(decision, time.perf_counter() - start_time, reason)
+                    continue
+                self.router.record(decision, time.perf_counter() - start_time)
+
                 # Handle response with content (regular message)
                 if response.choices[0].message.content:
                     assistant_response = response.choices[0].message.content
                     if isinstance(assistant_response, str):
-                        self.chat_history_manager.add_to_history(
+                        source_id = self.chat_history_manager.add_to_history(
                             user_message, assistant_response, self.max_history_pairs
                         )
+                        self._extract_facts(source_id, user_message, assistant_response)
                         self.chat_history_manager.update_chat_summary(self.max_history_pairs)
                         msg_pair = {"user": user_message, "assistant": assistant_response}
-                        self.vector_db_manager.update_vector_db(msg_pair)
+                        self.vector_db_manager.update_vector_db(msg_pair, self.user_manager.user_id)
                         self.vector_db_manager.refresh_vector_db_client()
                         return assistant_response
                     else:
@@ -157,11 +211,12 @@ class ChatBot:
                     if function_call_count >= self.cfg.max_function_calls:
                         print("Function call limit reached, using fallback response...")
                         assistant_response = self._get_fallback_response(system_prompt, user_message)
-                        self.chat_history_manager.add_to_history(
+                        source_id = self.chat_history_manager.add_to_history(
                             user_message, assistant_response, self.max_history_pairs
                         )
+                        self._extract_facts(source_id, user_message, assistant_response)
                         msg_pair = {"user": user_message, "assistant": assistant_response}
-                        self.vector_db_manager.update_vector_db(msg_pair)
+                        self.vector_db_manager.update_vector_db(msg_pair, self.user_manager.user_id)
                         self.vector_db_manager.refresh_vector_db_client()
                         return assistant_response
 
@@ -195,20 +250,25 @@ class ChatBot:
                     return "I apologize, but I didn't generate a proper response. Please try rephrasing your question."
 
             # If we exit the loop due to max function calls, provide a fallback response
-            print("Maximum function calls reached, providing fallback response...")
+            if "tool_calls" in deadline.shed:
+                print("Turn latency budget running out, providing fallback response...")
+            else:
+                print("Maximum function calls reached, providing fallback response...")
             system_prompt = prepare_system_prompt_for_agentic_chatbot_v3(
                 str(self.user_manager.user_info) if self.user_manager.user_info else "",
                 self.previous_summary or "",
                 str(self.chat_history),
-                function_call_result_section + "\n\n# Function Call Limit Reached.\nPlease conclude the conversation with the user based on the available information."
+                function_call_result_section + "\n\n# Function Call Limit Reached.\nPlease conclude the conversation with the user based on the available information.",
+                fact_search=self.fact_memory is not None
             )
 
             assistant_response = self._get_fallback_response(system_prompt, user_message)
-            self.chat_history_manager.add_to_history(
+            source_id = self.chat_history_manager.add_to_history(
                 user_message, assistant_response, self.max_history_pairs
             )
+            self._extract_facts(source_id, user_message, assistant_response)
             msg_pair = {"user": user_message, "assistant": assistant_response}
-            self.vector_db_manager.update_vector_db(msg_pair)
+            self.vector_db_manager.update_vector_db(msg_pair, self.user_manager.user_id)
             self.vector_db_manager.refresh_vector_db_client()
             return assistant_response
 
@@ -217,6 +277,18 @@ class ChatBot:
             print(f"Error in chat method: {str(e)}\n{format_exc()}")
             return error_msg
 
+    def _extract_facts(self, source_id: Optional[int], user_message: str, assistant_response: str) -> None:
+        """
+        Queue the fact extraction of a saved pair. It runs in the background, so the turn doesn't wait for it.
+
+        Args:
+            source_id (int, optional): The chat_history row of the pair.
+            user_message (str): The message from the user.
+            assistant_response (str): The chatbot's response.
+        """
+        if self.fact_memory is not None and source_id is not None:
+            self.fact_memory.submit(self.user_manager.user_id, source_id, user_message, assistant_response)
+
     def _build_function_call_result_section(self, function_name: str, function_args: dict,
                                             function_call_state: str, function_call_result: str) -> str:
         """
@@ -0,0 +1,111 @@
+import sqlite3
+
+# Tables of the chatbot database. Shared by prepare_sqldb.py and the tools that create databases from scratch
+# (e.g. restoring a snapshot into an empty file).
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS user_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        occupation TEXT NOT NULL,
+        location TEXT NOT NULL,
+        age INTEGER,
+        gender TEXT,
+        interests TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        question_tokens INTEGER,
+        answer_tokens INTEGER,
+        FOREIGN KEY(user_id) REFERENCES user_info(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS summary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        session_id TEXT NOT NULL,
+        summary_text TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        token_count INTEGER,
+        FOREIGN KEY(user_id) REFERENCES user_info(id)
+    );
+
+    -- Facts extracted from chat_history by FactMemory; embedding is a normalized float32 vector
+    CREATE TABLE IF NOT EXISTS facts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        subject TEXT NOT NULL,
+        attribute TEXT NOT NULL,
+        value TEXT NOT NULL,
+        source_id INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        embedding BLOB NOT NULL,
+        UNIQUE(user_id, subject, attribute, value),
+        FOREIGN KEY(user_id) REFERENCES user_info(id)
+    );
+
+    -- Working memory of a chat session (history window, counters), saved after every turn to resume it;
+    -- state is a zlib-compressed JSON document written by ChatHistoryManager.export_state
+    CREATE TABLE IF NOT EXISTS session_state (
+        session_id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        state BLOB NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES user_info(id)
+    );
+"""
+
+# Substring search index of chat_history, used when the texts are compressed (see TextCodec): contentless, so the
+# texts aren't stored twice, and detail=none, which only keeps which rows contain each trigram (about 8x smaller
+# than with positions); SearchManager confirms the candidate rows on their decoded texts.
+# It isn't part of snapshots or shard moves; `prepare_sqldb.py --compress` rebuilds it.
+SEARCH_INDEX_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chat_history_fts USING fts5(
+        question, answer, content='', tokenize='trigram', detail=none
+    );
+"""
+
+# Tables holding the memory of the chatbot, in dependency order
+MEMORY_TABLES = ["user_info", "chat_history", "summary", "facts", "session_state"]
+
+# Columns added after the tables were first released: databases created before get them with ALTER TABLE.
+# Token counts are computed when the rows are written (NULL for older rows until prepare_sqldb.py backfills them).
+ADDED_COLUMNS = {
+    "chat_history": [("question_tokens", "INTEGER"), ("answer_tokens", "INTEGER")],
+    "summary": [("token_count", "INTEGER")],
+}
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    Create the chatbot tables if they don't exist yet, and add the columns missing from older databases.
+    :param conn: An open SQLite connection
+    :return: None
+    """
+    conn.executescript(SCHEMA_SQL)
+    try:
+        conn.executescript(SEARCH_INDEX_SQL)
+    except sqlite3.OperationalError as e:
+        # SQLite older than 3.34 or built without FTS5: search falls back to LIKE on uncompressed rows
+        print(f"Search index not created: {e}")
+    for table, columns in ADDED_COLUMNS.items():
+        existing = table_columns(conn, table)
+        for name, column_type in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type};")
+    conn.commit()
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list:
+    """
+    :param conn: An open SQLite connection
+    :param table: The table name
+    :return: The column names of the table, in declaration order
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table});").fetchall()]
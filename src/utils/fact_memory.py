@@ -0,0 +1,292 @@
+import json
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .db_schema import create_tables
+from .llm_cache import LLMCache
+from .sql_manager import SQLManager
+from .tool_registry import FUNCTION_CALL_FAILED, FUNCTION_CALL_SUCCESSFUL, tool
+
+EXTRACTION_PROMPT = """Extract durable facts about the user from the conversation turn below: personal details,
+preferences, plans, decisions, people and things in their life. Ignore small talk, questions, and anything the
+assistant says that the user didn't confirm.
+
+Return a JSON list, empty if there is nothing worth remembering, of objects with the keys:
+- "subject": who or what the fact is about ("user" for the user, otherwise a short name)
+- "attribute": a short lowercase attribute, e.g. "occupation", "favorite food", "sister's name"
+- "value": the value, as short as possible
+
+## Turn
+User: {question}
+Assistant: {answer}
+"""
+
+UPSERT_FACT_QUERY = """
+    INSERT INTO facts (user_id, subject, attribute, value, source_id, embedding)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, subject, attribute, value)
+    DO UPDATE SET source_id = excluded.source_id, timestamp = CURRENT_TIMESTAMP;
+"""
+
+
+def _normalize(text: Any) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def parse_facts(content: str) -> List[Tuple[str, str, str]]:
+    """
+    Parse the extraction model's answer into normalized (subject, attribute, value) triples, dropping malformed
+    entries and duplicates.
+    :param content: The model answer: a JSON list, possibly wrapped in a code fence or in {"facts": [...]}
+    :return: The facts
+    """
+    match = re.search(r"[\[{].*[\]}]", content or "", re.DOTALL)
+    if not match:
+        return []
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return []
+    if isinstance(data, dict):
+        data = data.get("facts", [data])
+    facts = []
+    for item in data if isinstance(data, list) else []:
+        if not isinstance(item, dict):
+            continue
+        fact = (_normalize(item.get("subject") or "user"), _normalize(item.get("attribute", "")),
+                _normalize(item.get("value", "")))
+        if fact[1] and fact[2] and fact not in facts:
+            facts.append(fact)
+    return facts
+
+
+def fact_text(subject: str, attribute: str, value: str) -> str:
+    return f"{subject} | {attribute}: {value}"
+
+
+class FactMemory:
+    """
+    Compact, structured memory of what the users said about themselves.
+
+    Every saved chat pair is handed to a background thread, which asks `extraction_model` for
+    (subject, attribute, value) facts and stores them in the `facts` table of the user's database, with the
+    chat_history row they came from and a normalized embedding. Facts are deduplicated on insert: an exact repeat,
+    or a value whose embedding is nearly identical to a known value of the same attribute, only refreshes the
+    source and timestamp of the existing fact.
+
+    Searching embeds the query and scores it against the user's fact embeddings in memory, so retrieval returns
+    a few short lines without a RAG call. Shared by every chatbot of the process (see ResourceRegistry).
+    """
+
+    def __init__(self, sql_manager: SQLManager, embedding_function: Callable[[List[str]], Any], client: Any,
+                 extraction_model: str, llm_cache: Optional[LLMCache] = None, k: int = 5,
+                 min_similarity: float = 0.3, dedup_similarity: float = 0.92):
+        """
+        Initializes the FactMemory
+
+        :param sql_manager: The SQLManager (or ShardedSQLManager) holding the memory tables
+        :param embedding_function: Embeds a list of texts, e.g. the vector store's embedding function
+        :param client: The model client used for extraction
+        :param extraction_model: The model extracting facts from chat pairs
+        :param llm_cache: Optional cache for the (deterministic) extraction calls
+        :param k: Number of facts returned by a search
+        :param min_similarity: Facts scoring below this cosine similarity are not returned
+        :param dedup_similarity: Values of the same attribute at least this similar are merged
+        """
+        self.sql_manager = sql_manager
+        self.embedding_function = embedding_function
+        self.client = client
+        self.extraction_model = extraction_model
+        self.llm_cache = llm_cache
+        self.k = k
+        self.min_similarity = min_similarity
+        self.dedup_similarity = dedup_similarity
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="facts")
+        self._pending: List[Future] = []
+        # user_id -> ((count, max id), ids, texts, embedding matrix)
+        self._cache: Dict[Any, Tuple[tuple, List[int], List[str], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        for shard in sql_manager.shards():
+            with shard.pool.connection() as conn:
+                create_tables(conn)
+
+    @classmethod
+    def from_config(cls, cfg: Any, sql_manager: SQLManager, embedding_function: Callable[[List[str]], Any],
+                    client: Any, llm_cache: Optional[LLMCache] = None) -> "FactMemory":
+        return cls(sql_manager, embedding_function, client, cfg.fact_extraction_model, llm_cache=llm_cache,
+                   k=cfg.fact_k, min_similarity=cfg.fact_min_similarity, dedup_similarity=cfg.fact_dedup_similarity)
+
+    def for_user(self, user_id: Any) -> "UserFacts":
+        """
+        :param user_id: The user of a chatbot session
+        :return: The user's view of the memory, exposing the search_facts tool
+        """
+        return UserFacts(self, user_id)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embedding_function(texts), dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def submit(self, user_id: Any, source_id: Optional[int], question: str, answer: str) -> Optional[Future]:
+        """
+        Queue the extraction of a saved chat pair. The turn doesn't wait for it.
+        :param user_id: The user who wrote the pair
+        :param source_id: The chat_history row of the pair
+        :param question: The user message
+        :param answer: The assistant response
+        :return: The future of the extraction, None without a user
+        """
+        if not user_id:
+            return None
+        future = self.executor.submit(self._extract_and_store, user_id, source_id, question, answer)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def backlog(self) -> int:
+        """
+        :return: Number of queued or running extractions
+        """
+        with self._lock:
+            return sum(1 for future in self._pending if not future.done())
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the queued extractions, e.g. before a benchmark measures.
+        :param timeout: Seconds to wait in total, None to wait until they are done
+        :return: True if they are all done
+        """
+        with self._lock:
+            pending = [future for future in self._pending if not future.done()]
+        if pending:
+            print(f"[facts] Waiting for {len(pending)} queued extraction(s)...")
+        return not wait_futures(pending, timeout=timeout).not_done
+
+    def shutdown(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        Stop the extraction thread before the process exits. The queued extractions get `timeout` seconds to
+        finish; the ones still queued after that are dropped, only the running one is completed.
+        :param timeout: Seconds to wait for the queue, None to drain it whatever it takes
+        :return: None
+        """
+        if self.wait(timeout):
+            self.executor.shutdown(wait=False)
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            dropped = sum(1 for future in self._pending if future.cancelled())
+        print(f"[facts] {dropped} queued extraction(s) dropped after {timeout}s.")
+
+    def _extract_and_store(self, user_id: Any, source_id: Optional[int], question: str, answer: str) -> int:
+        try:
+            facts = self.extract(question, answer)
+            return self.add_facts(user_id, facts, source_id) if facts else 0
+        except Exception as e:
+            print(f"[facts] Extraction failed: {e}")
+            return 0
+
+    def extract(self, question: str, answer: str) -> List[Tuple[str, str, str]]:
+        """
+        Ask the extraction model for the facts stated in a chat pair.
+        :return: Normalized (subject, attribute, value) triples
+        """
+        messages = [{"role": "user", "content": EXTRACTION_PROMPT.format(question=question, answer=answer)}]
+        if self.llm_cache is not None:
+            response = self.llm_cache.complete(self.client, self.extraction_model, messages, temperature=0.0)
+        else:
+            response = self.client.chat.complete(model=self.extraction_model, messages=messages, temperature=0.0)
+        return parse_facts(str(response.choices[0].message.content or ""))
+
+    def add_facts(self, user_id: Any, facts: List[Tuple[str, str, str]], source_id: Optional[int] = None) -> int:
+        """
+        Store facts of a user, merging duplicates.
+        :param user_id: The user the facts are about
+        :param facts: (subject, attribute, value) triples
+        :param source_id: The chat_history row the facts come from
+        :return: Number of new facts
+        """
+        manager = self.sql_manager.for_user(user_id)
+        embeddings = self._embed([fact_text(*fact) for fact in facts])
+        added = 0
+        # The known facts are read under the write lock, so facts stored meanwhile by another process are merged
+        with manager.transaction(immediate=True) as cursor:
+            by_attribute: Dict[tuple, List[tuple]] = {}
+            for subject, attribute, value, blob in cursor.execute(
+                    "SELECT subject, attribute, value, embedding FROM facts WHERE user_id = ?;", (user_id,)).fetchall():
+                by_attribute.setdefault((subject, attribute), []).append((value, np.frombuffer(blob, dtype=np.float32)))
+            for (subject, attribute, value), embedding in zip(facts, embeddings):
+                same_attribute = by_attribute.setdefault((subject, attribute), [])
+                for known_value, known_embedding in same_attribute:
+                    if known_value == value or float(known_embedding @ embedding) >= self.dedup_similarity:
+                        # Same fact said again: keep the stored wording, point it at the newer turn
+                        value = known_value
+                        break
+                else:
+                    added += 1
+                    same_attribute.append((value, embedding))
+                cursor.execute(UPSERT_FACT_QUERY, (user_id, subject, attribute, value, source_id, embedding.tobytes()))
+        print(f"[facts] {added} new fact(s) out of {len(facts)} extracted.")
+        return added
+
+    def _user_matrix(self, user_id: Any) -> Tuple[List[int], List[str], np.ndarray]:
+        """
+        The user's facts and their embedding matrix, reloaded only when facts were added (by any process).
+        """
+        manager = self.sql_manager.for_user(user_id)
+        version = tuple(manager.execute_query("SELECT COUNT(*), MAX(id) FROM facts WHERE user_id = ?;",
+                                              (user_id,), fetch_one=True))
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2], cached[3]
+        rows = manager.execute_query(
+            "SELECT id, subject, attribute, value, timestamp, embedding FROM facts WHERE user_id = ? ORDER BY id;",
+            (user_id,), fetch_all=True)
+        ids = [row[0] for row in rows]
+        texts = [f"{fact_text(row[1], row[2], row[3])} ({row[4]})" for row in rows]
+        matrix = np.stack([np.frombuffer(row[5], dtype=np.float32) for row in rows]) if rows else np.empty((0, 0), np.float32)
+        self._cache[user_id] = (version, ids, texts, matrix)
+        return ids, texts, matrix
+
+    def search(self, user_id: Any, query: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        :param user_id: The user whose facts are searched
+        :param query: The search query
+        :param k: Number of facts to return, defaults to `k`
+        :return: The most similar facts as (text, similarity), best first
+        """
+        _, texts, matrix = self._user_matrix(user_id)
+        if not texts:
+            return []
+        scores = matrix @ self._embed([query])[0]
+        order = np.argsort(-scores)[:k or self.k]
+        return [(texts[i], float(scores[i])) for i in order if scores[i] >= self.min_similarity]
+
+
+class UserFacts:
+    """The facts of one user, bound to a chatbot session as the search_facts tool."""
+
+    def __init__(self, memory: FactMemory, user_id: Any):
+        self.memory = memory
+        self.user_id = user_id
+
+    @tool(timeout=10)
+    def search_facts(self, query: str) -> Tuple[str, str]:
+        """
+        Search the facts remembered about the user (personal details, preferences, plans, people in their life)
+        and return the relevant ones
+
+        :param query: What to look for, e.g. "user's sister" or "favorite food"
+
+        :return: The matching facts, one per line, with the date they were last mentioned.
+        """
+        try:
+            matches = self.memory.search(self.user_id, query)
+        except Exception as e:
+            return FUNCTION_CALL_FAILED, f"Error: {e}"
+        if not matches:
+            return FUNCTION_CALL_FAILED, "No matching facts found."
+        print(f"[facts] {len(matches)} fact(s) found for: {query}")
+        return FUNCTION_CALL_SUCCESSFUL, "\n".join(text for text, _ in matches)
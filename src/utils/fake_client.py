@@ -0,0 +1,94 @@
+import json
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Optional
+from .model_client import build_chat_response
+
+
+class FakeAPIError(Exception):
+    """Error raised by the fake client, carrying an HTTP status code like the Mistral SDK errors."""
+
+    def __init__(self, status_code: int, message: str = "Injected error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+class _FakeChat:
+    def __init__(self, owner: "FakeMistralClient"):
+        self._owner = owner
+
+    def complete(self, **kwargs):
+        return self._owner.complete(**kwargs)
+
+
+class FakeMistralClient:
+    """
+    Offline stand-in for the Mistral client with injectable latency, errors and tool calls.
+    Useful for exercising the chatbots, the resilient client wrapper and load tests without network access.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0,
+                 latency_fn: Optional[Callable[[], float]] = None, error_rate: float = 0.0,
+                 error_status_code: int = 429, tool_call_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        :param latency: Base latency in seconds added to each call
+        :param latency_jitter: Uniform random jitter in seconds added on top of `latency`
+        :param latency_fn: Optional callable returning the latency for a call; overrides `latency` and `latency_jitter`
+        :param error_rate: Probability in [0, 1] that a call raises FakeAPIError
+        :param error_status_code: Status code carried by the injected errors
+        :param tool_call_rate: Probability that a call offering tools answers with a tool call instead of content
+        :param seed: Optional random seed for reproducible runs
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.latency_fn = latency_fn
+        self.error_rate = error_rate
+        self.error_status_code = error_status_code
+        self.tool_call_rate = tool_call_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.chat = _FakeChat(self)
+
+    def _sample(self) -> float:
+        with self.lock:
+            self.calls += 1
+            return self.random.random()
+
+    def _latency(self) -> float:
+        if self.latency_fn is not None:
+            return max(0.0, self.latency_fn())
+        with self.lock:
+            jitter = self.random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0
+        return self.latency + jitter
+
+    def complete(self, model: str = "", messages: Optional[list] = None, tools: Optional[list] = None, **kwargs):
+        """
+        Return a canned response after the configured latency.
+        :param model: The model name (echoed in the response)
+        :param messages: The chat messages
+        :param tools: Tool schemas offered to the model
+        :return: A response shaped like a Mistral chat completion
+        """
+        time.sleep(self._latency())
+        if self._sample() < self.error_rate:
+            raise FakeAPIError(self.error_status_code)
+
+        last_message = messages[-1]["content"] if messages else ""
+        if tools and self._sample() < self.tool_call_rate:
+            tool = self.random.choice(tools)
+            name = tool["function"]["name"]
+            properties = tool["function"]["parameters"].get("properties", {})
+            arguments = {key: str(last_message)[:50] for key in properties if key != "user_info"}
+            if "user_info" in properties:
+                arguments["user_info"] = {"interests": ["testing"]}
+            tool_call = SimpleNamespace(
+                id=str(uuid.uuid4()), type="function",
+                function=SimpleNamespace(name=name, arguments=json.dumps(arguments))
+            )
+            return build_chat_response(None, [tool_call])
+
+        return build_chat_response(f"[{model}] Fake response to: {str(last_message)[:200]}")
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from .model_client import build_chat_response
+
+
+class LLMCache:
+    """
+    Disk-backed memoization cache for deterministic model calls, keyed by a hash of (model, messages, parameters).
+    Entries expire after a TTL and the least recently used entries are evicted once the cache exceeds its size limit.
+    A small in-memory LRU sits in front of the SQLite file so repeated hits never touch the disk.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_size_bytes: int = 64 * 1024 * 1024,
+                 memory_entries: int = 256, enabled: bool = True):
+        """
+        Initializes the LLMCache
+
+        :param path: Path to the SQLite file holding the cache
+        :param ttl_seconds: Seconds after which an entry expires
+        :param max_size_bytes: Maximum total size of cached values on disk
+        :param memory_entries: Number of entries kept in the in-memory LRU
+        :param enabled: When False every lookup is a miss and nothing is stored
+        """
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.memory_entries = memory_entries
+        self.enabled = enabled
+        self.memory: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        self.conn: Optional[sqlite3.Connection] = None
+        if enabled:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at);")
+            self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache;").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "LLMCache":
+        """
+        Build an LLMCache from the `llm_cache_config` section of LoadConfig.
+        :param cfg: LoadConfig instance
+        :return: LLMCache
+        """
+        return cls(
+            path=str(cfg.llm_cache_path),
+            ttl_seconds=cfg.llm_cache_ttl_seconds,
+            max_size_bytes=int(cfg.llm_cache_max_size_mb * 1024 * 1024),
+            memory_entries=cfg.llm_cache_memory_entries,
+            enabled=cfg.llm_cache_enabled,
+        )
+
+    @staticmethod
+    def make_key(model: str, messages: list, **params) -> str:
+        """
+        Hash the model, messages and call parameters into a cache key.
+        :param model: The model name
+        :param messages: The chat messages
+        :param params: Any other parameters that influence the output (temperature, max_tokens, ...)
+        :return: Hex digest identifying the call
+        """
+        payload = json.dumps({"model": model, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached value.
+        :param key: The cache key
+        :return: The cached content, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self.memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return entry[0]
+
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?;", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, created_at = row
+            if now - created_at >= self.ttl_seconds:
+                self._delete(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?;", (now, key))
+            self._remember(key, value, created_at)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a value, evicting least recently used entries if the cache grows beyond its size limit.
+        :param key: The cache key
+        :param value: The content to cache
+        :return: None
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM llm_cache WHERE key = ?;", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?);",
+                (key, value, size, now, now)
+            )
+            self.total_size += size - (previous[0] if previous else 0)
+            self._remember(key, value, now)
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self.memory[key] = (value, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _delete(self, key: str) -> None:
+        row = self.conn.execute("DELETE FROM llm_cache WHERE key = ? RETURNING size;", (key,)).fetchone()
+        if row:
+            self.total_size -= row[0]
+        self.memory.pop(key, None)
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones until the cache fits its size limit."""
+        if self.total_size <= self.max_size_bytes:
+            return
+        expired = self.conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ? RETURNING key, size;", (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        for key, size in expired:
+            self.total_size -= size
+            self.memory.pop(key, None)
+        self.stats["expired"] += len(expired)
+        while self.total_size > self.max_size_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed_at ASC LIMIT 64;"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_size <= self.max_size_bytes:
+                    break
+                self._delete(key)
+                self.stats["evictions"] += 1
+
+    def complete(self, client: Any, model: str, messages: list, **params) -> Any:
+        """
+        Memoized drop-in for `client.chat.complete(model=..., messages=..., **params)`.
+        Only plain text answers are cached; tool calls and empty answers always go to the model.
+
+        :param client: The model client
+        :param model: The model name
+        :param messages: The chat messages
+        :param params: Other call parameters, part of the cache key
+        :return: A chat completion response (a lightweight stand-in on cache hits)
+        """
+        key_params = {k: v for k, v in params.items() if k != "timeout_s"}
+        key = self.make_key(model, messages, **key_params)
+        cached = self.get(key)
+        if cached is not None:
+            return build_chat_response(cached)
+        response = client.chat.complete(model=model, messages=messages, **params)
+        message = response.choices[0].message
+        if isinstance(message.content, str) and message.content and not getattr(message, "tool_calls", None):
+            self.set(key, message.content)
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        :return: Hit/miss counters, hit ratio and current size
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries_in_memory"] = len(self.memory)
+            stats["size_bytes"] = self.total_size if self.enabled else 0
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_cache;")
+            self.memory.clear()
+            self.total_size = 0
+
@@ -10,6 +10,13 @@ class LoadConfig:
         self.db_path = here(config["directories"]["db_path"])
         self.vectordb_dir = here(config["directories"]["vectordb_dir"])
 
+        #sharding_config
+        self.sharding_enabled = config["sharding_config"]["enabled"]
+        self.num_shards = config["sharding_config"]["num_shards"]
+        self.shard_dir = here(config["sharding_config"]["shard_dir"])
+        self.sql_pool_size = config["sharding_config"]["pool_size"]
+        self.sql_synchronous = config["sharding_config"]["synchronous"]
+
         #llm_config
         self.chat_model = config["llm_config"]["chat_model"]
         self.rag_model  = config["llm_config"]["rag_model"]
@@ -20,11 +27,103 @@ class LoadConfig:
         self.max_history_pairs = config["chat_history_config"]["max_history_pairs"]
         self.max_characters = config["chat_history_config"]["max_characters"]
         self.max_tokens = config["chat_history_config"]["max_tokens"]
+        self.persist_session_state = config["chat_history_config"]["persist_session_state"]
+
+        #compression_config
+        self.compression_enabled = config["compression_config"]["enabled"]
+        self.compression_algorithm = config["compression_config"]["algorithm"]
+        self.compression_level = config["compression_config"]["level"]
+        self.compression_min_bytes = config["compression_config"]["min_bytes"]
+        self.compression_dictionary_dir = here(config["compression_config"]["dictionary_dir"])
 
         #agent_config
         self.max_function_calls = config["agent_config"]["max_function_calls"]
+        self.turn_latency_budget = config["agent_config"]["turn_latency_budget"]
+        self.final_answer_reserve = config["agent_config"]["final_answer_reserve"]
+        self.optional_stage_min_seconds = config["agent_config"]["optional_stage_min_seconds"]
+
+        #tool_config
+        self.tool_timeout = config["tool_config"]["timeout"]
+        self.tool_max_concurrency = config["tool_config"]["max_concurrency"]
+        self.tool_max_workers = config["tool_config"]["max_workers"]
+        self.tool_overrides = config["tool_config"]["overrides"] or {}
+
+        #search_config
+        self.search_snippet_window = config["search_config"]["snippet_window"]
+        self.search_llm_summary_fallback = config["search_config"]["llm_summary_fallback"]
+
+        #fact_memory_config
+        self.fact_memory_enabled = config["fact_memory_config"]["enabled"]
+        self.fact_extraction_model = config["fact_memory_config"]["extraction_model"]
+        self.fact_k = config["fact_memory_config"]["k"]
+        self.fact_min_similarity = config["fact_memory_config"]["min_similarity"]
+        self.fact_dedup_similarity = config["fact_memory_config"]["dedup_similarity"]
 
         #vectordb_config
         self.collection_name = config["vectordb_config"]["collection_name"]
         self.embedding_model = config["vectordb_config"]["embedding_model"]
-        self.k = config["vectordb_config"]["k"]
\ No newline at end of file
+        self.embedding_backend = config["vectordb_config"]["embedding_backend"]
+        self.local_embedding_dim = config["vectordb_config"]["local_embedding"]["dim"]
+        self.local_embedding_features = config["vectordb_config"]["local_embedding"]["n_features"]
+        self.local_embedding_char_ngrams = config["vectordb_config"]["local_embedding"]["char_ngrams"]
+        self.local_embedding_word_ngrams = config["vectordb_config"]["local_embedding"]["word_ngrams"]
+        self.local_embedding_idf_path = here(config["vectordb_config"]["local_embedding"]["idf_path"])
+        self.k = config["vectordb_config"]["k"]
+        self.chunk_tokens = config["vectordb_config"]["chunk_tokens"]
+        self.chunk_overlap = config["vectordb_config"]["chunk_overlap"]
+        self.max_chunks_per_pair = config["vectordb_config"]["max_chunks_per_pair"]
+        self.retrieval_mode = config["vectordb_config"]["retrieval_mode"]
+        self.direct_max_tokens = config["vectordb_config"]["direct_max_tokens"]
+        self.record_characters = config["vectordb_config"]["record_characters"]
+        self.vector_storage = config["vectordb_config"]["storage"]
+        self.quantization = config["vectordb_config"]["quantization"]
+        self.rerank_factor = config["vectordb_config"]["rerank_factor"]
+        self.dedup_similarity = config["vectordb_config"]["dedup_similarity"]
+        self.dedup_candidates = config["vectordb_config"]["dedup_candidates"]
+        self.hnsw_construction_ef = config["vectordb_config"]["hnsw"]["construction_ef"]
+        self.hnsw_m = config["vectordb_config"]["hnsw"]["M"]
+        self.hnsw_search_ef = config["vectordb_config"]["hnsw"]["search_ef"]
+
+        #profiling_config
+        self.profiling_enabled = config["profiling_config"]["enabled"]
+        self.profiling_sample_rate = config["profiling_config"]["sample_rate"]
+        self.profiling_dir = here(config["profiling_config"]["output_dir"])
+        self.profiling_top_allocations = config["profiling_config"]["top_allocations"]
+        self.profiling_traceback_frames = config["profiling_config"]["traceback_frames"]
+
+        #serving_config
+        self.serving_workers = config["serving_config"]["workers"]
+        self.serving_threads_per_worker = config["serving_config"]["threads_per_worker"]
+        self.serving_max_sessions_per_worker = config["serving_config"]["max_sessions_per_worker"]
+        self.serving_health_interval = config["serving_config"]["health_interval"]
+        self.serving_health_timeout = config["serving_config"]["health_timeout"]
+        self.serving_turn_timeout = config["serving_config"]["turn_timeout"]
+
+        #model_client_config
+        self.client_max_concurrency = config["model_client_config"]["max_concurrency"]
+        self.client_requests_per_second = config["model_client_config"]["requests_per_second"]
+        self.client_burst = config["model_client_config"]["burst"]
+        self.client_max_retries = config["model_client_config"]["max_retries"]
+        self.client_backoff_base = config["model_client_config"]["backoff_base"]
+        self.client_backoff_max = config["model_client_config"]["backoff_max"]
+        self.client_timeout = config["model_client_config"]["timeout"]
+        self.client_hedge_percentile = config["model_client_config"]["hedge_percentile"]
+        self.client_hedge_min_samples = config["model_client_config"]["hedge_min_samples"]
+        self.client_circuit_failure_threshold = config["model_client_config"]["circuit_failure_threshold"]
+        self.client_circuit_reset_timeout = config["model_client_config"]["circuit_reset_timeout"]
+
+        #routing_config
+        self.routing_enabled = config["routing_config"]["enabled"]
+        self.routing_score_threshold = config["routing_config"]["score_threshold"]
+        self.routing_max_simple_characters = config["routing_config"]["max_simple_characters"]
+        self.routing_max_simple_history_messages = config["routing_config"]["max_simple_history_messages"]
+        self.routing_min_response_characters = config["routing_config"]["min_response_characters"]
+        self.routing_memory_cues = config["routing_config"]["memory_cues"]
+        self.routing_low_confidence_phrases = config["routing_config"]["low_confidence_phrases"]
+
+        #llm_cache_config
+        self.llm_cache_enabled = config["llm_cache_config"]["enabled"]
+        self.llm_cache_path = here(config["llm_cache_config"]["path"])
+        self.llm_cache_ttl_seconds = config["llm_cache_config"]["ttl_seconds"]
+        self.llm_cache_max_size_mb = config["llm_cache_config"]["max_size_mb"]
+        self.llm_cache_memory_entries = config["llm_cache_config"]["memory_entries"]
\ No newline at end of file
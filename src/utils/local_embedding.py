@@ -0,0 +1,209 @@
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"\w+")
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_BASE = np.uint64(0x100000001B3)
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """Spread the bits of polynomial/crc hashes (splitmix64 finalizer) so buckets and signs are independent."""
+    hashes = (hashes ^ (hashes >> np.uint64(31))) * _MIX
+    return hashes ^ (hashes >> np.uint64(29))
+
+
+class LocalEmbeddingFunction:
+    """
+    Offline embedding function: hashed character and word n-grams, TF-IDF weighted and reduced to a dense vector
+    with a sparse random projection. Everything is computed with NumPy over whole batches, so thousands of texts
+    per second are embedded on one CPU without any network call.
+
+    - Character n-grams and word n-grams are hashed into `n_features` signed buckets. Character n-grams run over
+      the normalized text (its words joined by single spaces and padded with a space at both ends), so they mark
+      word starts and ends and may span adjacent words, never two texts.
+    - Term frequencies are weighted by the IDF table at `idf_path` when it exists (fitted with `fit`); without it
+      every bucket has weight 1.
+    - Each bucket is projected on `nonzeros` random dimensions with random signs (a sparse random projection,
+      generated from `seed`), then the vector is L2-normalized.
+
+    Similar wording gives similar vectors, which is enough for recalling past conversations, but there is no
+    semantic understanding: paraphrases with no words in common are not matched.
+
+    It implements Chroma's embedding function protocol and can be used by the quantized store as well.
+    Vectors are only comparable with vectors from the same settings and IDF table: changing them (or switching
+    from another backend) means re-embedding the collection.
+    """
+
+    def __init__(self, dim: int = 384, n_features: int = 2 ** 18, char_ngrams: Sequence[int] = (3, 5),
+                 word_ngrams: Sequence[int] = (1, 2), nonzeros: int = 4, seed: int = 0, idf_path: Optional[str] = None):
+        """
+        Initializes the LocalEmbeddingFunction
+
+        :param dim: Dimension of the embeddings
+        :param n_features: Number of hashed feature buckets
+        :param char_ngrams: Smallest and largest character n-gram length
+        :param word_ngrams: Smallest and largest word n-gram length
+        :param nonzeros: Embedding dimensions each bucket is projected on
+        :param seed: Seed of the random projection
+        :param idf_path: Optional .npz file holding the IDF table (see `fit`)
+        """
+        self.dim = dim
+        self.n_features = n_features
+        self.char_ngrams = tuple(char_ngrams)
+        self.word_ngrams = tuple(word_ngrams)
+        self.nonzeros = nonzeros
+        self.seed = seed
+        self.idf_path = str(idf_path) if idf_path else None
+        rng = np.random.default_rng(seed)
+        # One row per projection nonzero, so each is gathered from contiguous memory
+        self._dims = rng.integers(0, dim, size=(nonzeros, n_features), dtype=np.int64)
+        self._signs = (rng.integers(0, 2, size=(nonzeros, n_features)) * 2 - 1) / np.sqrt(nonzeros)
+        self.idf: Optional[np.ndarray] = None
+        if self.idf_path and os.path.exists(self.idf_path):
+            self.load_idf(self.idf_path)
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "LocalEmbeddingFunction":
+        return cls(dim=cfg.local_embedding_dim, n_features=cfg.local_embedding_features,
+                   char_ngrams=cfg.local_embedding_char_ngrams, word_ngrams=cfg.local_embedding_word_ngrams,
+                   idf_path=str(cfg.local_embedding_idf_path))
+
+    # ------------------------------------------------------------- Chroma protocol
+
+    @staticmethod
+    def name() -> str:
+        return "local_hashing"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim, "n_features": self.n_features, "char_ngrams": list(self.char_ngrams),
+                "word_ngrams": list(self.word_ngrams), "nonzeros": self.nonzeros, "seed": self.seed,
+                "idf_path": self.idf_path}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "LocalEmbeddingFunction":
+        return LocalEmbeddingFunction(**config)
+
+    def is_legacy(self) -> bool:
+        return False
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def supported_spaces(self) -> List[str]:
+        return ["cosine", "ip", "l2"]
+
+    def embed_query(self, input: List[str]) -> List[np.ndarray]:
+        return self(input)
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        return list(self.embed(input))
+
+    # ------------------------------------------------------------- features
+
+    def _features(self, texts: Sequence[str]) -> tuple:
+        """
+        Hash the n-grams of a batch of texts.
+        :return: Arrays (text index, bucket, sign) with one entry per n-gram occurrence
+        """
+        docs, hashes = [], []
+        # Character n-grams over the whole batch at once: texts are joined with a separator and n-grams
+        # crossing it are dropped
+        normalized = [" " + " ".join(_WORD_PATTERN.findall(text.lower())) + " " for text in texts]
+        data = np.frombuffer("\x00".join(normalized).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        text_of_byte = np.cumsum(data == 0)
+        for n in range(self.char_ngrams[0], self.char_ngrams[1] + 1):
+            if len(data) < n:
+                continue
+            h = np.zeros(len(data) - n + 1, dtype=np.uint64)
+            for offset in range(n):
+                h = h * _BASE + data[offset:len(data) - n + 1 + offset]
+            valid = text_of_byte[:len(h)] == text_of_byte[n - 1:]
+            valid &= (data[:len(h)] != 0) & (data[n - 1:] != 0)
+            docs.append(text_of_byte[:len(h)][valid])
+            hashes.append(h[valid] + np.uint64(n))
+        # Word n-grams, hashed with crc32 (stable across processes, unlike hash())
+        word_docs, word_hashes = [], []
+        for i, text in enumerate(normalized):
+            words = text.split()
+            for n in range(self.word_ngrams[0], self.word_ngrams[1] + 1):
+                for start in range(len(words) - n + 1):
+                    word_docs.append(i)
+                    word_hashes.append(zlib.crc32(" ".join(words[start:start + n]).encode("utf-8")) | (1 << 40))
+        docs.append(np.asarray(word_docs, dtype=np.int64))
+        hashes.append(np.asarray(word_hashes, dtype=np.uint64))
+
+        docs = np.concatenate(docs).astype(np.int64)
+        mixed = _mix(np.concatenate(hashes))
+        buckets = (mixed % np.uint64(self.n_features)).astype(np.int64)
+        signs = np.where(mixed >> np.uint64(63), -1.0, 1.0)
+        return docs, buckets, signs
+
+    def embed(self, texts: Sequence[str], batch_size: int = 512) -> np.ndarray:
+        """
+        :param texts: The texts to embed
+        :param batch_size: Texts hashed at once; larger batches only cost memory
+        :return: A (len(texts), dim) float32 array of L2-normalized embeddings
+        """
+        if len(texts) > batch_size:
+            return np.concatenate([self.embed(texts[start:start + batch_size], batch_size)
+                                   for start in range(0, len(texts), batch_size)])
+        if not len(texts):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # Occurrences are projected one by one, which sums them into raw term frequencies without grouping
+        docs, buckets, weights = self._features(texts)
+        if self.idf is not None:
+            weights = weights * self.idf[buckets]
+        offsets = docs * self.dim
+        flat = np.zeros(len(texts) * self.dim)
+        for dims, signs in zip(self._dims, self._signs):
+            flat += np.bincount(offsets + dims[buckets], weights=weights * signs[buckets], minlength=len(flat))
+        embeddings = flat.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1.0, norms)
+
+    # ------------------------------------------------------------- IDF
+
+    def fit(self, texts: Sequence[str], batch_size: int = 1000) -> int:
+        """
+        Compute the IDF table from a corpus, e.g. the stored chat history, and save it to `idf_path`.
+        :param texts: The corpus
+        :param batch_size: Texts hashed at once
+        :return: Number of documents the table was fitted on
+        """
+        document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        for start in range(0, len(texts), batch_size):
+            docs, buckets, _ = self._features(texts[start:start + batch_size])
+            distinct = np.unique(docs * self.n_features + buckets) % self.n_features
+            document_frequency += np.bincount(distinct, minlength=self.n_features)
+        n_docs = len(texts)
+        self.idf = (np.log((1.0 + n_docs) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        if self.idf_path:
+            os.makedirs(os.path.dirname(self.idf_path) or ".", exist_ok=True)
+            np.savez(self.idf_path, idf=self.idf, n_docs=n_docs, settings=repr(self._settings()))
+        return n_docs
+
+    def load_idf(self, path: str) -> None:
+        with np.load(path) as data:
+            if str(data["settings"]) != repr(self._settings()):
+                raise ValueError(f"The IDF table {path} was fitted with other settings, re-run the fit.")
+            self.idf = data["idf"]
+
+    def _settings(self) -> tuple:
+        return self.n_features, self.char_ngrams, self.word_ngrams
+
+
+def get_embedding_function(cfg: Any) -> Any:
+    """
+    The embedding function selected by `vectordb_config.embedding_backend`.
+    :param cfg: LoadConfig instance
+    :return: MistralEmbeddingFunction for "mistral", LocalEmbeddingFunction for "local"
+    """
+    if cfg.embedding_backend == "local":
+        return LocalEmbeddingFunction.from_config(cfg)
+    if cfg.embedding_backend != "mistral":
+        raise ValueError(f"Unknown embedding backend: {cfg.embedding_backend}")
+    from chromadb.utils import embedding_functions
+    return embedding_functions.MistralEmbeddingFunction(model=cfg.embedding_model)
@@ -0,0 +1,296 @@
+import json
+import sqlite3
+import struct
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from .db_schema import MEMORY_TABLES, create_tables, table_columns
+
+# Snapshot file layout (little endian):
+#   MAGIC
+#   block*:  kind (1 byte) | header length (uint32) | payload length (uint32) | JSON header | zlib(payload)
+#   end block (kind 0)
+# A table block holds a chunk of rows stored column by column; a vector block holds a chunk of
+# Chroma records with their float32 embeddings, so vectors can be restored without re-embedding.
+MAGIC = b"AGMSNAP1"
+BLOCK_END, BLOCK_TABLE, BLOCK_VECTORS = 0, 1, 2
+_BLOCK_HEADER = struct.Struct("<BII")
+
+# Per-value tags of object columns
+_NULL, _STR, _BYTES = 0, 1, 2
+
+
+def _encode_column(values: List[Any]) -> Tuple[str, bytes]:
+    """
+    Serialize one column of a chunk.
+    :param values: The column values
+    :return: The column type code ('i' int64, 'f' float64 or 'o' text/blob) and its bytes
+    """
+    nulls = bytes(1 if v is None else 0 for v in values)
+    if all(v is None or (isinstance(v, int) and not isinstance(v, bool)) for v in values):
+        return "i", nulls + array("q", (0 if v is None else v for v in values)).tobytes()
+    if all(v is None or isinstance(v, (int, float)) for v in values):
+        return "f", nulls + array("d", (0.0 if v is None else float(v) for v in values)).tobytes()
+    return "o", _encode_objects(values)
+
+
+def _encode_objects(values: List[Any]) -> bytes:
+    """
+    Serialize a text/blob column: one tag byte per value, int64 lengths, then the concatenated data.
+    """
+    tags = bytearray()
+    lengths = array("q")
+    data = bytearray()
+    for v in values:
+        if v is None:
+            tags.append(_NULL)
+            lengths.append(0)
+            continue
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            raw = bytes(v)
+            tags.append(_BYTES)
+        else:
+            raw = str(v).encode("utf-8")
+            tags.append(_STR)
+        lengths.append(len(raw))
+        data += raw
+    return bytes(tags) + lengths.tobytes() + bytes(data)
+
+
+def _decode_column(kind: str, buffer: memoryview, n_rows: int) -> Tuple[List[Any], int]:
+    """
+    Deserialize one column of a chunk.
+    :return: The column values and the number of bytes consumed
+    """
+    if kind in ("i", "f"):
+        nulls = buffer[:n_rows]
+        values = array("q" if kind == "i" else "d")
+        size = n_rows * values.itemsize
+        values.frombytes(buffer[n_rows:n_rows + size])
+        return [None if nulls[i] else values[i] for i in range(n_rows)], n_rows + size
+
+    tags = buffer[:n_rows]
+    lengths = array("q")
+    lengths.frombytes(buffer[n_rows:n_rows + 8 * n_rows])
+    offset = n_rows + 8 * n_rows
+    result = []
+    for i in range(n_rows):
+        length = lengths[i]
+        raw = buffer[offset:offset + length]
+        offset += length
+        if tags[i] == _NULL:
+            result.append(None)
+        elif tags[i] == _BYTES:
+            result.append(bytes(raw))
+        else:
+            result.append(str(raw, "utf-8"))
+    return result, offset
+
+
+def _write_block(f: BinaryIO, kind: int, header: Dict[str, Any], payload: bytes) -> None:
+    header_bytes = json.dumps(header).encode("utf-8")
+    compressed = zlib.compress(payload, 1)
+    f.write(_BLOCK_HEADER.pack(kind, len(header_bytes), len(compressed)))
+    f.write(header_bytes)
+    f.write(compressed)
+
+
+def _read_blocks(f: BinaryIO, kind_filter: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any], bytes]]:
+    """
+    :param kind_filter: Only yield blocks of this kind, the others are skipped without being decompressed
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a memory snapshot file.")
+    while True:
+        kind, header_length, payload_length = _BLOCK_HEADER.unpack(f.read(_BLOCK_HEADER.size))
+        if kind == BLOCK_END:
+            return
+        if kind_filter is not None and kind != kind_filter:
+            f.seek(header_length + payload_length, 1)
+            continue
+        header = json.loads(f.read(header_length))
+        yield kind, header, zlib.decompress(f.read(payload_length))
+
+
+def _table_block(table: str, columns: List[str], rows: List[tuple]) -> Tuple[Dict[str, Any], bytes]:
+    kinds = []
+    payload = bytearray()
+    for index in range(len(columns)):
+        kind, data = _encode_column([row[index] for row in rows])
+        kinds.append(kind)
+        payload += data
+    return {"table": table, "columns": columns, "kinds": kinds, "rows": len(rows)}, bytes(payload)
+
+
+def _decode_table_block(header: Dict[str, Any], payload: bytes) -> List[List[Any]]:
+    buffer = memoryview(payload)
+    offset = 0
+    columns = []
+    for kind in header["kinds"]:
+        values, consumed = _decode_column(kind, buffer[offset:], header["rows"])
+        offset += consumed
+        columns.append(values)
+    return columns
+
+
+class MemorySnapshot:
+    """
+    Exports and imports the whole memory store (SQLite tables and Chroma vectors) as a compact,
+    chunked columnar snapshot file. Both directions stream chunk by chunk, so memory use is bounded by the chunk size.
+    """
+
+    def __init__(self, db_path: str, collection: Optional[Any] = None, chunk_size: int = 5000):
+        """
+        Initializes the MemorySnapshot
+
+        :param db_path: Path to the SQLite database
+        :param collection: Optional Chroma collection holding the conversation vectors
+        :param chunk_size: Number of rows or vectors per block
+        """
+        self.db_path = str(db_path)
+        self.collection = collection
+        self.chunk_size = chunk_size
+
+    def export(self, path: str) -> Dict[str, int]:
+        """
+        Write a snapshot of the memory store.
+        :param path: Destination file
+        :return: Number of exported rows per table and of vectors
+        """
+        counts: Dict[str, int] = {}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+                for table in MEMORY_TABLES:
+                    counts[table] = self._export_table(conn, table, f)
+                if self.collection is not None:
+                    counts["vectors"] = self._export_vectors(f)
+                f.write(_BLOCK_HEADER.pack(BLOCK_END, 0, 0))
+        finally:
+            conn.close()
+        return counts
+
+    def _export_table(self, conn: sqlite3.Connection, table: str, f: BinaryIO) -> int:
+        columns = table_columns(conn, table)
+        if not columns:
+            return 0
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid;")
+        total = 0
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            header, payload = _table_block(table, columns, rows)
+            _write_block(f, BLOCK_TABLE, header, payload)
+            total += len(rows)
+        return total
+
+    def _export_vectors(self, f: BinaryIO) -> int:
+        import numpy as np
+
+        total = 0
+        offset = 0
+        while True:
+            batch = self.collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=self.chunk_size, offset=offset
+            )
+            ids = batch["ids"]
+            if not ids:
+                break
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            metadatas = [json.dumps(m) if m else None for m in (batch.get("metadatas") or [None] * len(ids))]
+            documents = batch.get("documents") or [None] * len(ids)
+            id_bytes = _encode_objects(list(ids))
+            document_bytes = _encode_objects(list(documents))
+            metadata_bytes = _encode_objects(metadatas)
+            header = {"rows": len(ids), "dim": int(embeddings.shape[1]),
+                      "sizes": [len(id_bytes), len(document_bytes), len(metadata_bytes)]}
+            _write_block(f, BLOCK_VECTORS, header, id_bytes + document_bytes + metadata_bytes + embeddings.tobytes())
+            total += len(ids)
+            offset += len(ids)
+        return total
+
+    def restore(self, path: str, replace: bool = False) -> Dict[str, int]:
+        """
+        Load a snapshot back. All SQL rows are inserted in a single transaction (row ids are preserved), which is
+        committed before the vectors are touched: if the SQL part fails, nothing changed. Vectors are then added
+        with their stored embeddings, so nothing is re-embedded. Chroma has no transactions: if that second part
+        fails, running the restore again completes it (rows and vectors are upserted).
+
+        :param path: Snapshot file
+        :param replace: Delete the existing memory rows and vectors before loading
+        :return: Number of imported rows per table and of vectors
+        """
+        counts: Dict[str, int] = {}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            create_tables(conn)
+            conn.execute("BEGIN;")
+            if replace:
+                for table in reversed(MEMORY_TABLES):
+                    conn.execute(f"DELETE FROM {table};")
+            target_columns = {table: set(table_columns(conn, table)) for table in MEMORY_TABLES}
+
+            with open(path, "rb") as f:
+                for _, header, payload in _read_blocks(f, BLOCK_TABLE):
+                    table = header["table"]
+                    if table not in target_columns:
+                        continue
+                    columns = _decode_table_block(header, payload)
+                    keep = [i for i, c in enumerate(header["columns"]) if c in target_columns[table]]
+                    names = [header["columns"][i] for i in keep]
+                    query = f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))});"
+                    conn.executemany(query, zip(*(columns[i] for i in keep)))
+                    counts[table] = counts.get(table, 0) + header["rows"]
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        if self.collection is not None:
+            if replace:
+                self._clear_vectors()
+            with open(path, "rb") as f:
+                for _, header, payload in _read_blocks(f, BLOCK_VECTORS):
+                    counts["vectors"] = counts.get("vectors", 0) + self._restore_vectors(header, payload)
+        return counts
+
+    def _restore_vectors(self, header: Dict[str, Any], payload: bytes) -> int:
+        import numpy as np
+
+        n_rows = header["rows"]
+        buffer = memoryview(payload)
+        id_size, document_size, metadata_size = header["sizes"]
+        ids, _ = _decode_column("o", buffer[:id_size], n_rows)
+        documents, _ = _decode_column("o", buffer[id_size:id_size + document_size], n_rows)
+        metadatas, _ = _decode_column("o", buffer[id_size + document_size:], n_rows)
+        start = id_size + document_size + metadata_size
+        embeddings = np.frombuffer(payload[start:], dtype=np.float32).reshape(n_rows, header["dim"])
+
+        # Chroma rejects missing entries in a metadata list, so records with and without metadata are upserted apart
+        with_metadata = [i for i, m in enumerate(metadatas) if m]
+        without_metadata = [i for i, m in enumerate(metadatas) if not m]
+        if with_metadata:
+            self.collection.upsert(
+                ids=[ids[i] for i in with_metadata],
+                embeddings=embeddings[with_metadata],
+                documents=[documents[i] for i in with_metadata],
+                metadatas=[json.loads(metadatas[i]) for i in with_metadata],
+            )
+        if without_metadata:
+            self.collection.upsert(
+                ids=[ids[i] for i in without_metadata],
+                embeddings=embeddings[without_metadata],
+                documents=[documents[i] for i in without_metadata],
+            )
+        return n_rows
+
+    def _clear_vectors(self) -> None:
+        while True:
+            ids = self.collection.get(limit=self.chunk_size, include=[])["ids"]
+            if not ids:
+                return
+            self.collection.delete(ids=ids)
@@ -0,0 +1,394 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+from .turn_deadline import current_deadline
+
+# HTTP status codes that are worth retrying (rate limiting and transient server errors)
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the circuit breaker is open and calls are rejected without reaching the model."""
+
+
+class ModelCallTimeout(TimeoutError):
+    """Raised when a single model call exceeds its timeout."""
+
+
+class LocalTimeout(ModelCallTimeout):
+    """
+    Raised when a call runs out of time before reaching the model (waiting for a slot or the rate limiter, or
+    with no turn budget left). It says nothing about the health of the service, so the circuit breaker ignores it.
+    """
+
+
+def build_chat_response(content: Optional[str], tool_calls: Optional[list] = None) -> SimpleNamespace:
+    """
+    Build a minimal object shaped like a Mistral chat completion response.
+    :param content: The assistant message content
+    :param tool_calls: Optional list of tool calls
+    :return: An object exposing `choices[0].message.content` and `choices[0].message.tool_calls`
+    """
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Decide whether an exception raised by the model client is worth retrying.
+    :param error: The exception raised by the model client
+    :return: True for rate limiting, timeouts, connection problems and 5xx errors
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return int(status_code) in TRANSIENT_STATUS_CODES
+    # httpx transport errors (ConnectError, ReadTimeout, ...) do not share a common base with the stdlib ones
+    name = type(error).__name__
+    return "Timeout" in name or "Connect" in name or "RemoteProtocol" in name
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by all threads using the same client.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Tokens added per second. A value <= 0 disables rate limiting.
+        :param capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Block until a token is available.
+        :param deadline: Optional monotonic time after which waiting is abandoned
+        :return: None
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                raise LocalTimeout("Timed out waiting for the rate limiter.")
+            time.sleep(wait_time)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After the reset timeout a single probe call is let through (half open);
+    the other callers are rejected until it succeeds, closing the circuit, or fails, reopening it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        :param failure_threshold: Number of consecutive failures that opens the circuit. <= 0 disables it.
+        :param reset_timeout: Seconds to wait before letting a probe call through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """
+        Admit or reject a call.
+        :return: True if the call is the half-open probe; pass it to record_success, record_failure or release
+        """
+        if self.failure_threshold <= 0:
+            return False
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Model client circuit is open; skipping call.")
+            if self.probing:
+                raise CircuitOpenError("Model client circuit is half open and its probe is in flight; skipping call.")
+            self.probing = True
+            return True
+
+    def record_success(self, probe: bool = False) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            if probe:
+                self.probing = False
+
+    def record_failure(self, probe: bool = False) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.failure_threshold > 0 and self.failures >= self.failure_threshold:
+                # (Re)open the circuit; a failed half-open probe restarts the cool-down
+                self.opened_at = time.monotonic()
+            if probe:
+                self.probing = False
+
+    def release(self, probe: bool) -> None:
+        """Let another call probe when this one ended without telling whether the service is healthy."""
+        if probe:
+            with self.lock:
+                self.probing = False
+
+
+class _ChatNamespace:
+    """Exposes `client.chat.complete(...)` so the wrapper is a drop-in replacement for the Mistral client."""
+
+    def __init__(self, owner: "ResilientClient"):
+        self._owner = owner
+
+    def complete(self, **kwargs) -> Any:
+        return self._owner.call(self._owner.client.chat.complete, **kwargs)
+
+
+class ResilientClient:
+    """
+    Wraps a Mistral-compatible client with concurrency limiting, rate limiting, retries with jittered backoff,
+    per-call timeouts, hedged requests and a circuit breaker.
+    """
+
+    def __init__(self, client: Any, max_concurrency: int = 8, requests_per_second: float = 0.0, burst: int = 1,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0, timeout: float = 60.0,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 circuit_failure_threshold: int = 5, circuit_reset_timeout: float = 30.0):
+        """
+        Initializes the ResilientClient
+
+        :param client: The underlying client (Mistral or a fake client exposing `chat.complete`)
+        :param max_concurrency: Maximum number of in-flight requests across all threads
+        :param requests_per_second: Token-bucket refill rate. 0 disables rate limiting.
+        :param burst: Token-bucket capacity
+        :param max_retries: Number of retries after the first attempt for transient errors
+        :param backoff_base: Base delay in seconds for exponential backoff
+        :param backoff_max: Maximum backoff delay in seconds
+        :param timeout: Per-call timeout in seconds
+        :param hedge_percentile: Latency percentile (e.g. 95) after which a duplicate request is sent. None disables hedging.
+        :param hedge_min_samples: Number of latency samples required before hedging starts
+        :param circuit_failure_threshold: Consecutive failures that open the circuit. 0 disables the breaker.
+        :param circuit_reset_timeout: Seconds the circuit stays open before a probe call is allowed
+        """
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.circuit_breaker = CircuitBreaker(circuit_failure_threshold, circuit_reset_timeout)
+        # Hedged requests need two in-flight slots per call
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="model-call")
+        self.latencies: deque = deque(maxlen=200)
+        self.stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "timeouts": 0,
+                      "hedges": 0, "hedge_wins": 0, "failures": 0, "circuit_rejections": 0}
+        self.chat = _ChatNamespace(self)
+
+    @classmethod
+    def from_config(cls, client: Any, cfg: Any) -> "ResilientClient":
+        """
+        Build a ResilientClient from the `model_client_config` section of LoadConfig.
+        :param client: The underlying client
+        :param cfg: LoadConfig instance
+        :return: ResilientClient
+        """
+        return cls(
+            client,
+            max_concurrency=cfg.client_max_concurrency,
+            requests_per_second=cfg.client_requests_per_second,
+            burst=cfg.client_burst,
+            max_retries=cfg.client_max_retries,
+            backoff_base=cfg.client_backoff_base,
+            backoff_max=cfg.client_backoff_max,
+            timeout=cfg.client_timeout,
+            hedge_percentile=cfg.client_hedge_percentile,
+            hedge_min_samples=cfg.client_hedge_min_samples,
+            circuit_failure_threshold=cfg.client_circuit_failure_threshold,
+            circuit_reset_timeout=cfg.client_circuit_reset_timeout,
+        )
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def _hedge_delay(self) -> Optional[float]:
+        """
+        :return: The observed latency percentile in seconds, or None when hedging is disabled or not warmed up
+        """
+        if not self.hedge_percentile:
+            return None
+        with self.stats_lock:
+            samples = sorted(self.latencies)
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def _submit(self, fn: Callable, kwargs: Dict[str, Any], blocking: bool, deadline: float):
+        """
+        Submit one request to the executor while holding a concurrency slot.
+        The slot is released when the request finishes, even if the caller stopped waiting for it.
+        :return: The future, or None if `blocking` is False and no slot is free
+        """
+        if blocking:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.semaphore.acquire(timeout=remaining):
+                raise LocalTimeout("Timed out waiting for a free model call slot.")
+        elif not self.semaphore.acquire(blocking=False):
+            return None
+        try:
+            self.rate_limiter.acquire(deadline)
+            future = self.executor.submit(fn, **kwargs)
+        except BaseException:
+            self.semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self.semaphore.release())
+        self._count("attempts")
+        return future
+
+    def _attempt(self, fn: Callable, kwargs: Dict[str, Any], timeout: float) -> Any:
+        """
+        Run a single (possibly hedged) attempt.
+        :return: The first successful response
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        futures = [self._submit(fn, kwargs, blocking=True, deadline=deadline)]
+        hedge_delay = self._hedge_delay()
+
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                hedge = self._submit(fn, kwargs, blocking=False, deadline=deadline)
+                if hedge is not None:
+                    self._count("hedges")
+                    futures.append(hedge)
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1 and future is futures[1]:
+                        self._count("hedge_wins")
+                    with self.stats_lock:
+                        self.latencies.append(time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        raise ModelCallTimeout(f"Model call timed out after {timeout:.1f}s.")
+
+    def _admit(self) -> bool:
+        try:
+            return self.circuit_breaker.before_call()
+        except CircuitOpenError:
+            self._count("circuit_rejections")
+            raise
+
+    def call(self, fn: Callable, **kwargs) -> Any:
+        """
+        Call `fn(**kwargs)` with retries, timeouts, hedging and circuit breaking.
+
+        :param fn: The client function to call (e.g. `client.chat.complete`)
+        :param kwargs: Keyword arguments forwarded to `fn`. `timeout_s` overrides the per-call timeout.
+        :return: The response returned by `fn`
+        """
+        timeout = call_timeout = kwargs.pop("timeout_s", None) or self.timeout
+        # Inside a chat turn, neither an attempt nor the retries may outlive the turn's deadline
+        turn = current_deadline()
+        turn_end = turn.deadline if turn is not None else None
+        if turn is not None:
+            timeout = turn.timeout(timeout)
+            if timeout <= 0:
+                self._count("timeouts")
+                raise LocalTimeout("No time left in the turn's latency budget.")
+        self._count("calls")
+        probe = self._admit()
+
+        call_deadline = time.monotonic() + timeout * (self.max_retries + 1)
+        if turn_end is not None:
+            call_deadline = min(call_deadline, turn_end)
+        attempt = 0
+        while True:
+            attempt_timeout = min(timeout, call_deadline - time.monotonic())
+            try:
+                if attempt_timeout <= 0:
+                    self._count("timeouts")
+                    raise LocalTimeout("No time left in the call's latency budget.")
+                response = self._attempt(fn, kwargs, attempt_timeout)
+                self.circuit_breaker.record_success(probe)
+                return response
+            except Exception as e:
+                # Client-side errors (bad request, auth) say nothing about the health of the service, and neither
+                # does a call that ran out of local time: waiting for a slot, or an attempt cut short by the deadline
+                if not is_transient_error(e) or isinstance(e, LocalTimeout) \
+                        or (isinstance(e, ModelCallTimeout) and attempt_timeout < call_timeout):
+                    self.circuit_breaker.release(probe)
+                    self._count("failures")
+                    raise
+                self.circuit_breaker.record_failure(probe)
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                # Full jitter: sleep a random amount up to the exponential backoff cap
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    delay = max(delay, float(retry_after))
+                if time.monotonic() + delay >= call_deadline:
+                    self._count("failures")
+                    raise
+                attempt += 1
+                self._count("retries")
+                print(f"Model call failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s "
+                      f"(attempt {attempt}/{self.max_retries})")
+                time.sleep(delay)
+                # The failures of this call (or of concurrent ones) may have opened the circuit meanwhile
+                probe = self._admit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        :return: A snapshot of the call counters and circuit state
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["circuit_state"] = self.circuit_breaker.state
+        return stats
+
@@ -0,0 +1,176 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class RouteDecision:
+    """
+    The model chosen for a turn and why.
+    """
+    model: str
+    tier: str
+    score: float
+    reason: str
+    escalated: bool = False
+
+
+class ModelRouter:
+    """
+    Cheap per-turn classifier that sends simple turns to the small model and escalates to the large model
+    when the small model asks for tools or returns low-confidence output.
+    """
+
+    def __init__(self, small_model: str, large_model: str, enabled: bool = True, score_threshold: float = 1.0,
+                 max_simple_characters: int = 200, max_simple_history_messages: int = 4,
+                 memory_cues: Optional[List[str]] = None, low_confidence_phrases: Optional[List[str]] = None,
+                 min_response_characters: int = 2):
+        """
+        Initializes the ModelRouter
+
+        :param small_model: The cheap model used for simple turns
+        :param large_model: The model used for complex turns and escalations
+        :param enabled: When False every turn goes to the large model
+        :param score_threshold: Turns scoring at or above this value go to the large model
+        :param max_simple_characters: Messages longer than this add to the complexity score
+        :param max_simple_history_messages: Histories longer than this add to the complexity score
+        :param memory_cues: Phrases hinting that memory lookups or profile updates (tool calls) are needed
+        :param low_confidence_phrases: Phrases in a small-model answer that trigger escalation
+        :param min_response_characters: Small-model answers shorter than this trigger escalation
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.enabled = enabled
+        self.score_threshold = score_threshold
+        self.max_simple_characters = max_simple_characters
+        self.max_simple_history_messages = max_simple_history_messages
+        self.memory_cues = [c.lower() for c in (memory_cues or [])]
+        self.low_confidence_phrases = [p.lower() for p in (low_confidence_phrases or [])]
+        self.min_response_characters = min_response_characters
+        self.question_pattern = re.compile(r"\?")
+        self.lock = threading.Lock()
+        # Exponentially weighted latency per tier, used to estimate what a small-model turn saved
+        self.latency_ewma: Dict[str, Optional[float]] = {"small": None, "large": None}
+        self.stats = {"small": 0, "large": 0, "escalations": 0, "estimated_seconds_saved": 0.0}
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "ModelRouter":
+        """
+        Build a ModelRouter from the `routing_config` section of LoadConfig.
+        :param cfg: LoadConfig instance
+        :return: ModelRouter
+        """
+        return cls(
+            small_model=cfg.summary_model,
+            large_model=cfg.chat_model,
+            enabled=cfg.routing_enabled,
+            score_threshold=cfg.routing_score_threshold,
+            max_simple_characters=cfg.routing_max_simple_characters,
+            max_simple_history_messages=cfg.routing_max_simple_history_messages,
+            memory_cues=cfg.routing_memory_cues,
+            low_confidence_phrases=cfg.routing_low_confidence_phrases,
+            min_response_characters=cfg.routing_min_response_characters,
+        )
+
+    def score(self, user_message: str, chat_history: Any = None, previous_summary: Optional[str] = None) -> tuple[float, str]:
+        """
+        Score how complex a turn is using local heuristics only.
+        :param user_message: The user's message
+        :param chat_history: The in-memory chat history
+        :param previous_summary: The latest conversation summary
+        :return: The complexity score and a short explanation
+        """
+        message = user_message.lower()
+        score = 0.0
+        reasons = []
+        if len(user_message) > self.max_simple_characters:
+            score += 1.0
+            reasons.append("long message")
+        cues = [cue for cue in self.memory_cues if cue in message]
+        if cues:
+            score += 1.0
+            reasons.append(f"memory cue '{cues[0]}'")
+        if len(self.question_pattern.findall(user_message)) > 1:
+            score += 0.5
+            reasons.append("multiple questions")
+        history_size = len(chat_history) if chat_history is not None else 0
+        if history_size > self.max_simple_history_messages:
+            score += 0.5
+            reasons.append("long history")
+        if previous_summary and len(previous_summary) > self.max_simple_characters * 4:
+            score += 0.25
+            reasons.append("long summary")
+        return score, ", ".join(reasons) or "simple turn"
+
+    def route(self, user_message: str, chat_history: Any = None, previous_summary: Optional[str] = None) -> RouteDecision:
+        """
+        Choose the model for a turn.
+        :param user_message: The user's message
+        :param chat_history: The in-memory chat history
+        :param previous_summary: The latest conversation summary
+        :return: RouteDecision
+        """
+        if not self.enabled:
+            return RouteDecision(self.large_model, "large", 0.0, "routing disabled")
+        score, reason = self.score(user_message, chat_history, previous_summary)
+        if score >= self.score_threshold:
+            return RouteDecision(self.large_model, "large", score, reason)
+        return RouteDecision(self.small_model, "small", score, reason)
+
+    def is_low_confidence(self, content: Any) -> bool:
+        """
+        :param content: The content returned by the small model
+        :return: True if the answer looks empty, truncated or unsure
+        """
+        if not isinstance(content, str) or len(content.strip()) < self.min_response_characters:
+            return True
+        text = content.lower()
+        return any(phrase in text for phrase in self.low_confidence_phrases)
+
+    def should_escalate(self, decision: RouteDecision, response: Any) -> bool:
+        """
+        Decide whether a small-model response must be redone by the large model.
+        :param decision: The current routing decision
+        :param response: The chat completion response
+        :return: True if the turn should be escalated
+        """
+        if decision.tier != "small":
+            return False
+        message = response.choices[0].message
+        if message.tool_calls:
+            return True
+        return self.is_low_confidence(message.content)
+
+    def escalate(self, decision: RouteDecision, latency: float, why: str) -> RouteDecision:
+        """
+        Switch a turn to the large model.
+        :param decision: The small-model decision being abandoned
+        :param latency: Seconds spent on the abandoned small-model call
+        :param why: Why the turn was escalated
+        :return: The new large-model decision
+        """
+        with self.lock:
+            self.stats["escalations"] += 1
+        print(f"[router] escalating to {self.large_model} after {latency:.2f}s on {decision.model}: {why}")
+        return RouteDecision(self.large_model, "large", decision.score, f"{decision.reason}; escalated: {why}", True)
+
+    def record(self, decision: RouteDecision, latency: float) -> None:
+        """
+        Record the latency of a completed call and log the routing decision with its estimated saving.
+        :param decision: The decision that produced the final answer
+        :param latency: Seconds spent on the call
+        :return: None
+        """
+        with self.lock:
+            previous = self.latency_ewma[decision.tier]
+            self.latency_ewma[decision.tier] = latency if previous is None else 0.8 * previous + 0.2 * latency
+            self.stats[decision.tier] += 1
+            large_estimate = self.latency_ewma["large"]
+            saving = None
+            if decision.tier == "small" and large_estimate is not None:
+                saving = large_estimate - latency
+                self.stats["estimated_seconds_saved"] += saving
+        saving_text = f", est. saving {saving:.2f}s" if saving is not None else ""
+        print(f"[router] model={decision.model} tier={decision.tier} score={decision.score:.2f} "
+              f"reason={decision.reason} latency={latency:.2f}s{saving_text}")
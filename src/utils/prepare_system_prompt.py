@@ -67,14 +67,15 @@ def prepare_system_prompt_for_agentic_chatbot_v2(user_info: str, chat_summary: s
     )
 
 
-def prepare_system_prompt_for_agentic_chatbot_v3(user_info: str, chat_summary: str, chat_history: str, function_call_result_section: str) -> str:
+def prepare_system_prompt_for_agentic_chatbot_v3(user_info: str, chat_summary: str, chat_history: str, function_call_result_section: str,
+                                                  fact_search: bool = False) -> str:
 
     prompt = """## You are a professional assistant of the following user.
 
     {user_info}
 
-    ## You have access to two functions: search_vector_db and add_user_info_to_database.
-
+    ## You have access to {functions}.
+{fact_search_section}
     - If you need more information about the user or details from previous conversations to answer the user's question, use the search_vector_db function.
     This function performs a vector search on the chat history of the user and the chatbot. The best way to do this is to search with a very clear query.
     - Monitor the conversation, and if the user provides any of the following details that differ from the initial information, call this function to update 
@@ -108,8 +109,15 @@ def prepare_system_prompt_for_agentic_chatbot_v3(user_info: str, chat_summary: s
     ## Here is the user's new question
     """
 
+    fact_search_section = """
+    - To recall facts about the user (personal details, preferences, plans, people in their life), use the search_facts function first.
+    It returns short facts remembered from previous conversations. Only use search_vector_db when you need details the facts don't cover."""
+
     return prompt.format(
         user_info=user_info,
+        functions="three functions: search_facts, search_vector_db and add_user_info_to_database" if fact_search
+        else "two functions: search_vector_db and add_user_info_to_database",
+        fact_search_section=fact_search_section if fact_search else "",
         chat_summary=chat_summary,
         chat_history=chat_history,
         function_call_result_section=function_call_result_section
@@ -0,0 +1,370 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+
+class QuantizedVectorStore:
+    """
+    Compact on-disk vector store for the conversation memory.
+
+    Vectors are L2-normalized and stored twice in memory-mapped files: a scalar-quantized copy
+    (int8 with a per-vector scale, or float16) that is scanned for every query, and the full float32 copy that is only
+    touched for the top candidates during an exact re-scoring pass. Ids, documents and metadata live in a SQLite sidecar.
+    Only the quantized file has to be resident to query, a quarter (int8) or half (float16) of the float32 footprint.
+
+    The public methods mirror the subset of the Chroma collection API used by VectorDBManager
+    (`add`, `upsert`, `query`, `get`, `update`, `delete`, `count`).
+    """
+
+    def __init__(self, path: str, embedding_function: Optional[Callable] = None, quantization: str = "int8",
+                 rerank_factor: int = 4, initial_capacity: int = 1024, scan_chunk_size: int = 2048):
+        """
+        Initializes the QuantizedVectorStore
+
+        :param path: Directory holding the store files
+        :param embedding_function: Callable turning a list of texts into embeddings, used when none are given
+        :param quantization: "int8" (per-vector scale) or "float16"
+        :param rerank_factor: Number of quantized candidates per requested result that are re-scored exactly
+        :param initial_capacity: Number of vector slots allocated when the store is created
+        :param scan_chunk_size: Rows scored per step while scanning the quantized vectors
+        """
+        if quantization not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.path = str(path)
+        self.embedding_function = embedding_function
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.scan_chunk_size = scan_chunk_size
+        self.lock = threading.RLock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self.meta = sqlite3.connect(os.path.join(self.path, "meta.sqlite"), check_same_thread=False)
+        self.meta.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                idx INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT,
+                metadata TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        settings = dict(self.meta.execute("SELECT key, value FROM settings;").fetchall())
+        if settings.get("quantization", quantization) != quantization:
+            raise ValueError(f"Store at {self.path} was created with {settings['quantization']} quantization.")
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        self.capacity = int(settings.get("capacity", initial_capacity))
+        self.size = self.meta.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM records;").fetchone()[0]
+        self.deleted = np.zeros(self.capacity, dtype=bool)
+        for (idx,) in self.meta.execute("SELECT idx FROM records WHERE deleted = 1;"):
+            self.deleted[idx] = True
+        if self.dim is not None:
+            self._open_maps()
+
+    # ------------------------------------------------------------------ storage
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open_maps(self) -> None:
+        """(Re)open the memory-mapped files with the current capacity, extending them if needed."""
+        code_dtype = np.int8 if self.quantization == "int8" else np.float16
+        layout = [("codes.bin", code_dtype, (self.capacity, self.dim)),
+                  ("scales.bin", np.float32, (self.capacity,)),
+                  ("vectors.bin", np.float32, (self.capacity, self.dim))]
+        maps = []
+        for name, dtype, shape in layout:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(self._file(name), "ab") as f:
+                if f.tell() < nbytes:
+                    f.truncate(nbytes)
+            maps.append(np.memmap(self._file(name), dtype=dtype, mode="r+", shape=shape))
+        self.codes, self.scales, self.vectors = maps
+        self._scan_buffer = np.empty((self.scan_chunk_size, self.dim), dtype=np.float32)
+
+    def _read_vectors(self, slots: np.ndarray) -> np.ndarray:
+        """
+        Read full-precision rows with positioned reads instead of through the memory map: faulting a few rows in via
+        the map makes the kernel's readahead pull whole neighbourhoods of the float32 file into memory.
+        """
+        row_bytes = self.dim * 4
+        rows = np.empty((len(slots), self.dim), dtype=np.float32)
+        fd = os.open(self._file("vectors.bin"), os.O_RDONLY)
+        try:
+            for i, slot in enumerate(slots):
+                rows[i] = np.frombuffer(os.pread(fd, row_bytes, int(slot) * row_bytes), dtype=np.float32)
+        finally:
+            os.close(fd)
+        return rows
+
+    def _ensure_capacity(self, needed: int) -> None:
+        if needed <= self.capacity:
+            return
+        for array in (self.codes, self.scales, self.vectors):
+            array.flush()
+        while self.capacity < needed:
+            self.capacity *= 2
+        deleted = np.zeros(self.capacity, dtype=bool)
+        deleted[:len(self.deleted)] = self.deleted
+        self.deleted = deleted
+        self._open_maps()
+        self.meta.execute("INSERT OR REPLACE INTO settings VALUES ('capacity', ?);", (str(self.capacity),))
+
+    def _quantize(self, vectors: np.ndarray) -> tuple:
+        """
+        :param vectors: Normalized float32 vectors
+        :return: The quantized codes and their per-vector scales
+        """
+        if self.quantization == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def _embed(self, documents: List[str], embeddings: Optional[Any]) -> np.ndarray:
+        if embeddings is None:
+            if self.embedding_function is None:
+                raise ValueError("No embeddings given and no embedding function configured.")
+            embeddings = self.embedding_function(list(documents))
+        return self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1))
+
+    # ------------------------------------------------------------------ writes
+
+    def upsert(self, ids: Any, documents: Any = None, embeddings: Any = None, metadatas: Any = None) -> None:
+        """
+        Insert new records or overwrite existing ones with the same id.
+        :param ids: A record id or a list of ids
+        :param documents: The documents (required when `embeddings` is not given)
+        :param embeddings: Optional precomputed embeddings
+        :param metadatas: Optional metadata dictionaries
+        :return: None
+        """
+        ids = [ids] if isinstance(ids, str) else list(ids)
+        documents = [documents] if isinstance(documents, str) else list(documents or [None] * len(ids))
+        metadatas = [metadatas] if isinstance(metadatas, dict) else list(metadatas or [None] * len(ids))
+        vectors = self._embed(documents, embeddings)
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.meta.executemany("INSERT OR REPLACE INTO settings VALUES (?, ?);", [
+                    ("dim", str(self.dim)), ("quantization", self.quantization), ("capacity", str(self.capacity))
+                ])
+                self._open_maps()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store dimension {self.dim}.")
+
+            existing = dict(self.meta.execute(
+                f"SELECT id, idx FROM records WHERE id IN ({', '.join('?' * len(ids))});", ids
+            ).fetchall())
+            slots = []
+            for record_id in ids:
+                if record_id in existing:
+                    slots.append(existing[record_id])
+                else:
+                    slots.append(self.size)
+                    existing[record_id] = self.size
+                    self.size += 1
+            self._ensure_capacity(self.size)
+
+            slots_array = np.asarray(slots)
+            codes, scales = self._quantize(vectors)
+            self.codes[slots_array] = codes
+            self.scales[slots_array] = scales
+            self.vectors[slots_array] = vectors
+            self.deleted[slots_array] = False
+            with self.meta:
+                self.meta.executemany(
+                    "INSERT OR REPLACE INTO records (idx, id, document, metadata, deleted) VALUES (?, ?, ?, ?, 0);",
+                    [(slot, record_id, document, json.dumps(metadata) if metadata else None)
+                     for slot, record_id, document, metadata in zip(slots, ids, documents, metadatas)]
+                )
+
+    add = upsert
+
+    def update(self, ids: Any, metadatas: Any = None, documents: Any = None, embeddings: Any = None) -> None:
+        """
+        Update the metadata (and optionally documents/embeddings) of existing records.
+        :param ids: A record id or a list of ids
+        :param metadatas: New metadata dictionaries, merged into the existing ones
+        :param documents: Optional new documents; re-embedded unless `embeddings` is given
+        :param embeddings: Optional new embeddings
+        :return: None
+        """
+        ids = [ids] if isinstance(ids, str) else list(ids)
+        if documents is not None or embeddings is not None:
+            current = self.get(ids=ids, include=["documents", "metadatas"])
+            by_id = dict(zip(current["ids"], zip(current["documents"], current["metadatas"])))
+            documents = documents or [by_id[i][0] for i in ids]
+            self.upsert(ids, documents, embeddings, [by_id[i][1] for i in ids])
+        if metadatas is None:
+            return
+        metadatas = [metadatas] if isinstance(metadatas, dict) else list(metadatas)
+        with self.lock, self.meta:
+            for record_id, metadata in zip(ids, metadatas):
+                row = self.meta.execute("SELECT metadata FROM records WHERE id = ?;", (record_id,)).fetchone()
+                if row is None:
+                    continue
+                merged = json.loads(row[0]) if row[0] else {}
+                merged.update(metadata or {})
+                self.meta.execute("UPDATE records SET metadata = ? WHERE id = ?;", (json.dumps(merged), record_id))
+
+    def delete(self, ids: Any = None, where: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Mark records as deleted. Their slots are skipped by queries.
+        :param ids: Record ids to delete
+        :param where: Optional metadata equality filter selecting the records to delete
+        :return: None
+        """
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        with self.lock, self.meta:
+            slots = self._slots(ids=ids or None, where=where)
+            if not slots:
+                return
+            self.deleted[np.asarray(slots)] = True
+            self.meta.executemany("UPDATE records SET deleted = 1 WHERE idx = ?;", [(s,) for s in slots])
+
+    # ------------------------------------------------------------------ reads
+
+    def _where_clause(self, where: Optional[Dict[str, Any]]) -> tuple:
+        if not where:
+            return "", []
+        conditions = where.get("$and", [where]) if "$and" in where else [{k: v} for k, v in where.items()]
+        clauses, params = [], []
+        for condition in conditions:
+            for key, value in condition.items():
+                if isinstance(value, dict) and "$eq" in value:
+                    value = value["$eq"]
+                clauses.append(f"json_extract(metadata, ?) = ?")
+                params.extend([f"$.{key}", value])
+        return " AND " + " AND ".join(clauses), params
+
+    def _slots(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> List[int]:
+        clause, params = self._where_clause(where)
+        if ids:
+            clause += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += list(ids)
+        return [row[0] for row in self.meta.execute(f"SELECT idx FROM records WHERE deleted = 0{clause};", params)]
+
+    def count(self) -> int:
+        """
+        :return: Number of live records
+        """
+        with self.lock:
+            return self.meta.execute("SELECT COUNT(*) FROM records WHERE deleted = 0;").fetchone()[0]
+
+    def get(self, ids: Any = None, where: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+            offset: int = 0, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Fetch records by id and/or metadata filter, in insertion order.
+        :return: A Chroma-shaped dictionary with ids, documents, metadatas and (if requested) embeddings
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        ids = [ids] if isinstance(ids, str) else ids
+        clause, params = self._where_clause(where)
+        if ids:
+            clause += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += list(ids)
+        query = f"SELECT idx, id, document, metadata FROM records WHERE deleted = 0{clause} ORDER BY idx"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self.lock:
+            rows = self.meta.execute(query + ";", params).fetchall()
+        result = {"ids": [r[1] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [r[2] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(r[3]) if r[3] else None for r in rows]
+        if "embeddings" in include:
+            slots = np.asarray([r[0] for r in rows], dtype=np.int64)
+            result["embeddings"] = np.asarray(self.vectors[slots]) if len(slots) else np.zeros((0, self.dim or 0))
+        return result
+
+    def _scan(self, query: np.ndarray, candidates: int, allowed: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Score every live quantized vector against the query and return the best `candidates` slots.
+        """
+        best_slots = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.size, self.scan_chunk_size):
+            end = min(start + self.scan_chunk_size, self.size)
+            # Widen the codes into a reused buffer instead of allocating a float32 copy of every chunk
+            block = self._scan_buffer[:end - start]
+            np.copyto(block, self.codes[start:end], casting="unsafe")
+            scores = (block @ query) * self.scales[start:end]
+            mask = self.deleted[start:end]
+            if allowed is not None:
+                mask = mask | ~allowed[start:end]
+            scores[mask] = -np.inf
+            slots = np.arange(start, end)
+            if len(scores) > candidates:
+                top = np.argpartition(-scores, candidates)[:candidates]
+                scores, slots = scores[top], slots[top]
+            best_scores = np.concatenate([best_scores, scores])
+            best_slots = np.concatenate([best_slots, slots])
+            if len(best_scores) > candidates:
+                top = np.argpartition(-best_scores, candidates)[:candidates]
+                best_scores, best_slots = best_scores[top], best_slots[top]
+        return best_slots[np.isfinite(best_scores)]
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Any = None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Approximate search on the quantized vectors followed by exact float32 re-scoring of the top candidates.
+        :param query_texts: Query texts, embedded with the embedding function
+        :param query_embeddings: Precomputed query embeddings
+        :param n_results: Number of results per query
+        :param where: Optional metadata equality filter
+        :param include: Fields to return (documents, metadatas, distances, embeddings)
+        :return: A Chroma-shaped dictionary with one result list per query
+        """
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        queries = self._embed(query_texts, None) if query_embeddings is None \
+            else self._normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        result = {key: [] for key in ["ids"] + include}
+        if self.dim is None or self.size == 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            return result
+
+        with self.lock:
+            allowed = None
+            if where:
+                allowed = np.zeros(self.size, dtype=bool)
+                allowed[np.asarray(self._slots(where=where), dtype=np.int64)] = True
+            for query in queries:
+                candidates = self._scan(query, max(n_results * self.rerank_factor, n_results), allowed)
+                candidates = np.sort(candidates)  # sequential access into the float32 file
+                exact = self._read_vectors(candidates) @ query
+                order = np.argsort(-exact)[:n_results]
+                slots = [int(s) for s in candidates[order]]
+                rows = {r[0]: r for r in self.meta.execute(
+                    f"SELECT idx, id, document, metadata FROM records WHERE idx IN ({', '.join('?' * len(slots))});", slots
+                ).fetchall()} if slots else {}
+                result["ids"].append([rows[s][1] for s in slots])
+                if "documents" in include:
+                    result["documents"].append([rows[s][2] for s in slots])
+                if "metadatas" in include:
+                    result["metadatas"].append([json.loads(rows[s][3]) if rows[s][3] else None for s in slots])
+                if "distances" in include:
+                    result["distances"].append([float(1.0 - d) for d in exact[order]])
+                if "embeddings" in include:
+                    result["embeddings"].append(np.asarray(self.vectors[np.asarray(slots, dtype=np.int64)]))
+        return result
+
+    def flush(self) -> None:
+        """Flush the memory-mapped files to disk."""
+        if self.dim is not None:
+            for array in (self.codes, self.scales, self.vectors):
+                array.flush()
@@ -0,0 +1,164 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of shared, lazily created resources: configuration, model client, LLM cache,
+    SQL manager, user manager, tool runtime, vector store, fact memory, text codec, turn profiler and model router. Each resource is built on first access and reused by every
+    chatbot instance, so several bots in one process cost one YAML parse, one client and one Chroma client.
+    """
+
+    def __init__(self, model_client: Optional[Any] = None):
+        """
+        Initializes the ResourceRegistry
+
+        :param model_client: Optional underlying client (e.g. FakeMistralClient) used instead of Mistral.
+            It is still wrapped by the ResilientClient.
+        """
+        self._raw_model_client = model_client
+        self._resources: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the named resource, creating it with `factory` on first access.
+        """
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory()
+            return self._resources[name]
+
+    def is_loaded(self, name: str) -> bool:
+        """
+        :param name: Resource name (config, model_client, llm_cache, sql_manager, user_manager, tool_runtime,
+            vector_db_manager, fact_memory, text_codec, turn_profiler, model_router)
+        :return: True if the resource has already been created
+        """
+        return name in self._resources
+
+    @property
+    def config(self):
+        def factory():
+            from .load_config import LoadConfig
+            return LoadConfig()
+        return self._get("config", factory)
+
+    @property
+    def model_client(self):
+        def factory():
+            from .model_client import ResilientClient
+            client = self._raw_model_client
+            if client is None:
+                from mistralai import Mistral
+                client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+            return ResilientClient.from_config(client, self.config)
+        return self._get("model_client", factory)
+
+    @property
+    def llm_cache(self):
+        def factory():
+            from .llm_cache import LLMCache
+            return LLMCache.from_config(self.config)
+        return self._get("llm_cache", factory)
+
+    @property
+    def sql_manager(self):
+        def factory():
+            if self.config.sharding_enabled:
+                from .sharded_sql_manager import ShardedSQLManager
+                return ShardedSQLManager.from_config(self.config)
+            from .db_schema import create_tables
+            from .sql_manager import SQLManager
+            manager = SQLManager(str(self.config.db_path), pool_size=self.config.sql_pool_size,
+                                 synchronous=self.config.sql_synchronous)
+            # Like the shards: bring a database prepared by an older version up to the current schema
+            with manager.pool.connection() as conn:
+                create_tables(conn)
+            return manager
+        return self._get("sql_manager", factory)
+
+    @property
+    def user_manager(self):
+        def factory():
+            from .user_manager import UserManager
+            return UserManager(self.sql_manager)
+        return self._get("user_manager", factory)
+
+    @property
+    def tool_runtime(self):
+        def factory():
+            from .tool_registry import ToolRuntime
+            return ToolRuntime.from_config(self.config)
+        return self._get("tool_runtime", factory)
+
+    @property
+    def vector_db_manager(self):
+        def factory():
+            from .vectordb_manager import VectorDBManager
+            return VectorDBManager(self.config, client=self.model_client, llm_cache=self.llm_cache)
+        return self._get("vector_db_manager", factory)
+
+    @property
+    def fact_memory(self):
+        def factory():
+            from .fact_memory import FactMemory
+            return FactMemory.from_config(self.config, self.sql_manager, self.vector_db_manager.embedding_functions,
+                                          self.model_client, llm_cache=self.llm_cache)
+        return self._get("fact_memory", factory)
+
+    @property
+    def text_codec(self):
+        def factory():
+            from .text_codec import TextCodec
+            return TextCodec.from_config(self.config)
+        return self._get("text_codec", factory)
+
+    @property
+    def turn_profiler(self):
+        def factory():
+            from .turn_profiler import TurnProfiler
+            return TurnProfiler.from_config(self.config)
+        return self._get("turn_profiler", factory)
+
+    @property
+    def model_router(self):
+        def factory():
+            from .model_router import ModelRouter
+            return ModelRouter.from_config(self.config)
+        return self._get("model_router", factory)
+
+
+_registry: Optional[ResourceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    """
+    Return the default process-wide ResourceRegistry, creating it on first use.
+    :return: ResourceRegistry
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ResourceRegistry()
+        return _registry
+
+
+def set_registry(registry: ResourceRegistry) -> None:
+    """
+    Replace the default registry, e.g. with one backed by a fake model client for offline runs.
+    Must be called before the first chatbot is created.
+    :param registry: The registry to use as default
+    :return: None
+    """
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -1,9 +1,18 @@
-from mistralai import Mistral
+from typing import Optional, TYPE_CHECKING
 from .utilities import Utilities
 from .sql_manager import SQLManager
+from .llm_cache import LLMCache
+from .snippet_extractor import SnippetExtractor
+from .text_codec import TextCodec
+from .tool_registry import tool
+
+if TYPE_CHECKING:
+    from mistralai import Mistral
 
 class SearchManager:
-    def __init__(self, sql_manager: SQLManager, utils: Utilities, client: Mistral, summary_model: str, max_characters: int = 1000):
+    def __init__(self, sql_manager: SQLManager, utils: Utilities, client: "Mistral", summary_model: str, max_characters: int = 1000,
+                 llm_cache: Optional[LLMCache] = None, snippet_window: int = 80, llm_summary_fallback: bool = False,
+                 codec: Optional[TextCodec] = None):
         """
         Initializes the SearchManager instance
         :param sql_manager: The database manager instance
@@ -11,13 +20,22 @@ class SearchManager:
         :param client: The mistral client instance
         :param summary_model: The summary model to use
         :param max_characters: The maximum number of chatacter to summarize
+        :param llm_cache: Optional cache for memoizing search result summaries
+        :param snippet_window: Characters of context kept around each match when results are cut to snippets
+        :param llm_summary_fallback: Summarize results exceeding `max_characters` with the LLM instead of extracting snippets
+        :param codec: Decodes compressed texts (found through the trigram index, see `search_rows`)
         """
         self.sql_manager = sql_manager
         self.utils = utils
         self.client = client
         self.summary_model = summary_model
         self.max_characters = max_characters
+        self.llm_cache = llm_cache
+        self.llm_summary_fallback = llm_summary_fallback
+        self.snippet_extractor = SnippetExtractor(max_characters, snippet_window)
+        self.codec = codec or TextCodec()
 
+    @tool(timeout=10)
     def search_chat_history(self,search_term: str) -> tuple[str, str]:
         """
         Searches chat history for a term, performing a case insensitive lookup.
@@ -26,14 +44,7 @@ class SearchManager:
         """
         try:
             search_term = search_term.lower()
-            query = """
-            SELECT question, answer, timestamp FROM chat_history
-            WHERE lower(question) LIKE ? OR LOWER(answer) LIKE ?
-            ORDER BY timestamp ASC
-            LIMIT 3;                
-            """
-
-            results = self.sql_manager.execute_query(query,(f"%{search_term}%",f"%{search_term}%"),fetch_all=True)
+            results = self.search_rows(search_term)
             #Ensure the results maintain the order of questions, then answer
             formatted_result = [(q, a, t) for q, a, t in results]
             if formatted_result == []:
@@ -43,24 +54,75 @@ class SearchManager:
             print(f"Number of characters in search results : {num_of_characters}")
 
             if num_of_characters > self.max_characters:
-                result_summary = self.summarize_search_result(str(formatted_result))
+                if self.llm_summary_fallback:
+                    result_summary = self.summarize_search_result(str(formatted_result))
+                else:
+                    # Keep only the text around the matches, packed into the budget, without a model round trip
+                    result_summary = self.snippet_extractor.extract(formatted_result, search_term)
                 return "Function call successful.", result_summary
             return "Function call successful.", str(formatted_result)
         except Exception as e:
             return "Function call failed.",f"Error : {e}"
 
+    def search_rows(self, search_term: str, limit: int = 3, batch_size: int = 50) -> list:
+        """
+        Find the oldest rows whose question or answer contains a lowercase term, whatever the compression setting
+        they were written with. Plain TEXT values are matched with LIKE; compressed (BLOB) values can't be, so the
+        rows holding one are candidates, narrowed down with the chat_history_fts trigram index when it exists and
+        the term has a trigram, and checked against their decoded texts. Both come from a single scan, oldest first.
+        Compressed rows missing from the index (restored snapshots, moved users) are found again once
+        `prepare_sqldb.py --compress` rebuilt it.
+        :param search_term: The term
+        :param limit: Rows returned
+        :param batch_size: Rows decoded per query
+        :return: (question, answer, timestamp) rows
+        """
+        trigrams = sorted({search_term[i:i + 3] for i in range(len(search_term) - 2)})
+        use_index = bool(trigrams) and self._has_search_index()
+        candidates = "typeof(question) = 'blob' OR typeof(answer) = 'blob'"
+        if use_index:
+            candidates = f"({candidates}) AND id IN (SELECT rowid FROM chat_history_fts WHERE chat_history_fts MATCH ?)"
+        query = f"""
+        SELECT question, answer, timestamp FROM chat_history
+        WHERE (typeof(question) = 'text' AND lower(question) LIKE ?) OR (typeof(answer) = 'text' AND lower(answer) LIKE ?)
+            OR ({candidates})
+        ORDER BY timestamp ASC, id ASC
+        LIMIT ? OFFSET ?;
+        """
+        like = f"%{search_term}%"
+        match = " AND ".join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams)
+        results, offset = [], 0
+        while len(results) < limit:
+            params = (like, like) + ((match,) if use_index else ()) + (batch_size, offset)
+            rows = self.codec.decode_rows(self.sql_manager.execute_query(query, params, fetch_all=True), (0, 1))
+            results.extend(row for row in rows
+                           if search_term in (row[0] or "").lower() or search_term in (row[1] or "").lower())
+            if len(rows) < batch_size:
+                break
+            offset += batch_size
+        return results[:limit]
+
+    def _has_search_index(self) -> bool:
+        # Missing with SQLite builds without FTS5 (see create_tables)
+        return bool(self.sql_manager.execute_query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_history_fts';", fetch_one=True))
+
     def summarize_search_result(self, search_result: str) -> str:
         """
         Summarize the search result if it exceeds the character limit
         :param search_result: The search result to summarize
         :return: A summarized version of search results
         """
-        response = self.client.chat.complete(
-            model=self.summary_model,
-            messages=[
-                {"role": "system", "content": f"Summarize the following content within {self.max_characters} characters"},
-                {"role": "user", "content": search_result}
-            ]
-        )
+        messages = [
+            {"role": "system", "content": f"Summarize the following content within {self.max_characters} characters"},
+            {"role": "user", "content": search_result}
+        ]
+        if self.llm_cache is not None:
+            response = self.llm_cache.complete(self.client, self.summary_model, messages, temperature=0.0)
+        else:
+            response = self.client.chat.complete(
+                model=self.summary_model,
+                messages=messages
+            )
         response = response.choices[0].message.content
         return response
@@ -0,0 +1,355 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from .db_schema import MEMORY_TABLES, create_tables, table_columns
+from .sql_manager import SQLManager
+
+CATALOG_SQL = """
+    CREATE TABLE IF NOT EXISTS shards (
+        shard_id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS user_directory (
+        user_id INTEGER PRIMARY KEY,
+        shard_id INTEGER NOT NULL,
+        FOREIGN KEY(shard_id) REFERENCES shards(shard_id)
+    );
+"""
+
+
+class ShardedSQLManager:
+    """
+    Spreads the chatbot tables over several SQLite files, one user's rows (user_info, chat_history, summary)
+    all living in the same shard, so writes for users on different shards proceed in parallel.
+
+    A small catalog database records the shard files and which shard each user lives on. New users are placed
+    by `user_id % number of shards`; moves made by `move_user`/`rebalance` are recorded in the catalog, so
+    placement never changes behind the application's back. User ids are allocated by the catalog and stay
+    unique across shards. Every shard has its own connection pool.
+
+    Statements that aren't routed to a user (`execute_query`, `transaction`) go to the shard of the default
+    user, the first registered one, which is the single user of the chatbots.
+    """
+
+    def __init__(self, shard_dir: str, num_shards: int = 4, pool_size: int = 4, synchronous: str = "NORMAL"):
+        """
+        Initializes the ShardedSQLManager. The catalog and shard files are created on first use.
+
+        :param shard_dir: Directory holding catalog.db and the shard_<n>.db files
+        :param num_shards: Number of shards created for a new catalog (an existing catalog keeps its shards)
+        :param pool_size: Pooled connections per shard
+        :param synchronous: SQLite synchronous mode of the shard connections (NORMAL or FULL)
+        """
+        self.shard_dir = str(shard_dir)
+        self.pool_size = pool_size
+        self.synchronous = synchronous
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.catalog = SQLManager(os.path.join(self.shard_dir, "catalog.db"), pool_size=2)
+        self._lock = threading.Lock()
+        self._managers: Dict[int, SQLManager] = {}
+        self._directory: Dict[int, int] = {}
+        self._default_user_id: Optional[int] = None
+
+        with self.catalog.transaction() as cursor:
+            for statement in CATALOG_SQL.split(";"):
+                if statement.strip():
+                    cursor.execute(statement)
+            if cursor.execute("SELECT COUNT(*) FROM shards;").fetchone()[0] == 0:
+                cursor.executemany("INSERT INTO shards (shard_id, path) VALUES (?, ?);",
+                                   [(i, self._shard_file(i)) for i in range(num_shards)])
+        self._load_shards()
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "ShardedSQLManager":
+        manager = cls(str(cfg.shard_dir), cfg.num_shards, cfg.sql_pool_size, cfg.sql_synchronous)
+        if manager.num_shards != cfg.num_shards:
+            print(f"[shards] catalog has {manager.num_shards} shards, sharding_config asks for {cfg.num_shards}; "
+                  f"run rebalance_shards.py to change it.")
+        return manager
+
+    def _shard_file(self, shard_id: int) -> str:
+        return f"shard_{shard_id}.db"
+
+    def _load_shards(self) -> None:
+        rows = self.catalog.execute_query("SELECT shard_id, path FROM shards ORDER BY shard_id;", fetch_all=True)
+        with self._lock:
+            for shard_id, path in rows:
+                if shard_id not in self._managers:
+                    manager = SQLManager(os.path.join(self.shard_dir, path), pool_size=self.pool_size,
+                                         synchronous=self.synchronous)
+                    with manager.pool.connection() as conn:
+                        create_tables(conn)
+                    self._managers[shard_id] = manager
+            self.shard_ids = [shard_id for shard_id, _ in rows]
+            self.num_shards = len(self.shard_ids)
+
+    # ------------------------------------------------------------------ routing
+
+    def shard_of(self, user_id: Optional[Any]) -> int:
+        """
+        :param user_id: The user id (None or "" for the default user)
+        :return: The shard holding the user's rows, registering the user on first sight
+        """
+        if user_id in (None, ""):
+            user_id = self.default_user_id()
+            if user_id is None:
+                return self.shard_ids[0]
+        user_id = int(user_id)
+        shard_id = self._directory.get(user_id)
+        if shard_id is not None:
+            return shard_id
+        row = self.catalog.execute_query("SELECT shard_id FROM user_directory WHERE user_id = ?;", (user_id,), fetch_one=True)
+        if row is None:
+            shard_id = self.shard_ids[user_id % self.num_shards]
+            self.catalog.execute_query("INSERT OR IGNORE INTO user_directory (user_id, shard_id) VALUES (?, ?);",
+                                       (user_id, shard_id))
+            row = self.catalog.execute_query("SELECT shard_id FROM user_directory WHERE user_id = ?;", (user_id,), fetch_one=True)
+        self._directory[user_id] = row[0]
+        return row[0]
+
+    def for_user(self, user_id: Optional[Any]) -> SQLManager:
+        """
+        :param user_id: The user whose data will be accessed
+        :return: The SQLManager of the shard holding the user's rows
+        """
+        return self._managers[self.shard_of(user_id)]
+
+    def shards(self) -> List[SQLManager]:
+        """
+        :return: The SQLManager of every shard
+        """
+        return [self._managers[shard_id] for shard_id in self.shard_ids]
+
+    def default_user_id(self) -> Optional[int]:
+        """
+        :return: The first registered user, None if there is none yet
+        """
+        if self._default_user_id is None:
+            row = self.catalog.execute_query("SELECT MIN(user_id) FROM user_directory;", fetch_one=True)
+            self._default_user_id = row[0] if row else None
+        return self._default_user_id
+
+    def execute_query(self, query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False) -> list:
+        """
+        Execute a query on the shard of the default user (see SQLManager.execute_query).
+        """
+        return self.for_user(None).execute_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+
+    def execute_insert(self, query: str, params: tuple = ()) -> Optional[int]:
+        return self.for_user(None).execute_insert(query, params)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+        with self.for_user(None).transaction(immediate) as cursor:
+            yield cursor
+
+    # ------------------------------------------------------------------ users
+
+    def create_user(self, **fields: Any) -> int:
+        """
+        Register a new user in the catalog and insert its user_info row in its shard.
+        :param fields: user_info columns (name, last_name, occupation, location, ...)
+        :return: The new user id
+        """
+        with self.catalog.transaction() as cursor:
+            # The rowid allocation happens under the write lock, so concurrent creators get distinct ids
+            cursor.execute("INSERT INTO user_directory (shard_id) VALUES (?);", (self.shard_ids[0],))
+            user_id = cursor.lastrowid
+            shard_id = self.shard_ids[user_id % self.num_shards]
+            cursor.execute("UPDATE user_directory SET shard_id = ? WHERE user_id = ?;", (shard_id, user_id))
+        columns = ["id"] + list(fields)
+        self._managers[shard_id].execute_query(
+            f"INSERT INTO user_info ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});",
+            (user_id, *fields.values())
+        )
+        self._directory[user_id] = shard_id
+        return user_id
+
+    def users(self) -> Dict[int, int]:
+        """
+        :return: user_id -> shard_id for every registered user
+        """
+        return dict(self.catalog.execute_query("SELECT user_id, shard_id FROM user_directory;", fetch_all=True))
+
+    # ------------------------------------------------------------------ maintenance
+
+    def add_shards(self, count: int) -> List[int]:
+        """
+        Create new, empty shards. Existing users stay where they are until moved.
+        :param count: Number of shards to add
+        :return: The new shard ids
+        """
+        start = max(self.shard_ids) + 1
+        new_ids = list(range(start, start + count))
+        with self.catalog.transaction() as cursor:
+            cursor.executemany("INSERT INTO shards (shard_id, path) VALUES (?, ?);",
+                               [(i, self._shard_file(i)) for i in new_ids])
+        self._load_shards()
+        return new_ids
+
+    def move_user(self, user_id: int, target_shard: int) -> Dict[str, int]:
+        """
+        Move all rows of a user to another shard. The rows are copied in one transaction on the target, the
+        catalog is switched, then the rows are deleted from the source. Run it while the bots are stopped:
+        writes landing on the source shard during the move would be lost.
+
+        Row ids are per shard: rows keep their id unless the target already uses it, in which case they get a
+        new one and the facts pointing at a renumbered chat_history row (source_id) are updated. The
+        chat_history_fts search index isn't moved; with compression enabled, run `prepare_sqldb.py --compress`
+        afterwards to rebuild it.
+
+        :param user_id: The user to move
+        :param target_shard: The destination shard id
+        :return: Number of moved rows per table
+        """
+        source_shard = self.shard_of(user_id)
+        if source_shard == target_shard:
+            return {}
+        source = self._managers[source_shard]
+        target = self._managers[target_shard]
+        counts = {}
+        # table -> old id -> new id of the rows renumbered on the target
+        renumbered: Dict[str, Dict[int, int]] = {}
+        with source.pool.connection() as source_conn, target.transaction() as cursor:
+            for table in MEMORY_TABLES:
+                key = "id" if table == "user_info" else "user_id"
+                columns = table_columns(source_conn, table)
+                rows = source_conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {key} = ? ORDER BY rowid;",
+                                           (user_id,)).fetchall()
+                if table == "facts":
+                    rows = self._remap_source_ids(columns, rows, renumbered.get("chat_history"))
+                insert = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                          f"VALUES ({', '.join('?' * len(columns))});")
+                if table == "user_info" or "id" not in columns:
+                    cursor.executemany(insert, rows)
+                else:
+                    renumbered[table] = self._insert_keeping_ids(cursor, table, columns, rows)
+                counts[table] = len(rows)
+        self.catalog.execute_query("INSERT OR REPLACE INTO user_directory (user_id, shard_id) VALUES (?, ?);",
+                                   (user_id, target_shard))
+        self._directory[user_id] = target_shard
+        with source.transaction() as cursor:
+            for table in reversed(MEMORY_TABLES):
+                key = "id" if table == "user_info" else "user_id"
+                cursor.execute(f"DELETE FROM {table} WHERE {key} = ?;", (user_id,))
+        return counts
+
+    @staticmethod
+    def _insert_keeping_ids(cursor: sqlite3.Cursor, table: str, columns: List[str], rows: List[tuple]) -> Dict[int, int]:
+        """
+        Insert rows with their id, or with a new one if the id is already taken in the table.
+        :return: old id -> new id of the renumbered rows
+        """
+        id_index = columns.index("id")
+        taken = set()
+        ids = [row[id_index] for row in rows]
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            taken.update(r[0] for r in cursor.execute(
+                f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(batch))});", batch).fetchall())
+        kept = [row for row in rows if row[id_index] not in taken]
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                           f"VALUES ({', '.join('?' * len(columns))});", kept)
+        other_columns = [c for c in columns if c != "id"]
+        renumbered = {}
+        for row in rows:
+            if row[id_index] in taken:
+                cursor.execute(f"INSERT INTO {table} ({', '.join(other_columns)}) "
+                               f"VALUES ({', '.join('?' * len(other_columns))});",
+                               row[:id_index] + row[id_index + 1:])
+                renumbered[row[id_index]] = cursor.lastrowid
+        return renumbered
+
+    @staticmethod
+    def _remap_source_ids(columns: List[str], rows: List[tuple], renumbered: Optional[Dict[int, int]]) -> List[tuple]:
+        """Point facts at the new id of their renumbered chat_history row."""
+        if not renumbered:
+            return rows
+        index = columns.index("source_id")
+        return [row[:index] + (renumbered.get(row[index], row[index]),) + row[index + 1:] for row in rows]
+
+    def rebalance(self, num_shards: Optional[int] = None) -> Dict[int, int]:
+        """
+        Spread the users evenly (`user_id % num_shards`) over the shards, adding shards first if asked to.
+        Shrinking moves the users off the highest shards and drops them from the catalog (their files are left
+        on disk).
+
+        :param num_shards: Target number of shards, defaults to the current one
+        :return: user_id -> new shard_id of the moved users
+        """
+        num_shards = num_shards or self.num_shards
+        if num_shards > self.num_shards:
+            self.add_shards(num_shards - self.num_shards)
+        targets = self.shard_ids[:num_shards]
+        moved = {}
+        for user_id, shard_id in sorted(self.users().items()):
+            target = targets[user_id % num_shards]
+            if target != shard_id:
+                self.move_user(user_id, target)
+                moved[user_id] = target
+        if num_shards < self.num_shards:
+            self.catalog.execute_query(
+                f"DELETE FROM shards WHERE shard_id NOT IN ({', '.join('?' * len(targets))});", tuple(targets))
+            self._load_shards()
+        return moved
+
+    def import_database(self, db_path: str) -> Dict[str, int]:
+        """
+        Split an unsharded chatbot database into the shards, keeping user ids and, unless the shard already uses
+        them, row ids (see `move_user`). Rows without a user go to the first shard. Tables missing from the source
+        database are skipped.
+        :param db_path: The single-file database (e.g. data/chatbot.db)
+        :return: Number of imported rows per table
+        """
+        counts = {}
+        source = sqlite3.connect(db_path)
+        # shard_id -> old chat_history id -> new id
+        renumbered: Dict[int, Dict[int, int]] = {}
+        try:
+            for (user_id,) in source.execute("SELECT id FROM user_info ORDER BY id;").fetchall():
+                self.shard_of(user_id)
+            for table in MEMORY_TABLES:
+                columns = table_columns(source, table)
+                if not columns:
+                    # Table added after the source database was created
+                    counts[table] = 0
+                    continue
+                key = "id" if table == "user_info" else "user_id"
+                rows = source.execute(f"SELECT {key}, {', '.join(columns)} FROM {table} ORDER BY rowid;").fetchall()
+                by_shard: Dict[int, list] = {}
+                for row in rows:
+                    shard_id = self.shard_of(row[0]) if row[0] is not None else self.shard_ids[0]
+                    by_shard.setdefault(shard_id, []).append(row[1:])
+                for shard_id, shard_rows in by_shard.items():
+                    with self._managers[shard_id].transaction() as cursor:
+                        if table == "facts":
+                            shard_rows = self._remap_source_ids(columns, shard_rows, renumbered.get(shard_id))
+                        if table == "user_info" or "id" not in columns:
+                            cursor.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                                               f"VALUES ({', '.join('?' * len(columns))});", shard_rows)
+                        else:
+                            ids = self._insert_keeping_ids(cursor, table, columns, shard_rows)
+                            if table == "chat_history":
+                                renumbered[shard_id] = ids
+                counts[table] = len(rows)
+        finally:
+            source.close()
+        return counts
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        :return: Users and rows per table for every shard
+        """
+        users = self.users()
+        report = []
+        for shard_id in self.shard_ids:
+            manager = self._managers[shard_id]
+            entry = {"shard": shard_id, "path": manager.db_path,
+                     "users": sum(1 for s in users.values() if s == shard_id)}
+            for table in MEMORY_TABLES:
+                entry[table] = manager.execute_query(f"SELECT COUNT(*) FROM {table};", fetch_one=True)[0]
+            report.append(entry)
+        return report
@@ -0,0 +1,103 @@
+import re
+from typing import List, Sequence, Tuple
+
+
+class SnippetExtractor:
+    """
+    Local, budget-aware replacement for summarizing long search results with an LLM.
+
+    For each matching question/answer it cuts windows of text around the occurrences of the search terms,
+    merges overlapping windows, ranks the snippets (whole-phrase matches first, then the number of distinct terms
+    and of matches, questions before answers, newer rows first) and greedily packs the best ones into the
+    character budget.
+    """
+
+    ELLIPSIS = "..."
+
+    def __init__(self, max_characters: int = 1000, window_characters: int = 80, min_term_length: int = 3):
+        """
+        Initializes the SnippetExtractor
+
+        :param max_characters: Character budget of the packed result
+        :param window_characters: Characters of context kept on each side of a match
+        :param min_term_length: Shorter words of the search term are not matched on their own
+        """
+        self.max_characters = max_characters
+        self.window_characters = window_characters
+        self.min_term_length = min_term_length
+
+    def terms(self, search_term: str) -> List[str]:
+        """
+        :return: The whole search phrase followed by its individual words, lowercased and deduplicated
+        """
+        phrase = search_term.strip().lower()
+        terms = [phrase] if phrase else []
+        for word in re.findall(r"\w+", phrase):
+            if len(word) >= self.min_term_length and word not in terms:
+                terms.append(word)
+        return terms
+
+    def _windows(self, text: str, terms: Sequence[str]) -> List[Tuple[int, int, int, set]]:
+        """
+        :return: Merged (start, end, match count, matched terms) windows around the term occurrences in text
+        """
+        lowered = text.lower()
+        spans = []
+        for term in terms:
+            for match in re.finditer(re.escape(term), lowered):
+                spans.append((max(0, match.start() - self.window_characters),
+                              min(len(text), match.end() + self.window_characters), term))
+        spans.sort()
+        windows = []
+        for start, end, term in spans:
+            if windows and start <= windows[-1][1]:
+                last = windows[-1]
+                windows[-1] = (last[0], max(last[1], end), last[2] + 1, last[3] | {term})
+            else:
+                windows.append((start, end, 1, {term}))
+        return windows
+
+    def _cut(self, text: str, start: int, end: int) -> str:
+        """Cut text[start:end] on word boundaries and mark truncated sides."""
+        if start > 0:
+            space = text.find(" ", start, end)
+            start = space + 1 if space != -1 else start
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            end = space if space > start else end
+        snippet = " ".join(text[start:end].split())
+        return (self.ELLIPSIS if start > 0 else "") + snippet + (self.ELLIPSIS if end < len(text) else "")
+
+    def extract(self, results: Sequence[tuple], search_term: str) -> str:
+        """
+        Build the packed snippet text for search results.
+        :param results: (question, answer, timestamp) rows, oldest first
+        :param search_term: The searched term
+        :return: One line per kept snippet, `[timestamp] User/Assistant: snippet`, within the character budget
+        """
+        terms = self.terms(search_term)
+        phrase = terms[0] if terms else ""
+        candidates = []
+        for age, (question, answer, timestamp) in enumerate(reversed(results)):
+            for field_rank, (label, text) in enumerate((("User", question), ("Assistant", answer))):
+                text = str(text or "")
+                for start, end, count, matched in self._windows(text, terms):
+                    line = f"[{timestamp}] {label}: {self._cut(text, start, end)}"
+                    score = (phrase in matched, len(matched), count, -field_rank, -age)
+                    candidates.append((score, (len(results) - age, field_rank, start), line))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        kept = []
+        used = 0
+        for _, position, line in candidates:
+            cost = len(line) + (1 if kept else 0)
+            if used + cost > self.max_characters:
+                continue
+            kept.append((position, line))
+            used += cost
+        if not kept and candidates:
+            # Not even the best snippet fits: truncate it rather than returning nothing
+            best = candidates[0][2]
+            return best[:max(0, self.max_characters - len(self.ELLIPSIS))] + self.ELLIPSIS
+        # Present the kept snippets in conversation order
+        return "\n".join(line for _, line in sorted(kept))
@@ -1,17 +1,127 @@
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ConnectionPool:
+    """
+    A small pool of SQLite connections to one database file. Connections are opened lazily up to `size`,
+    shared across threads (one user at a time) and use WAL journaling so readers don't block the writer.
+    Waiting times are recorded to show contention on the database.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, busy_timeout: float = 30.0, synchronous: str = "NORMAL"):
+        """
+        Initializes the ConnectionPool
+
+        :param db_path: Path to the SQLite database file
+        :param size: Maximum number of open connections
+        :param busy_timeout: Seconds SQLite waits for a lock held by another connection
+        :param synchronous: SQLite synchronous mode; NORMAL is durable across crashes of the process,
+            FULL also across power loss (every commit is flushed to disk)
+        """
+        self.db_path = str(db_path)
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self.stats = {"acquisitions": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute(f"PRAGMA synchronous={self.synchronous};")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except BaseException:
+                    self._opened -= 1
+                    raise
+        started = time.monotonic()
+        conn = self._idle.get(timeout=self.busy_timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.stats["waits"] += 1
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection. Uncommitted work is rolled back before the connection goes back to the pool.
+        :return: The connection
+        """
+        conn = self._acquire()
+        with self._lock:
+            self.stats["acquisitions"] += 1
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["open_connections"] = self._opened
+        return stats
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
 
 class SQLManager:
     """
     A manager for Handling SQLite database connections and executing queries
     """
-    def __init__(self,db_path:str):
+    def __init__(self,db_path:str, pool_size: int = 4, synchronous: str = "NORMAL"):
         """
         Initialize the SQLManager instance
 
         Args:
             db_path: Path to the SQLite database file
+            pool_size: Maximum number of pooled connections to the database
+            synchronous: SQLite synchronous mode of the connections (NORMAL or FULL)
         """
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size, synchronous=synchronous)
+
+    def for_user(self, user_id: Optional[Any]) -> "SQLManager":
+        """
+        :param user_id: The user whose data will be accessed
+        :return: The manager holding the user's data (this one, as the database is not sharded)
+        """
+        return self
+
+    def shards(self) -> List["SQLManager"]:
+        """
+        :return: The managers of every database holding memory tables
+        """
+        return [self]
 
     def execute_query(self,query:str,params: tuple = (), fetch_one:bool = False, fetch_all:bool = False) -> list:
         """
@@ -26,15 +136,47 @@ class SQLManager:
                 - All rows (if `fetch_all` is True)
                 - None if No data is fetched.
         """
-
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(query,params)
-        result = cursor.fetchone() if fetch_one else cursor.fetchall() if fetch_all else None
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query,params)
+            result = cursor.fetchone() if fetch_one else cursor.fetchall() if fetch_all else None
+            conn.commit()
         return result
 
+    def execute_insert(self, query: str, params: tuple = ()) -> Optional[int]:
+        """
+        Execute an INSERT and return the id of the new row
+        :param query: The INSERT statement
+        :param params: Parameter to pass to SQL query. Default to ()
+        :return: The rowid of the inserted row
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute(query, params)
+            conn.commit()
+        return cursor.lastrowid
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+        """
+        Run several statements in a single transaction, committed on success and rolled back on error.
+
+        Example:
+            with sql_manager.transaction() as cursor:
+                cursor.executemany(query, rows)
+
+        :param immediate: Take the write lock at BEGIN, for transactions that read what they then write
+        :return: A cursor bound to the transaction
+        """
+        with self.pool.connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE;" if immediate else "BEGIN;")
+                yield cursor
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
 # if __name__ == '__main__':
 #     from load_config import LoadConfig
 #     cfg = LoadConfig()
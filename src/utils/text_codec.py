@@ -0,0 +1,202 @@
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+# First byte of a compressed value; dictionary-compressed values are followed by the 4-byte dictionary id
+ZLIB, ZLIB_DICT, ZSTD, ZSTD_DICT = 1, 2, 3, 4
+CURRENT_DICTIONARY = "CURRENT"
+# zlib only looks back 32 KB, a longer dictionary would be ignored
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+
+class TextCodec:
+    """
+    Transparent compression of large text columns (chat answers and questions, summaries).
+
+    `encode` turns texts of at least `min_bytes` UTF-8 bytes into BLOBs (zlib raw deflate, or zstd when the
+    zstandard package is installed), optionally primed with a dictionary trained on the stored history, which
+    is what makes short chat texts compress well. Shorter texts, and texts that don't shrink, stay plain TEXT.
+    SQLite keeps BLOB values as they are in TEXT columns, so no schema change is needed.
+
+    `decode` accepts both, so reads work whatever the current settings: a value starts with its format byte and,
+    if a dictionary was used, the dictionary id. Dictionaries live in `dictionary_dir` as `<id>.dict`; the one used
+    for new values is named in its CURRENT file (written by `src/train_text_dictionary.py`). Older dictionaries
+    must be kept as long as values compressed with them are stored.
+    """
+
+    def __init__(self, enabled: bool = False, algorithm: str = "zlib", level: int = 6, min_bytes: int = 256,
+                 dictionary_dir: Optional[str] = None):
+        """
+        Initializes the TextCodec
+
+        :param enabled: Whether `encode` compresses (`decode` always works)
+        :param algorithm: "zlib" or "zstd" (requires the zstandard package)
+        :param level: Compression level
+        :param min_bytes: Texts shorter than this stay plain TEXT
+        :param dictionary_dir: Directory of the trained dictionaries, None to compress without one
+        """
+        if algorithm == "zstd" and zstandard is None:
+            raise ImportError("compression_config.algorithm is zstd but the zstandard package is not installed "
+                              "(pip install zstandard), or use zlib.")
+        if algorithm not in ("zlib", "zstd"):
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+        self.enabled = enabled
+        self.algorithm = algorithm
+        self.level = level
+        self.min_bytes = min_bytes
+        self.dictionary_dir = str(dictionary_dir) if dictionary_dir else None
+        self._dictionaries: Dict[int, bytes] = {}
+        self._zstd: Dict[tuple, Any] = {}
+        self.dictionary_id: Optional[int] = None
+        if self.dictionary_dir:
+            current = os.path.join(self.dictionary_dir, CURRENT_DICTIONARY)
+            if os.path.exists(current):
+                with open(current) as f:
+                    self.dictionary_id = int(f.read().strip(), 16)
+                self._dictionary(self.dictionary_id)
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "TextCodec":
+        return cls(cfg.compression_enabled, cfg.compression_algorithm, cfg.compression_level,
+                   cfg.compression_min_bytes, cfg.compression_dictionary_dir)
+
+    def _dictionary(self, dictionary_id: int) -> bytes:
+        data = self._dictionaries.get(dictionary_id)
+        if data is None:
+            path = os.path.join(self.dictionary_dir or "", f"{dictionary_id:08x}.dict")
+            if not os.path.exists(path):
+                raise ValueError(f"Text dictionary {dictionary_id:08x} not found in {self.dictionary_dir}")
+            with open(path, "rb") as f:
+                data = self._dictionaries[dictionary_id] = f.read()
+        return data
+
+    def _zstd_codec(self, kind: str, dictionary_id: Optional[int]) -> Any:
+        # zstandard (de)compressors aren't thread-safe, so each call gets its own; the parsed dictionary is shared
+        key = ("dict", dictionary_id)
+        if dictionary_id is not None and key not in self._zstd:
+            self._zstd[key] = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id))
+        dictionary = self._zstd.get(key)
+        if kind == "compress":
+            return zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        return zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def encode(self, text: Optional[str]) -> Union[str, bytes, None]:
+        """
+        :param text: A text to store
+        :return: The text itself, or the compressed BLOB if compression is enabled and worth it
+        """
+        if not self.enabled or text is None:
+            return text
+        raw = text.encode("utf-8")
+        if len(raw) < self.min_bytes:
+            return text
+        dictionary_id = self.dictionary_id
+        if self.algorithm == "zstd":
+            header = bytes([ZSTD]) if dictionary_id is None else bytes([ZSTD_DICT]) + dictionary_id.to_bytes(4, "big")
+            payload = self._zstd_codec("compress", dictionary_id).compress(raw)
+        else:
+            header = bytes([ZLIB]) if dictionary_id is None else bytes([ZLIB_DICT]) + dictionary_id.to_bytes(4, "big")
+            if dictionary_id is None:
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            else:
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self._dictionary(dictionary_id))
+            payload = compressor.compress(raw) + compressor.flush()
+        if len(header) + len(payload) >= len(raw):
+            return text
+        return header + payload
+
+    def decode(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """
+        :param value: A stored value, plain or compressed
+        :return: The text
+        """
+        if value is None or isinstance(value, str):
+            return value
+        kind = value[0]
+        if kind in (ZLIB_DICT, ZSTD_DICT):
+            dictionary_id, payload = int.from_bytes(value[1:5], "big"), value[5:]
+        else:
+            dictionary_id, payload = None, value[1:]
+        if kind in (ZLIB, ZLIB_DICT):
+            if dictionary_id is None:
+                decompressor = zlib.decompressobj(-15)
+            else:
+                decompressor = zlib.decompressobj(-15, zdict=self._dictionary(dictionary_id))
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        elif kind in (ZSTD, ZSTD_DICT):
+            if zstandard is None:
+                raise ImportError("Stored text is zstd-compressed, install the zstandard package to read it.")
+            raw = self._zstd_codec("decompress", dictionary_id).decompress(payload)
+        else:
+            raise ValueError(f"Unknown text encoding {kind}")
+        return raw.decode("utf-8")
+
+    def decode_rows(self, rows: Sequence[Sequence[Any]], columns: Sequence[int]) -> List[tuple]:
+        """
+        :param rows: Query results
+        :param columns: Indexes of the text columns to decode
+        :return: The rows with those columns decoded
+        """
+        return [tuple(self.decode(v) if i in columns else v for i, v in enumerate(row)) for row in rows]
+
+
+def train_dictionary(samples: Sequence[str], algorithm: str = "zlib", size: int = ZLIB_DICTIONARY_SIZE) -> bytes:
+    """
+    Build a compression dictionary from sample texts.
+
+    zstd uses its own trainer. For zlib, a dictionary is just text the compressor can refer back to, so it is
+    made of the word sequences (2 to 8 words) found in the most samples, weighted by length. The most common ones
+    are placed at the end, closest to the data, where references are cheapest.
+    :param samples: Representative texts, e.g. recent answers
+    :param algorithm: "zlib" or "zstd"
+    :param size: Dictionary size in bytes (zlib can't use more than 32 KB)
+    :return: The dictionary
+    """
+    if algorithm == "zstd":
+        if zstandard is None:
+            raise ImportError("Training a zstd dictionary needs the zstandard package.")
+        return zstandard.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+    size = min(size, ZLIB_DICTIONARY_SIZE)
+    document_frequency: Counter = Counter()
+    for sample in samples:
+        words = re.findall(r"\S+\s*", sample)
+        grams = set()
+        for n in (2, 3, 4, 6, 8):
+            for start in range(0, len(words) - n + 1):
+                grams.add("".join(words[start:start + n]))
+        document_frequency.update(grams)
+    scored = sorted(((count * len(gram), gram) for gram, count in document_frequency.items() if count > 1),
+                    reverse=True)
+    chosen: List[str] = []
+    used = 0
+    for _, gram in scored:
+        length = len(gram.encode("utf-8"))
+        if used + length > size or any(gram in other for other in chosen[-200:]):
+            continue
+        chosen.append(gram)
+        used += length
+        if used >= size - 8:
+            break
+    return "".join(reversed(chosen)).encode("utf-8")[:size]
+
+
+def save_dictionary(dictionary: bytes, dictionary_dir: str, make_current: bool = True) -> int:
+    """
+    Store a trained dictionary as `<id>.dict` and, by default, use it for new values.
+    :return: The dictionary id (crc32 of its bytes)
+    """
+    os.makedirs(dictionary_dir, exist_ok=True)
+    dictionary_id = zlib.crc32(dictionary)
+    with open(os.path.join(dictionary_dir, f"{dictionary_id:08x}.dict"), "wb") as f:
+        f.write(dictionary)
+    if make_current:
+        with open(os.path.join(dictionary_dir, CURRENT_DICTIONARY), "w") as f:
+            f.write(f"{dictionary_id:08x}\n")
+    return dictionary_id
@@ -0,0 +1,183 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .turn_deadline import current_deadline
+
+FUNCTION_CALL_SUCCESSFUL = "Function call successful."
+FUNCTION_CALL_FAILED = "Function call failed."
+
+
+@dataclass
+class ToolSpec:
+    """A registered tool: the function, its runtime limits and its cached JSON schema."""
+    name: str
+    func: Callable
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    is_async: bool = False
+    _schema: Optional[Dict[str, Any]] = field(default=None, repr=False)
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        """
+        The function-calling schema of the tool, generated once per process. Generation is deferred to first use so
+        importing a module that defines tools doesn't import pydantic.
+        """
+        if self._schema is None:
+            from .utilities import Utilities
+            self._schema = Utilities.jsonschema(self.func)
+        return self._schema
+
+
+# All tools registered with @tool, by name
+TOOL_REGISTRY: Dict[str, ToolSpec] = {}
+
+
+def tool(name: Optional[str] = None, timeout: Optional[float] = None, max_concurrency: Optional[int] = None) -> Callable:
+    """
+    Register a function or method as a tool the model can call.
+
+    :param name: Tool name exposed to the model, defaults to the function name
+    :param timeout: Seconds a call may take before the turn moves on without it (tool_config default if None)
+    :param max_concurrency: Concurrent calls of this tool allowed per process (tool_config default if None)
+    :return: The decorator, which returns the function unchanged
+    """
+    def decorator(func: Callable) -> Callable:
+        spec = ToolSpec(name or func.__name__, func, timeout, max_concurrency, inspect.iscoroutinefunction(func))
+        TOOL_REGISTRY[spec.name] = spec
+        func.__tool_spec__ = spec
+        return func
+    return decorator
+
+
+class ToolRuntime:
+    """
+    Runs tool calls with their timeout and concurrency limit. Shared by every chatbot of the process (see
+    ResourceRegistry), so the per-tool limits hold across sessions.
+
+    Calls run on a thread pool inside a copy of the caller's context, so context variables (e.g. the turn deadline)
+    are visible to the tool. A call that times out is abandoned, not killed: it keeps its concurrency slot until
+    it actually finishes, so a hanging tool can't pile up unbounded work.
+    """
+
+    def __init__(self, default_timeout: float = 30.0, default_max_concurrency: int = 4, max_workers: int = 16,
+                 overrides: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Initializes the ToolRuntime
+
+        :param default_timeout: Timeout of tools that don't set one
+        :param default_max_concurrency: Concurrency limit of tools that don't set one
+        :param max_workers: Threads running tool calls
+        :param overrides: Per-tool settings taking precedence over the decorator, e.g. {"search_vector_db": {"timeout": 20}}
+        """
+        self.default_timeout = default_timeout
+        self.default_max_concurrency = default_max_concurrency
+        self.overrides = overrides or {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "ToolRuntime":
+        return cls(
+            default_timeout=cfg.tool_timeout,
+            default_max_concurrency=cfg.tool_max_concurrency,
+            max_workers=cfg.tool_max_workers,
+            overrides=cfg.tool_overrides,
+        )
+
+    def timeout_for(self, spec: ToolSpec) -> float:
+        override = self.overrides.get(spec.name, {}).get("timeout")
+        if override is not None:
+            return override
+        return spec.timeout if spec.timeout is not None else self.default_timeout
+
+    def _semaphore(self, spec: ToolSpec) -> threading.BoundedSemaphore:
+        semaphore = self._semaphores.get(spec.name)
+        if semaphore is None:
+            with self._lock:
+                if spec.name not in self._semaphores:
+                    limit = self.overrides.get(spec.name, {}).get("max_concurrency")
+                    if limit is None:
+                        limit = spec.max_concurrency if spec.max_concurrency is not None else self.default_max_concurrency
+                    self._semaphores[spec.name] = threading.BoundedSemaphore(limit)
+                semaphore = self._semaphores[spec.name]
+        return semaphore
+
+    def bind(self, *methods: Callable) -> "ToolSet":
+        """
+        Build the tool set of a chatbot from registered functions or bound methods.
+        :param methods: Functions decorated with @tool, usually bound to the bot's managers
+        :return: The ToolSet
+        """
+        tools = {}
+        for method in methods:
+            spec = getattr(getattr(method, "__func__", method), "__tool_spec__", None)
+            if spec is None:
+                raise ValueError(f"{method.__name__} is not registered as a tool.")
+            tools[spec.name] = (spec, method)
+        return ToolSet(self, tools)
+
+    def run(self, spec: ToolSpec, method: Callable, arguments: Dict[str, Any]) -> Tuple[str, Any]:
+        """
+        Call a tool within its concurrency limit and timeout. Inside a chat turn the timeout is also capped by the
+        time the turn can still spend on optional work, and the call is skipped when too little is left.
+        :return: The (function state, result) tuple of the tool, or a failure tuple on timeout or error
+        """
+        timeout = self.timeout_for(spec)
+        turn = current_deadline()
+        if turn is not None:
+            if turn.should_shed(f"tool:{spec.name}"):
+                return FUNCTION_CALL_FAILED, f"{spec.name} skipped: not enough time left in this turn. Answer with what you know."
+            timeout = min(timeout, turn.available())
+        semaphore = self._semaphore(spec)
+        if not semaphore.acquire(timeout=timeout):
+            return FUNCTION_CALL_FAILED, f"{spec.name} is busy, try again later."
+
+        def call():
+            try:
+                if spec.is_async:
+                    return asyncio.run(method(**arguments))
+                return method(**arguments)
+            finally:
+                semaphore.release()
+
+        context = contextvars.copy_context()
+        try:
+            future = self.executor.submit(context.run, call)
+        except BaseException:
+            semaphore.release()
+            raise
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            print(f"[tools] {spec.name} timed out after {timeout:.1f}s")
+            return FUNCTION_CALL_FAILED, f"{spec.name} timed out after {timeout:.1f}s."
+        except Exception as e:
+            return FUNCTION_CALL_FAILED, f"Error executing {spec.name}: {str(e)}"
+
+
+class ToolSet:
+    """The tools of one chatbot: their cached schemas and a name -> bound method dispatch table."""
+
+    def __init__(self, runtime: ToolRuntime, tools: Dict[str, Tuple[ToolSpec, Callable]]):
+        self.runtime = runtime
+        self.tools = tools
+        self.schemas: List[Dict[str, Any]] = [spec.schema for spec, _ in tools.values()]
+
+    def execute(self, function_name: str, function_args: Dict[str, Any]) -> Tuple[str, Any]:
+        """
+        Execute the tool requested by the model.
+        :param function_name: The tool name
+        :param function_args: The arguments chosen by the model
+        :return: The (function state, result) tuple
+        """
+        entry = self.tools.get(function_name)
+        if entry is None:
+            return FUNCTION_CALL_FAILED, f"Unknown function: {function_name}"
+        spec, method = entry
+        return self.runtime.run(spec, method, function_args)
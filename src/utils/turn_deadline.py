@@ -0,0 +1,95 @@
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+
+class TurnDeadline:
+    """
+    Latency budget of one chat turn.
+
+    Every stage of the turn reads the deadline from the current context (`current_deadline()`): model calls cap
+    their timeout with the remaining time, and optional stages (tool calls, vector search, RAG and history
+    summarization) are shed once the time left, minus the reserve kept for the final answer, is too short.
+    Shed stages are recorded so the turn can report them.
+    """
+
+    def __init__(self, budget: Optional[float] = None, final_answer_reserve: float = 0.0, stage_min_seconds: float = 0.0):
+        """
+        Initializes the TurnDeadline
+
+        :param budget: Seconds the whole turn may take, None or 0 for no deadline
+        :param final_answer_reserve: Seconds kept for producing the final answer, optional stages can't use them
+        :param stage_min_seconds: Seconds an optional stage needs; it is shed when less time is available
+        """
+        self.budget = budget if budget else None
+        self.final_answer_reserve = final_answer_reserve
+        self.stage_min_seconds = stage_min_seconds
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + self.budget if self.budget else math.inf
+        self.shed: List[str] = []
+
+    def remaining(self) -> float:
+        """
+        :return: Seconds left until the deadline (inf without a budget)
+        """
+        return self.deadline - time.monotonic()
+
+    def available(self) -> float:
+        """
+        :return: Seconds left for optional work, the final answer reserve excluded
+        """
+        return self.remaining() - self.final_answer_reserve
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def timeout(self, default: float) -> float:
+        """
+        :param default: The stage's own timeout
+        :return: The timeout capped by the time left in the turn
+        """
+        return min(default, max(0.0, self.remaining()))
+
+    def should_shed(self, stage: str, needed: Optional[float] = None) -> bool:
+        """
+        Decide whether an optional stage still fits in the budget, recording it as shed if not.
+        :param stage: Stage name, reported in `shed`
+        :param needed: Seconds the stage needs, defaults to `stage_min_seconds`
+        :return: True if the stage must be skipped
+        """
+        needed = self.stage_min_seconds if needed is None else needed
+        if self.available() >= needed:
+            return False
+        if stage not in self.shed:
+            self.shed.append(stage)
+        return True
+
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("turn_deadline", default=None)
+
+
+def current_deadline() -> Optional[TurnDeadline]:
+    """
+    :return: The deadline of the turn running in this context, if any
+    """
+    return _current_deadline.get()
+
+
+@contextmanager
+def turn_deadline(budget: Optional[float], final_answer_reserve: float = 0.0,
+                  stage_min_seconds: float = 0.0) -> Iterator[TurnDeadline]:
+    """
+    Run a turn under a deadline visible to every stage called from this context (tool calls copy the context).
+    :param budget: Seconds the turn may take, None or 0 for no deadline
+    :param final_answer_reserve: Seconds kept for the final answer
+    :param stage_min_seconds: Seconds an optional stage needs to be started
+    :return: The TurnDeadline
+    """
+    deadline = TurnDeadline(budget, final_answer_reserve, stage_min_seconds)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
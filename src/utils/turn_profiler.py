@@ -0,0 +1,183 @@
+import cProfile
+import functools
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = "CHATBOT_PROFILE"
+
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class TurnProfiler:
+    """
+    Opt-in CPU and memory profiling of chat turns.
+
+    When enabled, each chatbot wraps its `chat` method with `wrap`: a sampled turn runs under cProfile and
+    tracemalloc and leaves, in `<output_dir>/<session_id>/turn_<n>/`:
+    - profile.prof: the pstats dump of the turn (open with snakeviz or `python -m pstats`)
+    - turn.json: wall and CPU time, peak traced memory, memory still allocated at the end of the turn, max RSS,
+      and the top allocation sites of that memory
+
+    When disabled, `chat` is not wrapped at all, so there is no overhead. `src/aggregate_profiles.py` merges the
+    dumps of many turns.
+
+    One turn is profiled at a time per process; a sampled turn starting while another is profiled runs
+    unprofiled. cProfile only sees the turn's thread: work handed to other threads (tool calls with a timeout,
+    background fact extraction) shows up as waiting time. tracemalloc and the CPU clock are process-wide, so they
+    would also count what other turns allocate and compute: memory and CPU are only reported for turns that ran
+    alone (`concurrent_turns` false in turn.json), while the cProfile dump and wall time are always written.
+    Background threads (fact extraction, hedged model calls) are not turns and still count.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0, output_dir: str = "data/profiles",
+                 top_allocations: int = 25, traceback_frames: int = 1):
+        """
+        Initializes the TurnProfiler
+
+        :param enabled: Whether chat turns are wrapped at all
+        :param sample_rate: Fraction of the turns profiled
+        :param output_dir: Directory of the dumps, one sub-directory per session and turn
+        :param top_allocations: Allocation sites kept per turn
+        :param traceback_frames: Frames stored per allocation (more frames cost more memory and time)
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.output_dir = str(output_dir)
+        self.top_allocations = top_allocations
+        self.traceback_frames = traceback_frames
+        self._lock = threading.Lock()
+        # Turns running in the process (profiled or not) and turns started so far, to tell whether a profiled
+        # turn ran alone
+        self._turns_lock = threading.Lock()
+        self._in_flight = 0
+        self._started = 0
+
+    @classmethod
+    def from_config(cls, cfg: Any) -> "TurnProfiler":
+        """
+        Settings from `profiling_config`. The CHATBOT_PROFILE environment variable overrides `enabled`:
+        "0" disables, "1" enables, and a number between 0 and 1 enables with that sample rate.
+        """
+        enabled, sample_rate = cfg.profiling_enabled, cfg.profiling_sample_rate
+        value = os.getenv(PROFILE_ENV, "").strip()
+        if value:
+            try:
+                rate = float(value)
+            except ValueError:
+                print(f"[profile] Ignoring {PROFILE_ENV}={value!r}: expected 0, 1 or a sample rate between 0 and 1.")
+            else:
+                enabled = rate > 0
+                if 0 < rate < 1:
+                    sample_rate = rate
+        return cls(enabled, sample_rate, str(cfg.profiling_dir), cfg.profiling_top_allocations,
+                   cfg.profiling_traceback_frames)
+
+    def wrap(self, chat: Callable[..., str], session_id: str, first_turn: int = 1) -> Callable[..., str]:
+        """
+        :param chat: A chatbot's bound `chat` method
+        :param session_id: The chatbot's session, naming the dump directory
+        :param first_turn: Number of the next turn, e.g. after the turns of a resumed session. Turns already
+            dumped for the session are never overwritten: numbering continues after the last one.
+        :return: `chat`, profiling the sampled turns
+        """
+        turns = itertools.count(max(first_turn, self._last_dumped_turn(session_id) + 1))
+
+        @functools.wraps(chat)
+        def profiled_chat(*args, **kwargs):
+            turn = next(turns)
+            with self._turns_lock:
+                self._in_flight += 1
+                self._started += 1
+            try:
+                if random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+                    return chat(*args, **kwargs)
+                try:
+                    return self._profile(chat, args, kwargs, session_id, turn)
+                finally:
+                    self._lock.release()
+            finally:
+                with self._turns_lock:
+                    self._in_flight -= 1
+
+        return profiled_chat
+
+    def _last_dumped_turn(self, session_id: str) -> int:
+        try:
+            names = os.listdir(os.path.join(self.output_dir, session_id))
+        except OSError:
+            return 0
+        return max((int(name[5:]) for name in names if name.startswith("turn_") and name[5:].isdigit()), default=0)
+
+    def _profile(self, chat: Callable[..., str], args: tuple, kwargs: dict, session_id: str, turn: int) -> str:
+        with self._turns_lock:
+            alone, started_before = self._in_flight == 1, self._started
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start(self.traceback_frames)
+        profiler = cProfile.Profile()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            return chat(*args, **kwargs)
+        finally:
+            profiler.disable()
+            wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            if was_tracing:
+                # Growth since the start of the turn
+                stats = snapshot.compare_to(before, "lineno")
+                retained = sum(stat.size_diff for stat in stats)
+            else:
+                # Only the turn's allocations were traced: what is left is what the turn kept alive
+                stats = snapshot.statistics("lineno")
+                retained = sum(stat.size for stat in stats)
+                tracemalloc.stop()
+            with self._turns_lock:
+                # No turn was running when this one started, and none started until it ended
+                alone = alone and self._started == started_before
+            try:
+                self._write(profiler, stats, session_id, turn, wall, cpu, peak, retained, alone)
+            except OSError as e:
+                print(f"[profile] Could not write the profile of turn {turn}: {e}")
+
+    def _write(self, profiler: cProfile.Profile, stats: list, session_id: str, turn: int, wall: float, cpu: float,
+               peak: int, retained: int, alone: bool) -> None:
+        directory = os.path.join(self.output_dir, session_id, f"turn_{turn:04d}")
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, "profile.prof"))
+        allocations = []
+        for stat in stats[:self.top_allocations] if alone else []:
+            frame = stat.traceback[0]
+            allocations.append({"site": f"{frame.filename}:{frame.lineno}",
+                                "size_kb": round(getattr(stat, "size_diff", stat.size) / 1024, 1),
+                                "count": getattr(stat, "count_diff", stat.count)})
+        summary = {"session_id": session_id, "turn": turn, "timestamp": time.time(), "wall_s": round(wall, 4),
+                   "concurrent_turns": not alone, "cpu_s": round(cpu, 4) if alone else None,
+                   "traced_peak_kb": round(peak / 1024, 1) if alone else None,
+                   "retained_kb": round(retained / 1024, 1) if alone else None, "max_rss_mb": _max_rss_mb(),
+                   "top_allocations": allocations}
+        with open(os.path.join(directory, "turn.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        usage = f"{cpu:.3f}s CPU, {peak / 1024:.0f} KB peak" if alone else "other turns running, no CPU/memory"
+        print(f"[profile] turn {turn} of session {session_id}: {wall:.3f}s wall, {usage} -> {directory}")
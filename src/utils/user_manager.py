@@ -1,6 +1,7 @@
 import math
 from typing import Optional,Dict,Any,Tuple
 from .sql_manager import SQLManager
+from .tool_registry import tool
 
 class UserManager:
     """Manages users related operations, including retrieving user information and user ID from the database"""
@@ -50,6 +51,7 @@ class UserManager:
         user = self.sql_manager.execute_query(query, fetch_one=True)
         return user[0] if user else None
 
+    @tool(timeout=10)
     def add_user_info_to_database(self, user_info: dict) -> Tuple[str, str]:
         """
         Update the user information in the database if valid keys are provided.
@@ -109,6 +111,8 @@ class UserManager:
                 """
 
             self.sql_manager.execute_query(query=query, params=params)
+            # Write-through: the profile shown in the system prompts is kept in memory
+            self.refresh_user_info()
             return "Function call Successful.", "User information updated"
         except Exception as e:
             print(f"Error : {e}")
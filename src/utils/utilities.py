@@ -1,8 +1,16 @@
-import tiktoken
-from pydantic import create_model
 import inspect
+from functools import lru_cache
 from inspect import Parameter
-from typing import Callable,Dict,Any
+from typing import Callable,Dict,Any,List
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """
+    Load the GPT-4o-mini tiktoken encoding once per process. tiktoken is imported lazily since it is slow to import.
+    :return: The tiktoken encoding
+    """
+    import tiktoken
+    return tiktoken.encoding_for_model("gpt-4o-mini")
 
 class Utilities:
     @staticmethod
@@ -12,10 +20,30 @@ class Utilities:
         :param text: The text to tokenize
         :return: The number of tokens in text
         """
-        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-        tokens = encoding.encode(text)
+        tokens = get_encoding().encode(text)
         return len(tokens)
 
+    @staticmethod
+    def split_by_tokens(text: str, chunk_tokens: int, overlap: int = 0) -> List[str]:
+        """
+        Split text into windows of at most `chunk_tokens` tokens (GPT-4o-mini encoding), consecutive windows
+        sharing `overlap` tokens. Raises ValueError unless 0 <= overlap < chunk_tokens.
+        :param text: The text to split
+        :param chunk_tokens: Maximum number of tokens per chunk
+        :param overlap: Number of tokens repeated at the start of the next chunk
+        :return: The chunks, [text] if it already fits
+        """
+        if not 0 <= overlap < chunk_tokens:
+            raise ValueError(f"overlap must be at least 0 and smaller than chunk_tokens, got overlap={overlap} "
+                             f"and chunk_tokens={chunk_tokens}")
+        encoding = get_encoding()
+        tokens = encoding.encode(text)
+        if len(tokens) <= chunk_tokens:
+            return [text]
+        step = chunk_tokens - overlap
+        return [encoding.decode(tokens[start:start + chunk_tokens])
+                for start in range(0, len(tokens) - overlap, step)]
+
     @staticmethod
     def count_number_of_character(text:str) -> int:
         """
@@ -34,8 +62,10 @@ class Utilities:
         Returns:
         Dict: A dictionary containing the function name, description, and parameters schema.
         """
+        from pydantic import create_model
+        # `self` is skipped so unbound methods (e.g. registered tools) give the same schema as bound ones
         kw = {n: (o.annotation, ... if o.default == Parameter.empty else o.default)
-              for n, o in inspect.signature(f).parameters.items()}
+              for n, o in inspect.signature(f).parameters.items() if n != "self"}
         s = create_model(f'Input for `{f.__name__}`', **kw).model_json_schema()
 
         json_format = dict(
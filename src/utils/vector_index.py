@@ -0,0 +1,81 @@
+import os
+from typing import Any, Dict
+
+# Name of the pointer file, in vectordb_dir, naming the collection currently serving `collection_name`
+ACTIVE_SUFFIX = "active"
+# Collections already reported as built with other parameters (each process may open them several times)
+_reported = set()
+
+
+def collection_metadata(cfg: Any) -> Dict[str, Any]:
+    """
+    Metadata of a new Chroma collection: cosine distance and the HNSW parameters of `vectordb_config.hnsw`.
+    construction_ef and M are fixed once the collection exists (`src/rebuild_vectordb.py` changes them),
+    search_ef can be changed at any time (see `sync_search_ef`).
+    :param cfg: LoadConfig instance
+    :return: The collection metadata
+    """
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:construction_ef": cfg.hnsw_construction_ef,
+        "hnsw:M": cfg.hnsw_m,
+        "hnsw:search_ef": cfg.hnsw_search_ef,
+    }
+
+
+def _pointer_path(cfg: Any) -> str:
+    return os.path.join(str(cfg.vectordb_dir), f"{cfg.collection_name}.{cfg.vector_storage}.{ACTIVE_SUFFIX}")
+
+
+def active_collection_name(cfg: Any) -> str:
+    """
+    :param cfg: LoadConfig instance
+    :return: The collection (Chroma) or store directory prefix (quantized) serving `collection_name`: the one
+        the last rebuild swapped in, or `collection_name` itself
+    """
+    path = _pointer_path(cfg)
+    if os.path.exists(path):
+        with open(path) as f:
+            name = f.read().strip()
+        if name:
+            return name
+    return cfg.collection_name
+
+
+def set_active_collection(cfg: Any, name: str) -> None:
+    """
+    Point `collection_name` at another collection. The pointer file is replaced atomically, so readers see either
+    the old or the new name; chatbots switch at their next search or ingestion.
+    :param cfg: LoadConfig instance
+    :param name: The new collection
+    :return: None
+    """
+    path = _pointer_path(cfg)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def sync_search_ef(collection: Any, cfg: Any) -> None:
+    """
+    Apply `hnsw.search_ef` to an existing Chroma collection, and warn if it was built with other construction_ef
+    or M than configured.
+    :param collection: A Chroma collection
+    :param cfg: LoadConfig instance
+    :return: None
+    """
+    hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    if not hnsw:
+        return
+    if hnsw.get("ef_search") != cfg.hnsw_search_ef:
+        collection.modify(configuration={"hnsw": {"ef_search": cfg.hnsw_search_ef}})
+    if (hnsw.get("ef_construction"), hnsw.get("max_neighbors")) != (cfg.hnsw_construction_ef, cfg.hnsw_m) \
+            and collection.name not in _reported:
+        _reported.add(collection.name)
+        print(f"Collection {collection.name} was built with construction_ef={hnsw.get('ef_construction')} and "
+              f"M={hnsw.get('max_neighbors')}; run `python src/rebuild_vectordb.py` to apply the configured "
+              f"{cfg.hnsw_construction_ef} and {cfg.hnsw_m}.")
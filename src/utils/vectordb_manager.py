@@ -1,69 +1,227 @@
 import os
-import chromadb
+import threading
+import time
 import uuid
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from mistralai import Mistral
-from chromadb.utils import embedding_functions
 from .load_config import LoadConfig
+from .llm_cache import LLMCache
 from .prepare_system_prompt import prepare_system_prompt_for_rag_chatbot
+from .tool_registry import tool
+from .turn_deadline import current_deadline
+from .utilities import Utilities
 
 load_dotenv()
 
 class VectorDBManager:
-  def __init__(self, config: LoadConfig):
+  def __init__(self, config: LoadConfig, client: Optional[Any] = None, llm_cache: Optional[LLMCache] = None):
     """
     Initializes the VectorDBManager
 
     :params config: LoadConfig instance for configuration
+    :params client: The model client used for RAG summaries. Defaults to the shared registry client.
+    :params llm_cache: Cache for RAG summaries. Defaults to the shared registry cache.
 
     """
+    # chromadb is slow to import, so it is only loaded once a vector store is actually needed
+    from .local_embedding import get_embedding_function
+
     self.cfg = config
-    self.embedding_functions = embedding_functions.MistralEmbeddingFunction(
-      model=self.cfg.embedding_model
-    )
-    self.db_client = chromadb.PersistentClient(path=str(self.cfg.vectordb_dir))
-    self.db_collection = self.db_client.get_or_create_collection(
-      name=self.cfg.collection_name,
-      embedding_function=self.embedding_functions,  # type: ignore
-      metadata={"hnsw:space": "cosine"}
-    )
-    self.client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+    self.embedding_functions = get_embedding_function(self.cfg)
+    self.db_client = None
+    self._open_lock = threading.Lock()
+    self._open_collection()
+    if client is None or llm_cache is None:
+      from .resource_registry import get_registry
+      client = client or get_registry().model_client
+      llm_cache = llm_cache or get_registry().llm_cache
+    self.client = client
+    self.llm_cache = llm_cache
     self.system_prompt = prepare_system_prompt_for_rag_chatbot()
+    self.ingest_stats = {"added": 0, "merged": 0}
+    self._stats_lock = threading.Lock()
+    self._user_locks: Dict[str, threading.Lock] = {}
 
 
-  def update_vector_db(self, msg_pairs: dict) -> None:
+  def update_vector_db(self, msg_pairs: dict, user_id: Optional[Any] = None) -> None:
     """
     Update the vectordb with new message pairs 
 
+    Long pairs are split into overlapping chunks of `chunk_tokens` tokens, embedded in a single request.
+    Every chunk records its pair in the metadata, so search results can be grouped back by pair.
+
+    A pair that fits in one chunk is first compared with the user's nearest stored pairs: if one is at least
+    `dedup_similarity` similar (repeated greetings, retries), the new pair is merged into it (its `count` and
+    `last_seen` metadata are updated) instead of being added.
+
     :params msg_pairs: A dictionary containing message pair to be added to  the database
+    :params user_id: The user the pair belongs to, stored in the metadata and used to find duplicates
 
     :return : None
     """
+    self._reopen_if_swapped()
+    pair_id = str(uuid.uuid4())
+    document = str(msg_pairs)
+    chunks = Utilities.split_by_tokens(document, self.cfg.chunk_tokens, self.cfg.chunk_overlap) \
+      if self.cfg.chunk_tokens else [document]
+    now = time.time()
+    metadata = {"chunks": len(chunks), "count": 1, "first_seen": now, "last_seen": now}
+    if user_id is not None:
+      metadata["user_id"] = str(user_id)
+    if len(chunks) == 1 and self.cfg.dedup_similarity > 0 and user_id is not None:
+      # Embedded once, for the duplicate lookup and, if it is new, for the insert
+      embeddings = self.embedding_functions(chunks)
+      # The lookup and the insert are atomic per user, so concurrent sessions of a user can't both add a pair
+      with self._user_lock(str(user_id)):
+        if self._merge_duplicate(embeddings, str(user_id), now):
+          return None
+        self._add(pair_id, chunks, metadata, embeddings)
+    else:
+      self._add(pair_id, chunks, metadata)
+    self._count("added")
+    print(f"Vectordb updated ({len(chunks)} chunk(s)).")
+    return None
+
+  def _add(self, pair_id: str, chunks: List[str], metadata: Dict[str, Any], embeddings: Any = None) -> None:
     self.db_collection.add(
-      ids=str(uuid.uuid4()),
-      documents=[str(msg_pairs)]
+      ids=[pair_id] if len(chunks) == 1 else [f"{pair_id}-{i}" for i in range(len(chunks))],
+      documents=chunks,
+      embeddings=embeddings,
+      metadatas=[{"pair_id": pair_id, "chunk": i, **metadata} for i in range(len(chunks))]
     )
-    print("Vectordb updated.")
-    return None
+
+  def _merge_duplicate(self, embeddings: Any, user_id: str, now: float) -> bool:
+    """
+    Merge a new single-chunk pair into the user's most similar stored pair, if it is similar enough.
+
+    :params embeddings: The embedding of the new pair
+    :params user_id: The user whose pairs are compared
+    :params now: Time of the new pair
+
+    :return : True if the pair was merged, False if it has to be added
+    """
+    results = self.db_collection.query(
+      query_embeddings=embeddings,
+      n_results=self.cfg.dedup_candidates,
+      where={"$and": [{"user_id": user_id}, {"chunks": 1}]},
+      include=["metadatas", "distances"]
+    )
+    if not results["ids"] or not results["ids"][0]:
+      return False
+    # Distances are cosine distances, best first
+    similarity = 1.0 - results["distances"][0][0]
+    if similarity < self.cfg.dedup_similarity:
+      return False
+    metadata = dict(results["metadatas"][0][0] or {})
+    metadata["count"] = metadata.get("count", 1) + 1
+    metadata["last_seen"] = now
+    self.db_collection.update(ids=[results["ids"][0][0]], metadatas=[metadata])
+    self._count("merged")
+    print(f"Vectordb: near-duplicate pair merged (similarity {similarity:.3f}, seen {metadata['count']} times, "
+          f"dedup ratio {self.dedup_ratio():.1%}).")
+    return True
+
+  def _user_lock(self, user_id: str) -> threading.Lock:
+    with self._stats_lock:
+      return self._user_locks.setdefault(user_id, threading.Lock())
+
+  def _count(self, outcome: str) -> None:
+    with self._stats_lock:
+      self.ingest_stats[outcome] += 1
+
+  def dedup_ratio(self) -> float:
+    """
+    :return : Fraction of the pairs ingested by this process that were merged into a stored pair
+    """
+    with self._stats_lock:
+      total = self.ingest_stats["added"] + self.ingest_stats["merged"]
+      return self.ingest_stats["merged"] / total if total else 0.0
+
+  def collapse_chunks(self, results: Dict[str, Any], k: int) -> List[Tuple[str, Optional[float]]]:
+    """
+    Group chunk hits by their pair: the `k` best pairs are kept, each with its `max_chunks_per_pair` best chunks
+    put back in conversation order. Documents without chunk metadata are pairs of their own.
+
+    :params results: A Chroma query result for one query (documents, metadatas and distances)
+    :params k: Number of pairs to return
+
+    :return : One (document, distance of its best chunk) per pair, best pair first
+    """
+    documents = results["documents"][0]
+    metadatas = (results.get("metadatas") or [[None] * len(documents)])[0]
+    distances = (results.get("distances") or [[None] * len(documents)])[0]
+    pairs: Dict[str, List[Tuple[int, str]]] = {}
+    best_distance: Dict[str, Optional[float]] = {}
+    for i, (document, metadata) in enumerate(zip(documents, metadatas)):
+      # Results are sorted by distance, so the first hit of a pair is its best chunk
+      pair_id = metadata.get("pair_id", results["ids"][0][i]) if metadata else results["ids"][0][i]
+      hits = pairs.get(pair_id)
+      if hits is None:
+        if len(pairs) == k:
+          continue
+        hits = pairs[pair_id] = []
+        best_distance[pair_id] = distances[i]
+      if len(hits) < self.cfg.max_chunks_per_pair:
+        hits.append((metadata.get("chunk", 0) if metadata else 0, document))
+    return [(" ... ".join(document for _, document in sorted(hits)), best_distance[pair_id])
+            for pair_id, hits in pairs.items()]
+
+  def format_records(self, hits: List[Tuple[str, Optional[float]]]) -> str:
+    """
+    Render search hits as compact records for the agent: duplicates (same text up to case and spacing) are
+    dropped and each record is trimmed to `record_characters` on a word boundary.
+
+    :params hits: (document, distance) pairs, best first
+
+    :return : One `[n] (distance d) document` line per record
+    """
+    seen = set()
+    lines = []
+    for document, distance in hits:
+      key = " ".join(document.lower().split())
+      if key in seen:
+        continue
+      seen.add(key)
+      text = " ".join(document.split())
+      if len(text) > self.cfg.record_characters:
+        cut = text.rfind(" ", 0, self.cfg.record_characters)
+        text = text[:cut if cut > 0 else self.cfg.record_characters] + "..."
+      label = f"(distance {distance:.2f}) " if distance is not None else ""
+      lines.append(f"[{len(lines) + 1}] {label}{text}")
+    return "\n".join(lines)
   
+  @tool(timeout=30)
   def search_vector_db(self, query: str) -> Tuple[str, str]:
     """
     Search the vectorDB containing the chat history of user and chatbot and return the result
 
     :params query: The query to be used for search
 
-    :return : The result generated by language model based on the search results.
+    :return : The matching records from past conversations, or a summary of them when they are long.
 
     """
     try:
       print("Performing vector search...")
+      self._reopen_if_swapped()
+      # Fetch extra hits since several chunks can belong to the same pair
       results = self.db_collection.query(
         query_texts=[query],
-        n_results=self.cfg.k
+        n_results=self.cfg.k * self.cfg.max_chunks_per_pair
       )
-      if results and "documents" in results and results["documents"]:
-        documents = results["documents"][0]
+      if results and "documents" in results and results["documents"] and results["documents"][0]:
+        hits = self.collapse_chunks(results, self.cfg.k)
+        documents = [document for document, _ in hits]
+        if self.cfg.retrieval_mode == "direct":
+          # Compact records go straight to the agent; only results too long for its prompt are summarized
+          records = self.format_records(hits)
+          if Utilities.count_number_of_tokens(records) <= self.cfg.direct_max_tokens:
+            print(f"Vector Search Completed ({len(records.splitlines())} record(s) returned directly).")
+            return "Function call successful.", records
+        turn = current_deadline()
+        if turn is not None and turn.should_shed("rag_summary"):
+          # No time left for the RAG model: hand the raw matches to the chat model instead
+          print("Vector Search Completed (RAG summary shed).")
+          return "Function call successful.", "\n".join(documents)
         llm_result = self.prepare_search_result(documents, query)
         print("Vector Search Completed.")
         print(f"Query: {query}")
@@ -89,26 +247,62 @@ class VectorDBManager:
     ## Query: \n
     {query}
     """
-    response = self.client.chat.complete(
-      model=self.cfg.rag_model,
-      messages=[
-        {"role": "system", "content": self.system_prompt},
-        {"role": "user", "content": input}
-      ]
-    )
+    messages = [
+      {"role": "system", "content": self.system_prompt},
+      {"role": "user", "content": input}
+    ]
+    # Deterministic (temperature 0) so the same documents and query are answered from the cache
+    response = self.llm_cache.complete(self.client, self.cfg.rag_model, messages, temperature=0.0)
     content = response.choices[0].message.content
     return str(content) if content else ""
 
-  def refresh_vector_db_client(self):
+  def _open_collection(self) -> None:
     """
-    Refresh the vector database client connection.
+    Open the conversation collection: a Chroma collection, or the quantized memory-mapped store
+    when `vectordb_config.storage` is "quantized". After a rebuild, the collection swapped in by
+    `src/rebuild_vectordb.py` is opened instead of `collection_name`.
     """
+    from .vector_index import active_collection_name, collection_metadata, sync_search_ef
+
+    name = active_collection_name(self.cfg)
+    if self.cfg.vector_storage == "quantized":
+      from .quantized_vector_store import QuantizedVectorStore
+      self.db_collection = QuantizedVectorStore(
+        path=os.path.join(str(self.cfg.vectordb_dir), f"{name}_{self.cfg.quantization}"),
+        embedding_function=self.embedding_functions,
+        quantization=self.cfg.quantization,
+        rerank_factor=self.cfg.rerank_factor
+      )
+      self.active_collection = name
+      return
+    import chromadb
     self.db_client = chromadb.PersistentClient(
       path=str(self.cfg.vectordb_dir)
     )
     self.db_collection = self.db_client.get_or_create_collection(
-      name=self.cfg.collection_name,
+      name=name,
       embedding_function=self.embedding_functions,  # type: ignore
-      metadata={"hnsw:space": "cosine"}
+      metadata=collection_metadata(self.cfg)
     )
+    sync_search_ef(self.db_collection, self.cfg)
+    self.active_collection = name
 
+  def refresh_vector_db_client(self):
+    """
+    Refresh the vector database client connection.
+
+    The manager is shared by every chatbot of the process and sees its own writes, so the client is only
+    reopened when a rebuild swapped another collection in; other threads may be querying it meanwhile.
+    """
+    self._reopen_if_swapped()
+
+  def _reopen_if_swapped(self) -> None:
+    """
+    Open the active collection if a rebuild swapped another one in since it was opened (one small file read).
+    Searches running meanwhile finish on the collection they started with.
+    """
+    from .vector_index import active_collection_name
+    if active_collection_name(self.cfg) != self.active_collection:
+      with self._open_lock:
+        if active_collection_name(self.cfg) != self.active_collection:
+          self._open_collection()
@@ -0,0 +1,315 @@
+import itertools
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from importlib import import_module
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class WorkerError(RuntimeError):
+    """Raised for a turn that failed in a worker, or that was lost because its worker died or hung."""
+
+
+def _worker_main(conn: Any, worker_id: int, threads: int, max_sessions: int,
+                 initializer: Optional[Callable], initargs: tuple) -> None:
+    """
+    Worker process loop: keeps one chatbot per session and runs their turns on a thread pool, so the turns of
+    different sessions overlap while they wait on the model. Health pings are answered by this loop directly.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    sessions: "OrderedDict[tuple, Any]" = OrderedDict()
+    # Turns running or waiting on each session; a busy chatbot is never dropped, or the session's next turn would
+    # resume a second chatbot from the saved state while the first one is still answering
+    busy: Dict[tuple, int] = {}
+    closed = set()
+    sessions_lock = threading.Lock()
+    send_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"worker{worker_id}")
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def evict() -> None:
+        # Least recently used idle sessions are dropped; their state stays in SQLite and the vector store
+        for key in [key for key in sessions if not busy.get(key)][:max(0, len(sessions) - max_sessions)]:
+            del sessions[key]
+
+    def session_entry(session_key: tuple) -> Dict[str, Any]:
+        with sessions_lock:
+            closed.discard(session_key)
+            entry = sessions.get(session_key)
+            if entry is None:
+                # The chatbot is created by the session's first turn, under the session lock only
+                entry = sessions[session_key] = {"chatbot": None, "lock": threading.Lock()}
+            sessions.move_to_end(session_key)
+            busy[session_key] = busy.get(session_key, 0) + 1
+            evict()
+            return entry
+
+    def release(session_key: tuple) -> None:
+        with sessions_lock:
+            busy[session_key] -= 1
+            if busy[session_key]:
+                return
+            del busy[session_key]
+            if session_key in closed:
+                closed.discard(session_key)
+                sessions.pop(session_key, None)
+            evict()
+
+    def run_turn(request_id: int, session_key: tuple, bot: Tuple[str, str], message: str) -> None:
+        started = time.perf_counter()
+        entry = session_entry(session_key)
+        try:
+            # Turns of one session run in order, on the same chatbot and its in-memory history
+            with entry["lock"]:
+                if entry["chatbot"] is None:
+                    module_name, class_name = bot
+                    # One chat session per UI session and chatbot version, resumed from its saved state if it has one
+                    session_id = f"{session_key[0]}:{module_name.rsplit('.', 1)[-1]}"
+                    entry["chatbot"] = getattr(import_module(module_name), class_name)(session_id=session_id)
+                response = entry["chatbot"].chat(message)
+            send(("result", request_id, response, None, time.perf_counter() - started))
+        except Exception as e:
+            send(("result", request_id, None, f"{type(e).__name__}: {e}", time.perf_counter() - started))
+        finally:
+            release(session_key)
+
+    try:
+        while True:
+            request = conn.recv()
+            kind = request[0]
+            if kind == "chat":
+                executor.submit(run_turn, *request[1:])
+            elif kind == "ping":
+                with sessions_lock:
+                    active = len(sessions)
+                send(("pong", request[1], active))
+            elif kind == "close":
+                with sessions_lock:
+                    if busy.get(request[1]):
+                        # Dropped when its last turn finishes
+                        closed.add(request[1])
+                    else:
+                        sessions.pop(request[1], None)
+            elif kind == "stop":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Worker:
+    """Parent-side handle of one worker process: its pipe, pending turns and receiver thread."""
+
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn: Any = None
+        self.pending: Dict[int, Future] = {}
+        self.lock = threading.Lock()
+        self.last_pong = time.monotonic()
+        self.active_sessions = 0
+        self.restarts = 0
+
+
+class WorkerPool:
+    """
+    Serves chat turns from a pool of worker processes, so orchestration, tokenization, prompt building and local
+    retrieval of different sessions run on different cores instead of sharing one GIL.
+
+    Every session is routed to the same worker (crc32 of the session id), so its chatbot and in-memory history
+    stay in one process. A monitor thread pings the workers: a worker that died or stopped answering is
+    restarted, and the turns it was running fail with WorkerError. Sessions of a restarted worker (or dropped
+    from a full one) are resumed from the session state saved after their last turn.
+    """
+
+    def __init__(self, num_workers: int, threads_per_worker: int = 8, max_sessions_per_worker: int = 256,
+                 health_interval: float = 5.0, health_timeout: float = 30.0, turn_timeout: Optional[float] = None,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        """
+        Initializes the WorkerPool and starts the workers
+
+        :param num_workers: Number of worker processes
+        :param threads_per_worker: Turns a worker runs concurrently (they mostly wait on the model)
+        :param max_sessions_per_worker: Chatbots a worker keeps before dropping the least recently used
+        :param health_interval: Seconds between health pings
+        :param health_timeout: Seconds without a pong after which a worker is considered hung and restarted
+        :param turn_timeout: Seconds `chat` waits for a turn, None to wait as long as the worker is healthy
+        :param initializer: Picklable function run at worker start-up (e.g. installing a fake model client)
+        :param initargs: Arguments of the initializer
+        """
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.max_sessions_per_worker = max_sessions_per_worker
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.turn_timeout = turn_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self._context = multiprocessing.get_context("spawn")
+        self._ids = itertools.count()
+        self._closed = threading.Event()
+        self.workers = [_Worker(i) for i in range(num_workers)]
+        for worker in self.workers:
+            self._start(worker)
+        self._monitor = threading.Thread(target=self._monitor_loop, name="worker-monitor", daemon=True)
+        self._monitor.start()
+
+    @classmethod
+    def from_config(cls, cfg: Any, num_workers: Optional[int] = None, initializer: Optional[Callable] = None,
+                    initargs: tuple = ()) -> "WorkerPool":
+        return cls(num_workers or cfg.serving_workers, cfg.serving_threads_per_worker,
+                   cfg.serving_max_sessions_per_worker, cfg.serving_health_interval, cfg.serving_health_timeout,
+                   cfg.serving_turn_timeout or None, initializer=initializer, initargs=initargs)
+
+    def _start(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f"chat-worker-{worker.worker_id}", daemon=True,
+            args=(child_conn, worker.worker_id, self.threads_per_worker, self.max_sessions_per_worker,
+                  self.initializer, self.initargs))
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+        worker.last_pong = time.monotonic()
+        threading.Thread(target=self._receive_loop, args=(worker, parent_conn), daemon=True,
+                         name=f"worker-{worker.worker_id}-receiver").start()
+
+    def _receive_loop(self, worker: _Worker, conn: Any) -> None:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == "pong":
+                worker.last_pong = time.monotonic()
+                worker.active_sessions = message[2]
+                continue
+            _, request_id, response, error, _ = message
+            with worker.lock:
+                future = worker.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error is None:
+                future.set_result(response)
+            else:
+                future.set_exception(WorkerError(error))
+
+    def _restart(self, worker: _Worker, reason: str) -> None:
+        print(f"[workers] restarting worker {worker.worker_id}: {reason}")
+        with worker.lock:
+            pending, worker.pending = worker.pending, {}
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join(timeout=5)
+            worker.conn.close()
+            self._start(worker)
+            worker.restarts += 1
+        for future in pending.values():
+            future.set_exception(WorkerError(f"Worker {worker.worker_id} restarted ({reason})."))
+
+    def _monitor_loop(self) -> None:
+        while not self._closed.wait(self.health_interval):
+            for worker in self.workers:
+                if not worker.process.is_alive():
+                    self._restart(worker, f"exited with code {worker.process.exitcode}")
+                elif time.monotonic() - worker.last_pong > self.health_timeout:
+                    self._restart(worker, f"no answer to health checks for {self.health_timeout}s")
+                else:
+                    try:
+                        with worker.lock:
+                            worker.conn.send(("ping", next(self._ids)))
+                    except (OSError, ValueError):
+                        pass
+
+    def worker_for(self, session_id: str) -> int:
+        """
+        :param session_id: The session (e.g. Gradio's session hash)
+        :return: The index of the worker serving the session, stable across calls and restarts
+        """
+        return zlib.crc32(session_id.encode("utf-8")) % self.num_workers
+
+    def _send_turn(self, session_id: str, bot: Tuple[str, str], message: str) -> Tuple[_Worker, int, Future]:
+        worker = self.workers[self.worker_for(session_id)]
+        request_id = next(self._ids)
+        future: Future = Future()
+        with worker.lock:
+            worker.pending[request_id] = future
+            try:
+                worker.conn.send(("chat", request_id, (session_id, bot), bot, message))
+            except (OSError, ValueError) as e:
+                # Pipe broken or closed: the worker died and the monitor restarts it
+                worker.pending.pop(request_id, None)
+                raise WorkerError(f"Worker {worker.worker_id} is unreachable ({type(e).__name__}: {e}).") from e
+        return worker, request_id, future
+
+    def submit(self, session_id: str, bot: Tuple[str, str], message: str) -> Future:
+        """
+        Send a turn to the session's worker.
+        :param session_id: The session id
+        :param bot: (module, class) of the chatbot version, e.g. ("utils.chatbot_agentic_v3", "ChatBot")
+        :param message: The user message
+        :return: A future resolving to the chatbot's response
+        :raise WorkerError: If the worker can't be reached
+        """
+        return self._send_turn(session_id, bot, message)[2]
+
+    def chat(self, session_id: str, bot: Tuple[str, str], message: str) -> str:
+        """
+        Run a turn on the session's worker and wait for the response.
+        :raise WorkerError: If the turn failed, timed out or its worker died
+        """
+        worker, request_id, future = self._send_turn(session_id, bot, message)
+        try:
+            return future.result(timeout=self.turn_timeout)
+        except FutureTimeoutError:
+            # The late answer, if any, is dropped by the receiver
+            with worker.lock:
+                worker.pending.pop(request_id, None)
+            raise WorkerError(f"No answer from the worker after {self.turn_timeout}s.")
+
+    def close_session(self, session_id: str, bot: Tuple[str, str]) -> None:
+        """
+        Drop the session's chatbot from its worker (after its running turns), e.g. when the browser tab is closed.
+        Its state stays saved, so a later turn resumes it.
+        :param session_id: The session id
+        :param bot: (module, class) of the chatbot version
+        :return: None
+        """
+        worker = self.workers[self.worker_for(session_id)]
+        try:
+            with worker.lock:
+                worker.conn.send(("close", (session_id, bot)))
+        except (OSError, ValueError):
+            # The worker is being restarted, which drops its sessions anyway
+            pass
+
+    def get_stats(self) -> list:
+        """
+        :return: Per worker: pid, alive, pending turns, sessions (as of the last health check) and restarts
+        """
+        return [{"worker": w.worker_id, "pid": w.process.pid, "alive": w.process.is_alive(),
+                 "pending": len(w.pending), "sessions": w.active_sessions, "restarts": w.restarts}
+                for w in self.workers]
+
+    def close(self) -> None:
+        """Stop the workers."""
+        self._closed.set()
+        for worker in self.workers:
+            try:
+                with worker.lock:
+                    worker.conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.conn.close()
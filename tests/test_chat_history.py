@@ -0,0 +1,125 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils import utilities  # noqa: E402
+from utils.chat_history import ChatHistory, ChatMessage  # noqa: E402
+from utils.chat_history_manager import ChatHistoryManager  # noqa: E402
+from utils.db_schema import create_tables  # noqa: E402
+from utils.sql_manager import SQLManager  # noqa: E402
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def expected_tokens(history: ChatHistory) -> int:
+    """The total recomputed from scratch, with the separators counted like ChatHistory.token_count."""
+    return sum(count_words(m.rendered) for m in history) + len(history) + 1
+
+
+def fill(history: ChatHistory, pairs: int) -> None:
+    for i in range(pairs):
+        history.append("user", f"question number {i} " + "word " * i)
+        history.append("assistant", f"answer {i}")
+
+
+def test_running_total_after_clear_and_extend():
+    history = ChatHistory(6, count_words)
+    fill(history, 3)
+    assert history.token_count() == expected_tokens(history)
+    kept = list(history)[-2:]
+    # What summarize_chat_history does: the kept messages already carry their token count
+    history.clear()
+    history.append("user", "summary of the older pairs")
+    history.append("assistant", "ok")
+    history.extend(kept)
+    assert history.token_count() == expected_tokens(history)
+    assert str(history) == "[" + ", ".join(m.rendered for m in history) + "]"
+
+
+def test_running_total_after_evictions():
+    history = ChatHistory(4, count_words)
+    for i in range(10):
+        history.append("user", "word " * i)
+        assert history.token_count() == expected_tokens(history)
+    assert len(history) == 4
+    assert [m.content for m in history] == ["word " * i for i in range(6, 10)]
+
+
+def test_max_messages_setter_keeps_the_newest_messages():
+    history = ChatHistory(None, count_words)
+    fill(history, 4)
+    history.token_count()
+    history.max_messages = 3
+    assert [m.content for m in history] == ["answer 2", "question number 3 word word word ", "answer 3"]
+    assert history.token_count() == expected_tokens(history)
+    history.max_messages = 6
+    fill(history, 3)
+    assert len(history) == 6
+    assert history.token_count() == expected_tokens(history)
+    history.max_messages = 0
+    history.append("user", "dropped")
+    assert len(history) == 0 and history.token_count() == 1
+
+
+def test_message_content_round_trip():
+    message = ChatMessage("user", "it's \"quoted\"\nand multi-line")
+    assert message.content == "it's \"quoted\"\nand multi-line"
+    restored = ChatMessage.from_rendered("user", message.rendered, 7)
+    assert restored.content == message.content and restored.as_dict() == {"user": message.content}
+    assert restored.token_count == 7
+
+
+def test_summarize_chat_history_keeps_the_total_consistent():
+    summary = json.dumps([{"user": "I told you about my trip", "assistant": "Lisbon, noted"}])
+    client = SimpleNamespace(chat=SimpleNamespace(complete=lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=summary))])))
+    manager = ChatHistoryManager(None, "", "session", client, "model", max_tokens=10 ** 6, new_session=True)
+    manager.chat_history = ChatHistory(8, count_words)
+    fill(manager.chat_history, 4)
+    manager.chat_history.token_count()
+    manager.summarize_chat_history()
+    assert len(manager.chat_history) == 4
+    assert manager.chat_history.token_count() == expected_tokens(manager.chat_history)
+
+
+def test_cached_reads_match_sql_across_more_turns_than_the_cache_holds(tmp_path, monkeypatch):
+    monkeypatch.setattr(utilities, "get_encoding", lambda: SimpleNamespace(encode=str.split))
+    sql_manager = SQLManager(str(tmp_path / "chatbot.db"))
+    with sql_manager.pool.connection() as conn:
+        create_tables(conn)
+    sql_manager.execute_query("INSERT INTO user_info (id, name, last_name, occupation, location) "
+                              "VALUES (1, 'Ada', 'Lovelace', 'Engineer', 'London');")
+    cached = ChatHistoryManager(sql_manager, 1, "session", None, "model", max_tokens=10 ** 6, cache_pairs=3,
+                                new_session=True)
+
+    for turn in range(1, 8):
+        cached.add_to_history(f"question {turn}", f"answer {turn}", max_history_pairs=10)
+        if turn == 5:
+            cached.save_summary_to_db("summary after 5 turns")
+        # A manager without a cache reads everything from SQLite
+        uncached = ChatHistoryManager(sql_manager, 1, "session", None, "model", max_tokens=10 ** 6, cache_pairs=3)
+        for num_pairs in range(0, 5):
+            uncached.invalidate()
+            assert cached.get_latest_chat_pairs(num_pairs) == uncached.get_latest_chat_pairs(num_pairs), \
+                (turn, num_pairs)
+        assert cached.get_latest_summary() == uncached.get_latest_summary()
+
+        # 5 pair windows and the summary. Until the 3 cached pairs overflow, the cache holds the whole session
+        # (`complete`) and answers every window. At turn 4 the windows of 2 and 3 pairs are read from SQLite,
+        # which refills the cache with 6 pairs of a session of 4: complete again, until turn 7 overflows it and
+        # only the window of 4 pairs (8 rows) misses
+        sql_reads = {4: 2, 7: 1}.get(turn, 0)
+        assert cached.pop_turn_reads() == {"cache_hits": 6 - sql_reads, "sql_reads": sql_reads}, turn
+        # After the widest window the cache holds the whole session again
+        assert cached._pairs_cache[2] and len(cached._pairs_cache[1]) == turn, turn
+
+    # A window the cache covers is still served from it after the overflow
+    cached.pop_turn_reads()
+    assert cached.get_latest_chat_pairs(1) == [("question 6", "answer 6"), ("question 7", "answer 7")]
+    assert cached.pop_turn_reads() == {"cache_hits": 1, "sql_reads": 0}
+
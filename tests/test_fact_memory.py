@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.db_schema import create_tables  # noqa: E402
+from utils.fact_memory import FactMemory  # noqa: E402
+from utils.sql_manager import SQLManager  # noqa: E402
+from utils.tool_registry import FUNCTION_CALL_FAILED, FUNCTION_CALL_SUCCESSFUL  # noqa: E402
+
+VOCABULARY = ["occupation", "engineer", "software", "food", "pizza", "sushi", "sister", "anna", "weather"]
+
+
+def fake_embedding(texts):
+    """Bag of words over a small vocabulary, so similarities are predictable."""
+    return [[float(text.lower().count(word)) for word in VOCABULARY] for text in texts]
+
+
+@pytest.fixture
+def memory(tmp_path):
+    manager = SQLManager(str(tmp_path / "chatbot.db"))
+    with manager.pool.connection() as conn:
+        create_tables(conn)
+    manager.execute_query("INSERT INTO user_info (id, name, last_name, occupation, location) "
+                          "VALUES (1, 'Ada', 'Lovelace', 'Engineer', 'London'), (2, 'Alan', 'Turing', '', '');")
+    memory = FactMemory(manager, fake_embedding, client=None, extraction_model="fake", k=2, min_similarity=0.3,
+                        dedup_similarity=0.92)
+    yield memory
+    memory.shutdown()
+
+
+def _facts(memory: FactMemory, user_id: int = 1) -> list:
+    return memory.sql_manager.execute_query(
+        "SELECT subject, attribute, value, source_id FROM facts WHERE user_id = ? ORDER BY id;", (user_id,),
+        fetch_all=True)
+
+
+def test_add_facts_merges_repeats_and_near_duplicates(memory):
+    assert memory.add_facts(1, [("user", "occupation", "engineer"), ("user", "favorite food", "pizza")], 1) == 2
+
+    added = memory.add_facts(1, [("user", "occupation", "engineer"),
+                                 # Embeds exactly like "engineer": merged into the stored wording
+                                 ("user", "occupation", "engineer."),
+                                 # Same attribute, different value
+                                 ("user", "favorite food", "sushi"),
+                                 # Same value of another subject
+                                 ("anna", "occupation", "engineer"),
+                                 # Repeated within the batch
+                                 ("user", "sister's name", "anna"), ("user", "sister's name", "anna")], 7)
+
+    assert added == 3
+    assert _facts(memory) == [("user", "occupation", "engineer", 7), ("user", "favorite food", "pizza", 1),
+                              ("user", "favorite food", "sushi", 7), ("anna", "occupation", "engineer", 7),
+                              ("user", "sister's name", "anna", 7)]
+    # Facts of another user are never merged with these
+    assert memory.add_facts(2, [("user", "occupation", "engineer")], 9) == 1
+    assert _facts(memory, 2) == [("user", "occupation", "engineer", 9)]
+
+
+def test_add_facts_keeps_distinct_values_below_the_dedup_similarity(memory):
+    memory.add_facts(1, [("user", "occupation", "engineer")])
+    # Cosine similarity 0.82 with "engineer"
+    assert memory.add_facts(1, [("user", "occupation", "software engineer")]) == 1
+    assert [row[2] for row in _facts(memory)] == ["engineer", "software engineer"]
+
+
+def test_search_ranks_the_users_facts_and_sees_new_ones(memory):
+    memory.add_facts(1, [("user", "occupation", "engineer"), ("user", "favorite food", "pizza"),
+                         ("user", "sister's name", "anna")])
+    memory.add_facts(2, [("user", "favorite food", "sushi")])
+
+    matches = memory.search(1, "favorite food pizza")
+    assert [text.split(" (")[0] for text, _ in matches] == ["user | favorite food: pizza"]
+    assert matches[0][1] == pytest.approx(1.0)
+    assert memory.search(1, "weather") == []
+
+    # The cached matrix is reloaded once facts are added
+    memory.add_facts(1, [("user", "favorite food", "sushi")])
+    texts = [text.split(" (")[0] for text, _ in memory.search(1, "food sushi")]
+    assert texts == ["user | favorite food: sushi", "user | favorite food: pizza"]
+
+
+def test_search_facts_tool(memory):
+    memory.add_facts(1, [("user", "sister's name", "anna")])
+
+    status, content = memory.for_user(1).search_facts("sister")
+    assert status == FUNCTION_CALL_SUCCESSFUL and content.startswith("user | sister's name: anna (")
+    assert memory.for_user(1).search_facts("weather") == (FUNCTION_CALL_FAILED, "No matching facts found.")
+    assert memory.for_user(2).search_facts("sister") == (FUNCTION_CALL_FAILED, "No matching facts found.")
+
+
+def test_stored_embeddings_are_normalized(memory):
+    memory.add_facts(1, [("user", "occupation", "software engineer")])
+    blob = memory.sql_manager.execute_query("SELECT embedding FROM facts;", fetch_one=True)[0]
+    assert np.linalg.norm(np.frombuffer(blob, dtype=np.float32)) == pytest.approx(1.0)
@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.local_embedding import LocalEmbeddingFunction  # noqa: E402
+
+
+def _char_ngrams(embedder: LocalEmbeddingFunction, text: str) -> int:
+    docs, _, _ = embedder._features([text])
+    return len(docs)
+
+
+def test_character_ngrams_span_adjacent_words():
+    # Character n-grams only, of length 3: one per position of " hello world " (13 bytes)
+    embedder = LocalEmbeddingFunction(char_ngrams=(3, 3), word_ngrams=(1, 0))
+    assert _char_ngrams(embedder, "Hello, world!") == 11
+
+
+def test_texts_of_a_batch_do_not_share_ngrams():
+    embedder = LocalEmbeddingFunction()
+    texts = ["I moved to Lisbon last spring", "my sister Anna is an engineer", "", "pizza"]
+    batch = embedder.embed(texts)
+    one_by_one = np.concatenate([embedder.embed([text]) for text in texts])
+    np.testing.assert_allclose(batch, one_by_one, atol=1e-6)
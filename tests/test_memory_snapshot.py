@@ -0,0 +1,103 @@
+import sqlite3
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.db_schema import MEMORY_TABLES, create_tables  # noqa: E402
+from utils.memory_snapshot import MemorySnapshot  # noqa: E402
+
+
+def _populate(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    create_tables(conn)
+    conn.execute("INSERT INTO user_info (id, name, last_name, occupation, location) "
+                 "VALUES (1, 'Ada', 'Lovelace', 'Engineer', 'London');")
+    conn.execute("INSERT INTO chat_history (id, user_id, question, answer, session_id) VALUES (1, 1, 'hi', 'hello', 's1');")
+    conn.execute("INSERT INTO summary (id, user_id, session_id, summary_text) VALUES (1, 1, 's1', 'greeting');")
+    conn.execute("INSERT INTO session_state (session_id, user_id, state) VALUES ('s2', 1, ?), ('s1', 1, ?);",
+                 (b"\x00second", b"\x00first"))
+    conn.commit()
+    conn.close()
+
+
+def _dump(db_path: Path) -> dict:
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY rowid;").fetchall() for table in MEMORY_TABLES}
+    finally:
+        conn.close()
+
+
+def test_export_restore_round_trip_with_session_state(tmp_path):
+    source, target, snapshot = tmp_path / "source.db", tmp_path / "target.db", tmp_path / "memory.snap"
+    _populate(source)
+
+    exported = MemorySnapshot(source).export(str(snapshot))
+    restored = MemorySnapshot(target).restore(str(snapshot))
+
+    assert exported["session_state"] == 2
+    assert restored["session_state"] == 2
+    assert _dump(target) == _dump(source)
+
+
+class FakeCollection:
+    """The part of a Chroma collection the snapshot uses."""
+
+    def __init__(self, records=None):
+        self.records = dict(records or {})
+
+    def get(self, include=(), limit=None, offset=0):
+        ids = sorted(self.records)[offset:offset + limit if limit else None]
+        return {"ids": ids,
+                "embeddings": [self.records[i][0] for i in ids],
+                "documents": [self.records[i][1] for i in ids],
+                "metadatas": [self.records[i][2] for i in ids]}
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        for index, record_id in enumerate(ids):
+            self.records[record_id] = ([float(v) for v in embeddings[index]], documents[index],
+                                       metadatas[index] if metadatas else None)
+
+    def delete(self, ids):
+        for record_id in ids:
+            del self.records[record_id]
+
+
+def test_restore_with_vectors(tmp_path):
+    source, target, snapshot = tmp_path / "source.db", tmp_path / "target.db", tmp_path / "memory.snap"
+    _populate(source)
+    vectors = FakeCollection({"a": ([0.5, 1.0], "pair a", {"user_id": "1"}), "b": ([1.0, 0.0], "pair b", None)})
+    MemorySnapshot(source, vectors).export(str(snapshot))
+
+    restored_vectors = FakeCollection({"stale": ([0.0, 0.0], "old pair", None)})
+    counts = MemorySnapshot(target, restored_vectors).restore(str(snapshot), replace=True)
+
+    assert counts["vectors"] == 2
+    assert restored_vectors.records == vectors.records
+    assert _dump(target) == _dump(source)
+
+
+def test_failed_restore_leaves_rows_and_vectors_untouched(tmp_path):
+    source, target, snapshot = tmp_path / "source.db", tmp_path / "target.db", tmp_path / "memory.snap"
+    _populate(source)
+    MemorySnapshot(source, FakeCollection({"a": ([0.5, 1.0], "pair a", None)})).export(str(snapshot))
+    # A snapshot cut short in its vector blocks
+    snapshot.write_bytes(snapshot.read_bytes()[:-20])
+    conn = sqlite3.connect(target)
+    create_tables(conn)
+    conn.execute("INSERT INTO user_info (id, name, last_name, occupation, location) "
+                 "VALUES (5, 'Grace', 'Hopper', 'Admiral', 'Arlington');")
+    conn.commit()
+    conn.close()
+    existing = FakeCollection({"kept": ([1.0, 1.0], "kept pair", None)})
+    before = _dump(target)
+
+    with pytest.raises(struct.error):
+        MemorySnapshot(target, existing).restore(str(snapshot), replace=True)
+
+    assert _dump(target) == before
+    assert list(existing.records) == ["kept"]
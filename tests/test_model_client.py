@@ -0,0 +1,129 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.model_client import (CircuitBreaker, CircuitOpenError, LocalTimeout,  # noqa: E402
+                                ResilientClient)
+
+
+class FakeFn:
+    """Model call raising the queued errors in turn, then answering "ok"."""
+
+    def __init__(self, *errors: BaseException, gate: threading.Event = None):
+        self.errors = list(errors)
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def _client(**kwargs) -> ResilientClient:
+    settings = dict(backoff_base=0.0, timeout=5.0, circuit_failure_threshold=100, circuit_reset_timeout=60.0)
+    settings.update(kwargs)
+    return ResilientClient(None, **settings)
+
+
+def test_half_open_circuit_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+
+    assert breaker.state == "half_open"
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError, match="probe is in flight"):
+        breaker.before_call()
+
+    # A failed probe reopens the circuit for another reset timeout
+    breaker.record_failure(probe=True)
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    breaker.record_success(probe)
+    assert breaker.state == "closed" and breaker.before_call() is False
+
+
+def test_concurrent_calls_are_rejected_while_the_probe_runs():
+    client = _client(max_retries=0, circuit_failure_threshold=1, circuit_reset_timeout=0.05)
+    with pytest.raises(ConnectionError):
+        client.call(FakeFn(ConnectionError("down")))
+    time.sleep(0.06)
+
+    gate = threading.Event()
+    probe_fn, results = FakeFn(gate=gate), []
+    probe = threading.Thread(target=lambda: results.append(client.call(probe_fn)))
+    probe.start()
+    while not probe_fn.calls:
+        time.sleep(0.001)
+    other_fn = FakeFn()
+    with pytest.raises(CircuitOpenError):
+        client.call(other_fn)
+    gate.set()
+    probe.join()
+
+    assert results == ["ok"] and other_fn.calls == 0
+    assert client.get_stats()["circuit_state"] == "closed"
+    assert client.call(other_fn) == "ok"
+
+
+def test_local_timeout_does_not_count_as_a_failure():
+    # One request per 1000s: the second call can't get a token before its timeout
+    client = _client(requests_per_second=0.001, burst=1, max_retries=3, circuit_failure_threshold=1)
+    assert client.call(FakeFn()) == "ok"
+
+    fn = FakeFn()
+    with pytest.raises(LocalTimeout):
+        client.call(fn, timeout_s=0.05)
+
+    assert fn.calls == 0
+    assert client.circuit_breaker.failures == 0
+    stats = client.get_stats()
+    assert stats["circuit_state"] == "closed" and stats["retries"] == 0 and stats["failures"] == 1
+
+
+def test_transient_errors_are_retried_up_to_the_cap():
+    client = _client(max_retries=2)
+    fn = FakeFn(*[ConnectionError("down")] * 5)
+    with pytest.raises(ConnectionError):
+        client.call(fn)
+
+    assert fn.calls == 3
+    stats = client.get_stats()
+    assert stats["retries"] == 2 and stats["failures"] == 1
+
+    # A call that recovers within the cap succeeds
+    fn = FakeFn(ConnectionError("down"), ConnectionError("down"))
+    assert client.call(fn) == "ok" and fn.calls == 3
+
+
+def test_non_transient_errors_are_not_retried():
+    client = _client(max_retries=3, circuit_failure_threshold=1)
+    fn = FakeFn(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        client.call(fn)
+
+    assert fn.calls == 1 and client.get_stats()["circuit_state"] == "closed"
+
+
+def test_retry_stops_when_the_circuit_opens():
+    client = _client(max_retries=3, circuit_failure_threshold=1)
+    fn = FakeFn(ConnectionError("down"))
+    # The first failure opens the circuit, so the retry is rejected before reaching the model
+    with pytest.raises(CircuitOpenError):
+        client.call(fn)
+
+    assert fn.calls == 1
+    stats = client.get_stats()
+    assert stats["circuit_state"] == "open" and stats["circuit_rejections"] == 1 and stats["retries"] == 1
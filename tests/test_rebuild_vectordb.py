@@ -0,0 +1,86 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import rebuild_vectordb  # noqa: E402
+from utils.quantized_vector_store import QuantizedVectorStore  # noqa: E402
+from utils.vector_index import active_collection_name  # noqa: E402
+
+
+def _cfg(tmp_path: Path) -> SimpleNamespace:
+    return SimpleNamespace(vector_storage="quantized", vectordb_dir=tmp_path, quantization="int8", rerank_factor=4,
+                           collection_name="chat")
+
+
+def _store(cfg: SimpleNamespace, name: str) -> QuantizedVectorStore:
+    return QuantizedVectorStore(os.path.join(str(cfg.vectordb_dir), f"{name}_{cfg.quantization}"))
+
+
+def _records(store: QuantizedVectorStore) -> dict:
+    batch = store.get(include=["documents", "metadatas"])
+    return {record_id: (document, metadata)
+            for record_id, document, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])}
+
+
+def _add(store: QuantizedVectorStore, record_id: str, count: int = 1) -> None:
+    store.add(ids=[record_id], embeddings=[[1.0, float(len(record_id)), 0.5]], documents=[f"doc {record_id}"],
+              metadatas=[{"count": count}])
+
+
+def test_catch_up_applies_additions_deletions_and_metadata_changes(tmp_path):
+    cfg = _cfg(tmp_path)
+    source, target = _store(cfg, "a"), _store(cfg, "b")
+    for record_id in ("1", "22", "333"):
+        _add(source, record_id)
+    rebuild_vectordb.copy_records(source, target, batch_size=2)
+
+    _add(source, "4444")
+    source.delete(ids=["1"])
+    source.update(ids=["22"], metadatas=[{"count": 3}])
+
+    assert rebuild_vectordb.catch_up(source, target, batch_size=2) == {"added": 1, "deleted": 1, "updated": 1}
+    assert _records(target) == _records(source)
+    assert rebuild_vectordb.catch_up(source, target, batch_size=2) == {"added": 0, "deleted": 0, "updated": 0}
+
+
+def test_rebuild_keeps_changes_made_during_the_copy_and_after_the_swap(tmp_path, monkeypatch):
+    cfg = _cfg(tmp_path)
+    old = _store(cfg, "chat")
+    for record_id in ("1", "22", "333"):
+        _add(old, record_id)
+    copy_records, set_active_collection = rebuild_vectordb.copy_records, rebuild_vectordb.set_active_collection
+
+    def copy_then_delete(source, target, batch_size, skip=None):
+        copied = copy_records(source, target, batch_size, skip)
+        # A record deleted while the copy ran: the rebuild must not abort on the record count
+        old.delete(ids=["1"])
+        return copied
+
+    def swap_then_write(cfg, name):
+        set_active_collection(cfg, name)
+        # A chatbot that hasn't switched yet ingests a new pair and merges a duplicate into the old collection
+        _add(old, "4444")
+        old.update(ids=["22"], metadatas=[{"count": 2}])
+
+    monkeypatch.setattr(rebuild_vectordb, "get_embedding_function", lambda cfg: None)
+    monkeypatch.setattr(rebuild_vectordb, "CATCH_UP_GRACE_SECONDS", 0)
+    monkeypatch.setattr(rebuild_vectordb, "copy_records", copy_then_delete)
+    monkeypatch.setattr(rebuild_vectordb, "set_active_collection", swap_then_write)
+    expected = None
+
+    def snapshot_before_drop(path, *args, **kwargs):
+        nonlocal expected
+        expected = _records(QuantizedVectorStore(path))
+
+    monkeypatch.setattr(rebuild_vectordb.shutil, "rmtree", snapshot_before_drop)
+    result = rebuild_vectordb.rebuild(cfg, new_name="chat-new", batch_size=2)
+
+    assert active_collection_name(cfg) == "chat-new"
+    assert result["old_dropped"] and result["records"] == 3
+    assert result["caught_up"] == {"added": 1, "deleted": 1, "updated": 1}
+    assert _records(_store(cfg, "chat-new")) == expected == {"22": ("doc 22", {"count": 2}),
+                                                             "333": ("doc 333", {"count": 1}),
+                                                             "4444": ("doc 4444", {"count": 1})}
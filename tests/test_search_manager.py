@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.db_schema import create_tables  # noqa: E402
+from utils.search_manager import SearchManager  # noqa: E402
+from utils.sql_manager import SQLManager  # noqa: E402
+from utils.text_codec import TextCodec  # noqa: E402
+from utils.utilities import Utilities  # noqa: E402
+
+PAD = " Some more words to make the text long enough to be compressed." * 6
+
+
+@pytest.fixture
+def sql_manager(tmp_path):
+    manager = SQLManager(str(tmp_path / "chatbot.db"))
+    with manager.pool.connection() as conn:
+        create_tables(conn)
+    manager.execute_query("INSERT INTO user_info (id, name, last_name, occupation, location) "
+                          "VALUES (1, 'Ada', 'Lovelace', 'Engineer', 'London');")
+    return manager
+
+
+def _save(manager: SQLManager, codec: TextCodec, question: str, answer: str, timestamp: str) -> None:
+    """Insert a pair the way ChatHistoryManager.save_to_db does with this codec."""
+    with manager.transaction() as cursor:
+        cursor.execute("INSERT INTO chat_history (user_id, question, answer, session_id, timestamp) "
+                       "VALUES (1, ?, ?, 's', ?);", (codec.encode(question), codec.encode(answer), timestamp))
+        if codec.enabled:
+            cursor.execute("INSERT INTO chat_history_fts (rowid, question, answer) VALUES (?, ?, ?);",
+                           (cursor.lastrowid, question, answer))
+
+
+def _mixed_history(manager: SQLManager) -> None:
+    plain, compressed = TextCodec(enabled=False), TextCodec(enabled=True, min_bytes=32)
+    # Written before compression was enabled, then after it, then after it was turned off again
+    _save(manager, plain, "I live in Lisbon." + PAD, "Nice city." + PAD, "2024-01-01 10:00:00")
+    _save(manager, compressed, "I work as a carpenter." + PAD, "Great job." + PAD, "2024-01-02 10:00:00")
+    _save(manager, plain, "My sister is Mei.", "Noted.", "2024-01-03 10:00:00")
+    types = manager.execute_query("SELECT typeof(question) FROM chat_history ORDER BY id;", fetch_all=True)
+    assert [t for (t,) in types] == ["text", "blob", "text"]
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+@pytest.mark.parametrize("term", ["Lisbon", "carpenter", "mei", "ok"])
+def test_search_finds_plain_and_compressed_rows(sql_manager, enabled, term):
+    _mixed_history(sql_manager)
+    search = SearchManager(sql_manager, Utilities(), None, "model", max_characters=100000,
+                           codec=TextCodec(enabled=enabled, min_bytes=32))
+    rows = search.search_rows(term.lower())
+    expected = {"Lisbon": ["I live in Lisbon."], "carpenter": ["I work as a carpenter."],
+                "mei": ["My sister is Mei."], "ok": []}[term]
+    assert [q.split(PAD)[0] for q, _, _ in rows] == expected
+    status, result = search.search_chat_history(term)
+    assert (status == "Function call successful.") == bool(expected)
+
+
+def test_search_without_index_decodes_compressed_rows(sql_manager):
+    _mixed_history(sql_manager)
+    sql_manager.execute_query("DROP TABLE chat_history_fts;")
+    search = SearchManager(sql_manager, Utilities(), None, "model", codec=TextCodec())
+    assert [q.split(PAD)[0] for q, _, _ in search.search_rows("carpenter")] == ["I work as a carpenter."]
+
+
+def test_search_returns_oldest_matches_first(sql_manager):
+    codec = TextCodec(enabled=True, min_bytes=32)
+    for day in range(1, 6):
+        _save(sql_manager, codec if day % 2 else TextCodec(), f"Day {day}: tea." + PAD, "ok",
+              f"2024-01-0{day} 10:00:00")
+    search = SearchManager(sql_manager, Utilities(), None, "model", codec=codec)
+    assert [q.split(":")[0] for q, _, _ in search.search_rows("tea", batch_size=2)] == ["Day 1", "Day 2", "Day 3"]
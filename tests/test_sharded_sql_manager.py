@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.sharded_sql_manager import ShardedSQLManager  # noqa: E402
+
+
+def _chat(manager: ShardedSQLManager, user_id: int, *questions: str) -> list:
+    shard = manager.for_user(user_id)
+    return [shard.execute_insert("INSERT INTO chat_history (user_id, question, answer, session_id) VALUES (?, ?, ?, 's');",
+                                 (user_id, question, f"answer to {question}")) for question in questions]
+
+
+def _fact(manager: ShardedSQLManager, user_id: int, attribute: str, value: str, source_id: int) -> None:
+    manager.for_user(user_id).execute_query(
+        "INSERT INTO facts (user_id, subject, attribute, value, source_id, embedding) VALUES (?, 'user', ?, ?, ?, ?);",
+        (user_id, attribute, value, source_id, b"\x00\x00\x80\x3f"))
+
+
+def _facts_with_questions(manager: ShardedSQLManager, user_id: int) -> list:
+    return manager.for_user(user_id).execute_query(
+        "SELECT facts.attribute, facts.value, chat_history.question, chat_history.user_id FROM facts "
+        "JOIN chat_history ON chat_history.id = facts.source_id WHERE facts.user_id = ? ORDER BY facts.attribute;",
+        (user_id,), fetch_all=True)
+
+
+def test_move_user_keeps_facts_pointing_at_their_question(tmp_path):
+    manager = ShardedSQLManager(str(tmp_path / "shards"), num_shards=2)
+    ada = manager.create_user(name="Ada", last_name="Lovelace", occupation="Engineer", location="London")
+    alan = manager.create_user(name="Alan", last_name="Turing", occupation="Mathematician", location="Manchester")
+    assert manager.shard_of(ada) != manager.shard_of(alan)
+
+    # Both shards number their rows from 1, so Ada's first rows collide with Alan's on his shard
+    _chat(manager, alan, "Alan's first question", "Alan's second question")
+    _fact(manager, alan, "occupation", "mathematician", 1)
+    first, _, third = _chat(manager, ada, "I am an engineer", "How are you?", "I love pizza")
+    assert first == 1
+    _fact(manager, ada, "occupation", "engineer", first)
+    _fact(manager, ada, "favorite food", "pizza", third)
+    expected = _facts_with_questions(manager, ada)
+
+    counts = manager.move_user(ada, manager.shard_of(alan))
+
+    assert counts["chat_history"] == 3 and counts["facts"] == 2
+    assert expected == [("favorite food", "pizza", "I love pizza", ada),
+                        ("occupation", "engineer", "I am an engineer", ada)]
+    assert _facts_with_questions(manager, ada) == expected
+    # Alan's rows are untouched
+    assert _facts_with_questions(manager, alan) == [("occupation", "mathematician", "Alan's first question", alan)]
+    assert manager.for_user(alan).execute_query("SELECT COUNT(*) FROM chat_history WHERE user_id = ?;", (alan,),
+                                                fetch_one=True)[0] == 2
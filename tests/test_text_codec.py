@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.text_codec import ZLIB, ZLIB_DICT, TextCodec, save_dictionary, train_dictionary  # noqa: E402
+
+LONG_TEXT = "I moved to Lisbon last spring and I work as a carpenter near the river. " * 8
+
+
+def test_disabled_codec_keeps_texts_plain():
+    codec = TextCodec(enabled=False)
+    assert codec.encode(LONG_TEXT) == LONG_TEXT
+    assert codec.decode(LONG_TEXT) == LONG_TEXT
+    assert codec.encode(None) is None and codec.decode(None) is None
+
+
+def test_short_texts_stay_plain():
+    codec = TextCodec(enabled=True, min_bytes=256)
+    assert codec.encode("Hi there") == "Hi there"
+
+
+def test_zlib_round_trip():
+    codec = TextCodec(enabled=True, min_bytes=16)
+    encoded = codec.encode(LONG_TEXT)
+    assert isinstance(encoded, bytes) and encoded[0] == ZLIB
+    assert len(encoded) < len(LONG_TEXT.encode("utf-8"))
+    assert codec.decode(encoded) == LONG_TEXT
+    # Reads don't depend on the current settings
+    assert TextCodec(enabled=False).decode(encoded) == LONG_TEXT
+
+
+def test_dictionary_round_trip(tmp_path):
+    samples = [f"I work as a carpenter in Lisbon and I like {food} on sundays." for food in
+               ("momo", "ramen", "paella", "tacos", "injera")] * 4
+    dictionary_id = save_dictionary(train_dictionary(samples), str(tmp_path))
+    codec = TextCodec(enabled=True, min_bytes=16, dictionary_dir=str(tmp_path))
+    assert codec.dictionary_id == dictionary_id
+    text = "I work as a carpenter in Lisbon and I like ramen on sundays. Do you remember?"
+    encoded = codec.encode(text)
+    assert isinstance(encoded, bytes) and encoded[0] == ZLIB_DICT
+    assert int.from_bytes(encoded[1:5], "big") == dictionary_id
+    assert TextCodec(dictionary_dir=str(tmp_path)).decode(encoded) == text
@@ -0,0 +1,42 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.turn_profiler import TurnProfiler  # noqa: E402
+
+
+def _turns(profile_dir: Path) -> dict:
+    return {path.parent.parent.name: json.loads(path.read_text()) for path in profile_dir.glob("*/turn_*/turn.json")}
+
+
+def test_memory_and_cpu_are_only_reported_for_turns_that_ran_alone(tmp_path):
+    profiler = TurnProfiler(enabled=True, sample_rate=1.0, output_dir=str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def chat(message):
+        kept = [bytearray(1024) for _ in range(10)]
+        if message == "slow":
+            started.set()
+            release.wait(5)
+        return f"{len(kept)} blocks"
+
+    profiler.wrap(chat, "alone")("hi")
+    slow = threading.Thread(target=profiler.wrap(chat, "overlapped"), args=("slow",))
+    slow.start()
+    started.wait(5)
+    # Runs unprofiled (one profiled turn at a time), but allocates while the profiled turn is traced
+    assert profiler.wrap(chat, "other")("hi") == "10 blocks"
+    release.set()
+    slow.join()
+
+    turns = _turns(tmp_path)
+    assert set(turns) == {"alone", "overlapped"}
+    assert turns["alone"]["concurrent_turns"] is False
+    assert turns["alone"]["cpu_s"] is not None and turns["alone"]["top_allocations"]
+    assert turns["overlapped"]["concurrent_turns"] is True
+    assert turns["overlapped"]["cpu_s"] is None and turns["overlapped"]["retained_kb"] is None
+    assert turns["overlapped"]["top_allocations"] == []
+    assert (tmp_path / "overlapped" / "turn_0001" / "profile.prof").exists()
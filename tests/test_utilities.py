@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils import utilities  # noqa: E402
+from utils.utilities import Utilities  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def character_encoding(monkeypatch):
+    """One token per character, so windows can be checked by hand (and tiktoken isn't downloaded)."""
+    encoding = SimpleNamespace(encode=list, decode="".join)
+    monkeypatch.setattr(utilities, "get_encoding", lambda: encoding)
+
+
+def test_split_by_tokens_windows():
+    assert Utilities.split_by_tokens("abcdefghij", 4, 1) == ["abcd", "defg", "ghij"]
+    # The last window is shorter but still holds the last tokens
+    assert Utilities.split_by_tokens("abcdefghijk", 4, 1) == ["abcd", "defg", "ghij", "jk"]
+    assert Utilities.split_by_tokens("abcdefgh", 4) == ["abcd", "efgh"]
+    assert Utilities.split_by_tokens("abcd", 4, 3) == ["abcd"]
+
+
+@pytest.mark.parametrize("chunk_tokens,overlap", [(1, 0), (4, 0), (4, 1), (4, 3), (5, 2), (7, 6)])
+def test_split_by_tokens_covers_every_token(chunk_tokens, overlap):
+    for length in range(0, 30):
+        text = "".join(chr(ord("a") + i % 26) for i in range(length))
+        chunks = Utilities.split_by_tokens(text, chunk_tokens, overlap)
+
+        assert all(len(chunk) <= chunk_tokens for chunk in chunks)
+        # Dropping the overlap of each window gives the text back: nothing is lost at the end, nothing repeated
+        assert chunks[0] + "".join(chunk[overlap:] for chunk in chunks[1:]) == text
+        # No window only repeats the end of the previous one
+        assert all(len(chunk) > overlap for chunk in chunks[1:])
+
+
+@pytest.mark.parametrize("chunk_tokens,overlap", [(4, 4), (4, 5), (4, -1), (0, 0)])
+def test_split_by_tokens_rejects_bad_overlap(chunk_tokens, overlap):
+    with pytest.raises(ValueError, match="overlap"):
+        Utilities.split_by_tokens("abcdefghij", chunk_tokens, overlap)
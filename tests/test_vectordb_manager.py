@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from utils.vectordb_manager import VectorDBManager  # noqa: E402
+
+
+def collapse(hits: list, k: int, max_chunks_per_pair: int = 2) -> list:
+    """Run collapse_chunks on (id, document, metadata, distance) hits, best first, without opening a store."""
+    manager = SimpleNamespace(cfg=SimpleNamespace(max_chunks_per_pair=max_chunks_per_pair))
+    results = {"ids": [[hit[0] for hit in hits]], "documents": [[hit[1] for hit in hits]],
+               "metadatas": [[hit[2] for hit in hits]], "distances": [[hit[3] for hit in hits]]}
+    return VectorDBManager.collapse_chunks(manager, results, k)
+
+
+def chunk(pair_id: str, index: int, chunks: int = 3) -> dict:
+    return {"pair_id": pair_id, "chunk": index, "chunks": chunks, "count": 1}
+
+
+def test_chunks_are_grouped_by_pair_in_conversation_order():
+    hits = [("a-2", "a2", chunk("a", 2), 0.1),
+            ("b", "b0", chunk("b", 0, chunks=1), 0.2),
+            ("a-0", "a0", chunk("a", 0), 0.3),
+            # Beyond max_chunks_per_pair for pair a
+            ("a-1", "a1", chunk("a", 1), 0.4)]
+
+    assert collapse(hits, k=3) == [("a0 ... a2", 0.1), ("b0", 0.2)]
+    assert collapse(hits, k=3, max_chunks_per_pair=3) == [("a0 ... a1 ... a2", 0.1), ("b0", 0.2)]
+
+
+def test_only_the_k_best_pairs_are_kept():
+    hits = [("a-1", "a1", chunk("a", 1), 0.1), ("b-0", "b0", chunk("b", 0), 0.2),
+            ("c-0", "c0", chunk("c", 0), 0.3), ("a-0", "a0", chunk("a", 0), 0.4), ("b-1", "b1", chunk("b", 1), 0.5)]
+
+    assert collapse(hits, k=2) == [("a0 ... a1", 0.1), ("b0 ... b1", 0.2)]
+
+
+def test_records_without_chunk_metadata_are_pairs_of_their_own():
+    hits = [("legacy-1", "{'user': 'hi'}", None, 0.1),
+            ("a-1", "a1", chunk("a", 1), 0.2),
+            # Written before chunking: metadata without pair_id or chunk
+            ("legacy-2", "{'user': 'hello'}", {"user_id": "1"}, 0.3),
+            ("a-0", "a0", chunk("a", 0), 0.4)]
+
+    assert collapse(hits, k=5) == [("{'user': 'hi'}", 0.1), ("a0 ... a1", 0.2), ("{'user': 'hello'}", 0.3)]
+
+
+def test_results_without_metadatas_or_distances():
+    results = {"ids": [["x", "y"]], "documents": [["first", "second"]]}
+    manager = SimpleNamespace(cfg=SimpleNamespace(max_chunks_per_pair=2))
+
+    assert VectorDBManager.collapse_chunks(manager, results, 1) == [("first", None)]